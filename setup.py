@@ -9,6 +9,7 @@ setup(
         'azure-identity==1.16.1',
         'requests==2.32.2',
         'pandas==2.0.3',
+        'numpy==1.24.4',
     ],
     entry_points={
         'console_scripts': [
@@ -1,33 +1,48 @@
+import argparse
 import json
 import requests
-import pandas as pd
 import sys
 import os
-from datetime import datetime
-from azure.identity import InteractiveBrowserCredential
+import time
+from pyCaOptics_auth import AuthError, add_auth_arguments, auth_options, build_credential, credential_headers
+from pyCaOptics_directory import directory_tables
+from pyCaOptics_fetch import DEFAULT_MAX_WORKERS, build_endpoints, fetch_data, fetch_paginated_data
+from pyCaOptics_groups import GroupResolver, fetch_group_members
+from pyCaOptics_incremental import (DEFAULT_RESULTS_CACHE, DIFF_FIELDS, ResultCache, content_hash, directory_version,
+                                    iter_gap_diff)
+from pyCaOptics_locations import OVERLAP_FIELDS, LocationIndex
+from pyCaOptics_metrics import METRICS_FORMATS, Metrics, TimedIterator, profiled
+from pyCaOptics_names import DEFAULT_CACHE_TTL_HOURS, NameCache, NameResolver
+from pyCaOptics_output import DEFAULT_CHUNK_SIZE, OUTPUT_FORMATS, open_writer, output_filename
+from pyCaOptics_policy import compile_policy
+from pyCaOptics_scheduler import RequestScheduler
+from pyCaOptics_snapshot import DEFAULT_TTL_HOURS, SnapshotError, load_snapshot, save_snapshot
+from pyCaOptics_sync import sync_data
 
-def main(tenant_id, client_id):
+ANALYSIS_FIELDS = ['Policy Name', 'State', 'Gaps Identified']
+ANALYSIS_TYPES = {'Gaps Identified': 'list'}
+COVERAGE_FIELDS = ['Entity Type', 'Entity Id', 'Reason']
+COVERAGE_REASON = 'Not excluded by any policy'
+DEFAULT_NAMES_CACHE = os.path.join(os.path.dirname(__file__), '..', 'cache', 'names.json.gz')
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'output')
+DEFAULT_SAMPLE_INTERVAL = 0.5
+# Part of every results cache key: bump it whenever the gap or coverage rules or the row shape change
+RESULTS_VERSION = 1
+
+def main(tenant_id, client_id, credential_options=None, **options):
     try:
-        credentials = InteractiveBrowserCredential(client_id=client_id, tenant_id=tenant_id)
-        token = credentials.get_token("https://graph.microsoft.com/.default")
-        
-        headers = {
-            "Authorization": f"Bearer {token.token}",
-            "Content-Type": "application/json"
-        }
-
-        endpoints = {
-            "policies": "https://graph.microsoft.com/v1.0/identity/conditionalAccess/policies",
-            "users": "https://graph.microsoft.com/v1.0/users",
-            "groups": "https://graph.microsoft.com/v1.0/groups",
-            "applications": "https://graph.microsoft.com/v1.0/applications"
-        }
-
-        data = fetch_data(headers, endpoints)
-        analysis_results = analysis(data['policies'], data['users'], data['groups'], data['applications'])
-        df_analysis = pd.DataFrame(analysis_results)
-        save_results(df_analysis)
+        metrics = run_metrics(options)
+        with metrics:
+            with metrics.stage('get_token'):
+                credential = build_credential(tenant_id, client_id, **(credential_options or {}))
+                # The headers fetch a fresh token whenever the current one is close to expiring
+                headers = credential_headers(credential)
+
+            run(headers, metrics=metrics, **options)
 
+    except AuthError as e:
+        print(f"Authentication error: {e}")
+        sys.exit(1)
     except requests.exceptions.RequestException as e:
         print(f"Error in API request: {e}")
         sys.exit(1)
@@ -38,86 +53,359 @@ def main(tenant_id, client_id):
         print(f"An unexpected error occurred: {e}")
         sys.exit(1)
 
-def fetch_data(headers, endpoints):
-    data = {}
-    for key, url in endpoints.items():
-        try:
-            data[key] = fetch_paginated_data(url, headers)
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching data from {url}: {e}")
-            print(f"Response headers: {e.response.headers}")
-            print(f"Response content: {e.response.content}")
-            sys.exit(1)
+def run(headers, tenant_id=None, max_workers=DEFAULT_MAX_WORKERS, state_dir=None, snapshot_path=None,
+        snapshot_ttl=DEFAULT_TTL_HOURS, resolve_groups=False, names_cache=None, names_ttl=DEFAULT_CACHE_TTL_HOURS,
+        metrics=None, metrics_path=None, metrics_format='json', **analysis_options):
+    """
+    Fetches the tenant data with the given authorization headers, analyzes it and saves the results.
+
+    With snapshot_path, the fetched data is also saved as a snapshot that analyze_snapshot can
+    re-run the analysis from later. With resolve_groups, the members of every group the policies
+    reference are fetched too, so nested group memberships count towards coverage. With
+    names_cache, GUIDs in the results are labelled with display names cached at that path. With
+    metrics_path, stage timings and per-endpoint request counters are written there as JSON or
+    Prometheus text (see Metrics).
+    """
+    if metrics is None:
+        metrics = Metrics()
+    scheduler = RequestScheduler(max_concurrency=max_workers)
+    data = fetch_tenant(headers, scheduler, max_workers, state_dir, resolve_groups, bool(names_cache), metrics)
+    stats = scheduler.stats()
+    if stats['retries']:
+        print(f"Graph throttled {stats['throttled']} requests: {stats['retries']} retries, "
+              f"{stats['backoff_seconds']}s spent backing off.")
+
+    if snapshot_path:
+        with metrics.stage('save_snapshot'):
+            save_snapshot(data, snapshot_path, ttl_hours=snapshot_ttl, tenant_id=tenant_id)
+        print(f"Snapshot saved to '{snapshot_path}'.")
+
+    analyze_data(data, names=name_resolver(names_cache, names_ttl, headers, scheduler), metrics=metrics,
+                 **analysis_options)
+    metrics.record_scheduler(scheduler.stats())
+    save_metrics(metrics, metrics_path, metrics_format)
+
+def fetch_tenant(headers, scheduler, max_workers=DEFAULT_MAX_WORKERS, state_dir=None, resolve_groups=False,
+                 application_names=False, metrics=None):
+    """
+    Fetches the data analyze_data needs, or syncs it with delta queries when state_dir is given.
+
+    With application_names, application display names are fetched too, for labelling results.
+    The fetch and resolve_groups stages are timed in metrics.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    # Application names come with the fetch, since policies reference apps by appId rather than object id
+    extra_select = {'applications': ['displayName']} if application_names else None
+    with metrics.stage('fetch'):
+        if state_dir:
+            data = sync_data(headers, state_dir, max_workers=max_workers, scheduler=scheduler, metrics=metrics,
+                             extra_select=extra_select)
+        else:
+            # Users, groups and applications are kept in compact GUID columns rather than as Graph dicts
+            data = fetch_data(headers, build_endpoints(extra_select=extra_select), max_workers=max_workers,
+                              scheduler=scheduler, tables=directory_tables(extra_select), metrics=metrics)
+    if resolve_groups:
+        with metrics.stage('resolve_groups'):
+            data['memberships'] = fetch_group_members(headers, referenced_groups(data['policies']),
+                                                      max_workers=max_workers, scheduler=scheduler)
     return data
 
-def fetch_paginated_data(url, headers):
+def run_metrics(options):
+    """
+    Returns the Metrics for a run, taking sample_interval out of options.
+
+    Memory is only sampled if the metrics are going to be saved.
+    """
+    sample_interval = options.pop('sample_interval', DEFAULT_SAMPLE_INTERVAL)
+    return Metrics(sample_interval=sample_interval if options.get('metrics_path') else None)
+
+def save_metrics(metrics, metrics_path, metrics_format='json'):
+    if not metrics_path:
+        return
     try:
-        items = []
-        while url:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            items.extend(data.get('value', []))
-            url = data.get('@odata.nextLink')
-        return items
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data from {url}: {e}")
-        sys.exit(1)
+        metrics.save(metrics_path, metrics_format)
+        print(f"Metrics saved to '{metrics_path}'.")
+    except OSError as e:
+        print(f"Error saving the metrics to file: {e}")
+
+def name_resolver(names_cache, names_ttl=DEFAULT_CACHE_TTL_HOURS, headers=None, scheduler=None):
+    """
+    Returns a NameResolver backed by the cache at names_cache, or None if names are not wanted.
+
+    Without headers the resolver only uses names already in the cache.
+    """
+    if not names_cache:
+        return None
+    return NameResolver(headers, NameCache(names_cache, ttl_hours=names_ttl), scheduler=scheduler)
+
+def analyze_data(data, output_format='csv', compression=None, coverage_output='summary', coverage_reason=True,
+                 names=None, metrics=None, profile_path=None, results_cache=None, output_dir=None):
+    """
+    Analyzes fetched or snapshot data and writes the results.
+
+    With coverage_output='long', the coverage check is written to a separate coverage_results
+    file with one row per uncovered entity instead of one summary row per entity type. With a
+    NameResolver, GUIDs in the rows are labelled with display names as the rows are written.
+    With Metrics, the time spent computing rows is recorded as the analysis stage and the time
+    spent writing them as save_results. With profile_path, the analysis is run under cProfile.
+    When the data holds named locations, policies are also checked against them and overlapping
+    named location ranges are written to named_location_overlaps. With results_cache, the results
+    of unchanged policies are reused from the cache at that path and the gaps added or removed
+    since the previous run are written to analysis_diff. Files are written to output_dir, by
+    default the output directory. Returns the number of rows written to each file by base name.
+    """
+    entities = (data['policies'], data['users'], data['groups'], data['applications'])
+    long_coverage = coverage_output == 'long'
+    # Snapshots and runs without group resolution have no memberships; groups then stay opaque ids
+    resolver = GroupResolver.from_memberships(data['memberships']) if data.get('memberships') else None
+    # Snapshots taken before named locations were fetched have none; locations then stay opaque ids
+    locations = LocationIndex(data['namedLocations']) if 'namedLocations' in data else None
+
+    cache = ResultCache(results_cache) if results_cache else None
+
+    label = names.enrich if names is not None else iter
+    if names is not None:
+        names.seed(data['applications'], key='appId')
+        names.seed(data.get('namedLocations', []))
+
+    rows = {}
+    with profiled(profile_path):
+        rows['analysis_results'] = stream_results(
+            label(iter_analysis(*entities, coverage_summary=not long_coverage, resolver=resolver, locations=locations,
+                                cache=cache)),
+            output_format, compression, metrics=metrics, output_dir=output_dir)
+        if locations is not None:
+            rows['named_location_overlaps'] = stream_results(
+                locations.iter_overlap_rows(), output_format, compression, basename='named_location_overlaps',
+                fieldnames=OVERLAP_FIELDS, metrics=metrics, output_dir=output_dir)
+        if long_coverage:
+            fieldnames = COVERAGE_FIELDS if coverage_reason else COVERAGE_FIELDS[:2]
+            rows['coverage_results'] = stream_results(
+                label(iter_coverage_rows(*entities, include_reason=coverage_reason, resolver=resolver)),
+                output_format, compression, basename='coverage_results', fieldnames=fieldnames, metrics=metrics,
+                output_dir=output_dir)
+    if profile_path:
+        print(f"Analysis profile saved to '{profile_path}'.")
+    if cache is not None:
+        diff_rows = save_diff(cache, label, output_format, compression, output_dir)
+        if diff_rows is not None:
+            rows['analysis_diff'] = diff_rows
+    if names is not None:
+        names.cache.save()
+    return rows
+
+def save_diff(cache, label=iter, output_format='csv', compression=None, output_dir=None):
+    """
+    Writes the gaps added or removed since the previous run to analysis_diff and saves the results cache.
+
+    Returns the number of diff rows, or None on the first run.
+    """
+    print(f"Reused {cache.hits} of {cache.hits + cache.misses} cached results.")
+    rows = None
+    if cache.previous is None:
+        print("No previous run to compare with; the next run will report what changed.")
+    else:
+        rows = stream_results(label(iter_gap_diff(cache.previous, cache.run)), output_format, compression,
+                              basename='analysis_diff', fieldnames=DIFF_FIELDS, output_dir=output_dir)
+    try:
+        cache.save()
+    except OSError as e:
+        print(f"Error saving the results cache: {e}")
+    return rows
+
+def analyze_snapshot(snapshot_path, allow_expired=False, names_cache=None, names_ttl=DEFAULT_CACHE_TTL_HOURS,
+                     metrics_path=None, metrics_format='json', sample_interval=DEFAULT_SAMPLE_INTERVAL,
+                     **analysis_options):
+    """
+    Runs the analysis from a snapshot, without authenticating or calling Graph.
+
+    With names_cache, GUIDs are labelled with the names cached by earlier online runs. With
+    metrics_path, stage timings are written there as for run().
+    """
+    with run_metrics({'metrics_path': metrics_path, 'sample_interval': sample_interval}) as metrics:
+        try:
+            with metrics.stage('load_snapshot'):
+                data, header = load_snapshot(snapshot_path, allow_expired=allow_expired)
+        except (OSError, SnapshotError) as e:
+            print(f"Error loading snapshot: {e}")
+            sys.exit(1)
+
+        print(f"Analyzing snapshot '{snapshot_path}' taken at {header['created_at']}.")
+        analyze_data(data, names=name_resolver(names_cache, names_ttl), metrics=metrics, **analysis_options)
+        save_metrics(metrics, metrics_path, metrics_format)
+
+def add_run_arguments(parser):
+    """
+    Adds the options shared by the entry points to an argument parser.
+    """
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Maximum number of endpoints fetched concurrently.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Sync users, groups and applications with Graph delta queries instead of a full fetch.")
+    parser.add_argument('--state-dir', default=None,
+                        help="Directory holding the delta state for --incremental (default: state/<tenant_id>).")
+    parser.add_argument('--snapshot-out', default=None,
+                        help="Also save the fetched data as a snapshot at this path.")
+    parser.add_argument('--snapshot-ttl', type=float, default=DEFAULT_TTL_HOURS,
+                        help="Hours before a saved snapshot expires (0 for never).")
+    parser.add_argument('--resolve-groups', action='store_true',
+                        help="Fetch the members of the groups policies reference, including nested groups.")
+    parser.add_argument('--from-snapshot', default=None,
+                        help="Analyze a saved snapshot instead of fetching from Graph. No sign-in is needed.")
+    parser.add_argument('--allow-expired', action='store_true',
+                        help="Analyze a snapshot even if it has expired.")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
+
+def add_output_arguments(parser):
+    """
+    Adds the result file format options to an argument parser.
+    """
+    parser.add_argument('--output-format', choices=list(OUTPUT_FORMATS), default='csv',
+                        help="Format of the results file. Parquet requires pyarrow.")
+    parser.add_argument('--compression', default=None,
+                        help="Compress the results: gzip, bz2 or xz for csv/jsonl; snappy, gzip, zstd, brotli or lz4 for parquet.")
+    parser.add_argument('--coverage-output', choices=['summary', 'long'], default='summary',
+                        help="Write uncovered entities as summary rows, or one row per entity in a separate coverage_results file.")
+    parser.add_argument('--no-coverage-reason', action='store_true',
+                        help="Leave the Reason column out of the long coverage output.")
+    parser.add_argument('--resolve-names', action='store_true',
+                        help="Label GUIDs in the results with display names, looked up in bulk and cached.")
+    parser.add_argument('--names-cache', default=None,
+                        help="Path of the display name cache for --resolve-names (default: cache/names.json.gz).")
+    parser.add_argument('--names-ttl', type=float, default=DEFAULT_CACHE_TTL_HOURS,
+                        help="Hours before a cached display name is looked up again (0 for never).")
+    parser.add_argument('--reuse-results', action='store_true',
+                        help="Reuse the results of unchanged policies from the last run and report the gaps added or removed since.")
+    parser.add_argument('--results-cache', default=None,
+                        help="Path of the results cache for --reuse-results (default: cache/analysis.json.gz).")
+
+def add_metrics_arguments(parser):
+    """
+    Adds the instrumentation options to an argument parser.
+    """
+    parser.add_argument('--metrics-out', default=None,
+                        help="Write stage timings, per-endpoint request counters and peak memory to this path.")
+    parser.add_argument('--metrics-format', choices=METRICS_FORMATS, default='json',
+                        help="Format of the metrics file: json, or prometheus text for a node exporter textfile collector.")
+    parser.add_argument('--sample-interval', type=float, default=DEFAULT_SAMPLE_INTERVAL,
+                        help="Seconds between memory samples while collecting metrics (0 to disable sampling).")
+    parser.add_argument('--profile-out', default=None,
+                        help="Run the analysis under cProfile and save the stats to this path.")
+
+def output_options(args):
+    """
+    Converts parsed arguments from add_output_arguments and add_metrics_arguments into keyword
+    arguments for analyze_snapshot().
+    """
+    return {
+        'output_format': args.output_format,
+        'compression': args.compression,
+        'coverage_output': args.coverage_output,
+        'coverage_reason': not args.no_coverage_reason,
+        'names_cache': (args.names_cache or DEFAULT_NAMES_CACHE) if args.resolve_names else None,
+        'names_ttl': args.names_ttl,
+        'results_cache': (args.results_cache or DEFAULT_RESULTS_CACHE) if args.reuse_results else None,
+        'metrics_path': args.metrics_out,
+        'metrics_format': args.metrics_format,
+        'sample_interval': args.sample_interval,
+        'profile_path': args.profile_out
+    }
 
-def analysis(policies, all_users, all_groups, all_applications):
-    analysis_results = []
-    all_user_ids = {user.get('id') for user in all_users if user.get('id')}
-    all_group_ids = {group.get('id') for group in all_groups if group.get('id')}
-    all_application_ids = {app.get('appId') for app in all_applications if app.get('appId')}
+def run_options(args):
+    """
+    Converts parsed arguments from add_run_arguments into keyword arguments for run().
+    """
+    state_dir = None
+    if args.incremental:
+        state_dir = args.state_dir or os.path.join(os.path.dirname(__file__), '..', 'state', args.tenant_id)
+    return {
+        'tenant_id': args.tenant_id,
+        'max_workers': args.max_workers,
+        'state_dir': state_dir,
+        'snapshot_path': args.snapshot_out,
+        'snapshot_ttl': args.snapshot_ttl,
+        'resolve_groups': args.resolve_groups,
+        **output_options(args)
+    }
 
+def analysis(policies, all_users, all_groups, all_applications, resolver=None, locations=None, cache=None):
+    return list(iter_analysis(policies, all_users, all_groups, all_applications, resolver=resolver,
+                              locations=locations, cache=cache))
+
+def iter_analysis(policies, all_users, all_groups, all_applications, coverage_summary=True, resolver=None,
+                  locations=None, cache=None):
+    """
+    Yields the analysis result rows one at a time: one per policy, then the coverage check rows.
+
+    With coverage_summary=False the coverage check rows are left out, for callers writing the
+    uncovered entities separately with iter_coverage_rows. With a GroupResolver, users and
+    groups nested inside an excluded group count as excluded too. With a LocationIndex, location
+    conditions naming deleted locations, or excluding addresses they also include, are reported.
+
+    With a ResultCache, the row of a policy whose canonical JSON hash (and named locations) is
+    unchanged is taken from the cache, as is the coverage check when the exclusions and the
+    directory are unchanged. The gaps of this run are recorded as the cache's run, for
+    iter_gap_diff.
+    """
     excluded_users, excluded_groups, excluded_applications = set(), set(), set()
+    overlapping_locations = locations.overlapping_pairs() if locations is not None else set()
+    location_version = locations.version if locations is not None else None
+    run = {'gaps': {}, 'names': {}}
 
     for policy in policies:
         try:
-            state = policy.get('state')
+            compiled = compile_policy(policy)
+            state = compiled.state
             if state is None:
                 continue
 
-            users_included = set(policy.get('conditions', {}).get('users', {}).get('includeUsers', []))
-            users_excluded = set(policy.get('conditions', {}).get('users', {}).get('excludeUsers', []))
-            groups_included = set(policy.get('conditions', {}).get('users', {}).get('includeGroups', []))
-            groups_excluded = set(policy.get('conditions', {}).get('users', {}).get('excludeGroups', []))
-            applications_included = set(policy.get('conditions', {}).get('applications', {}).get('includeApplications', []))
-            applications_excluded = set(policy.get('conditions', {}).get('applications', {}).get('excludeApplications', []))
-            
-            grant_controls = policy.get('grantControls') or {}
-            built_in_controls = grant_controls.get('builtInControls', [])
-
-            user_risk_levels = policy.get('conditions', {}).get('userRiskLevels', [])
-            sign_in_risk_levels = policy.get('conditions', {}).get('signInRiskLevels', [])
-            session_controls = policy.get('sessionControls', {})
-            platforms = policy.get('conditions', {}).get('platforms', {})
-            device_states = policy.get('conditions', {}).get('deviceStates', {})
-
-            excluded_users.update(users_excluded)
-            excluded_groups.update(groups_excluded)
-            excluded_applications.update(applications_excluded)
+            users = compiled.users
+            applications = compiled.applications
+
+            excluded_users.update(users.exclude)
+            excluded_groups.update(compiled.groups.exclude)
+            excluded_applications.update(applications.exclude)
+            # Display names need not be unique, so the run summary is keyed by policy id
+            identity = compiled.id or compiled.display_name
+
+            if cache is not None:
+                key = content_hash(['policy', RESULTS_VERSION, policy, location_version])
+                row = cache.get(key)
+                if row is not None:
+                    run['gaps'][identity] = row['Gaps Identified']
+                    run['names'][identity] = row['Policy Name']
+                    yield row
+                    continue
 
             gaps = []
 
             if state != 'enabled':
                 gaps.append("Policy is not enabled.")
-            if not user_risk_levels and not sign_in_risk_levels:
+            if not compiled.user_risk_levels.configured and not compiled.sign_in_risk_levels.configured:
                 gaps.append("Policy does not consider user or sign-in risk levels.")
-            if not platforms:
+            if not compiled.platforms.configured:
                 gaps.append("No platforms specified.")
-            if not device_states:
+            if not compiled.device_states_configured:
                 gaps.append("No device state conditions specified.")
-            if not session_controls:
+            if not compiled.session_controls:
                 gaps.append("No session controls applied.")
-            if 'All' in users_included and users_excluded:
+            if users.include_all and users.exclude:
                 gaps.append("Policy includes all users but has exclusions.")
-            if 'All' in applications_included and applications_excluded:
+            if applications.include_all and applications.exclude:
                 gaps.append("Policy includes all applications but has exclusions.")
-            if users_excluded or groups_excluded:
+            if users.exclude or compiled.groups.exclude:
                 gaps.append("Users or groups excluded, potential conflicts with other policies.")
+            if locations is not None:
+                gaps.extend(location_gaps(compiled.locations, locations, overlapping_locations))
 
-            analysis_results.append({'Policy Name': policy.get('displayName', 'Unnamed Policy'), 'State': state, 'Gaps Identified': gaps})
+            row = {'Policy Name': compiled.display_name, 'State': state, 'Gaps Identified': gaps}
+            if cache is not None:
+                cache.put(key, row)
+                run['gaps'][identity] = gaps
+                run['names'][identity] = compiled.display_name
+            yield row
         except KeyError as e:
             print(f"KeyError processing policy {policy.get('displayName', 'Unnamed Policy')}: Missing key {e}")
             print(f"Policy data: {json.dumps(policy, indent=2)}")
@@ -130,43 +418,200 @@ def analysis(policies, all_users, all_groups, all_applications):
             print(f"An unexpected error occurred while processing policy {policy.get('displayName', 'Unnamed Policy')}: {e}")
             continue
 
+    if cache is not None:
+        cache.run = run
+    if not coverage_summary:
+        return
+
     try:
-        uncovered_users = all_user_ids - excluded_users
-        uncovered_groups = all_group_ids - excluded_groups
-        uncovered_applications = all_application_ids - excluded_applications
+        key = uncovered = None
+        if cache is not None:
+            key = content_hash(['coverage', RESULTS_VERSION, sorted(excluded_users), sorted(excluded_groups),
+                                sorted(excluded_applications), analysis_directory_version(all_users, all_groups, all_applications, resolver)])
+            uncovered = cache.get(key)
+        if uncovered is not None:
+            uncovered_users, uncovered_groups, uncovered_applications = (
+                set(uncovered[kind]) for kind in ('users', 'groups', 'applications'))
+        else:
+            excluded_users, excluded_groups = expand_excluded(excluded_users, excluded_groups, resolver)
+            uncovered_users = ids_except(all_users, 'id', excluded_users)
+            uncovered_groups = ids_except(all_groups, 'id', excluded_groups)
+            uncovered_applications = ids_except(all_applications, 'appId', excluded_applications)
+        if cache is not None:
+            run['uncovered'] = uncovered or {'users': sorted(uncovered_users), 'groups': sorted(uncovered_groups),
+                                             'applications': sorted(uncovered_applications)}
+            cache.put(key, run['uncovered'])
 
         if uncovered_users:
-            analysis_results.append({'Policy Name': 'Coverage Check', 'State': 'n/a', 'Gaps Identified': [f"Uncovered users: {uncovered_users}"]})
+            yield {'Policy Name': 'Coverage Check', 'State': 'n/a', 'Gaps Identified': [f"Uncovered users: {uncovered_users}"]}
         if uncovered_groups:
-            analysis_results.append({'Policy Name': 'Coverage Check', 'State': 'n/a', 'Gaps Identified': [f"Uncovered groups: {uncovered_groups}"]})
+            yield {'Policy Name': 'Coverage Check', 'State': 'n/a', 'Gaps Identified': [f"Uncovered groups: {uncovered_groups}"]}
         if uncovered_applications:
-            analysis_results.append({'Policy Name': 'Coverage Check', 'State': 'n/a', 'Gaps Identified': [f"Uncovered applications: {uncovered_applications}"]})
+            yield {'Policy Name': 'Coverage Check', 'State': 'n/a', 'Gaps Identified': [f"Uncovered applications: {uncovered_applications}"]}
     except Exception as e:
         print(f"Error during coverage check: {e}")
 
-    return analysis_results
+def analysis_directory_version(all_users, all_groups, all_applications, resolver=None):
+    """
+    Returns the directory_version of the entities and group memberships the coverage check reads.
+    """
+    memberships = None
+    if resolver is not None:
+        memberships = [{group_id: sorted(members) for group_id, members in direct.items()}
+                       for direct in (resolver.direct_users, resolver.direct_groups)]
+    id_lists = (iter_entity_ids(all_users, 'id'), iter_entity_ids(all_groups, 'id'),
+                iter_entity_ids(all_applications, 'appId'))
+    return directory_version(id_lists, memberships)
+
+def location_gaps(condition, locations, overlapping_locations):
+    """
+    Returns the gaps of a policy's location condition against the tenant's named locations.
+    """
+    gaps = []
+    unknown = locations.unknown(condition.include | condition.exclude)
+    if unknown:
+        gaps.append(f"References named locations that do not exist: {unknown}")
+    shadowed = sorted({locations.names[excluded] for excluded in condition.exclude for included in condition.include
+                       if (included, excluded) in overlapping_locations})
+    if shadowed:
+        gaps.append(f"Excluded named locations overlap included ones: {shadowed}")
+    return gaps
+
+def iter_entity_ids(entities, key):
+    """
+    Yields the unique, non-empty key values of a list of Graph objects or a DirectoryTable.
+    """
+    if hasattr(entities, 'iter_ids'):
+        yield from entities.iter_ids(key)
+        return
+    seen = set()
+    for entity in entities:
+        entity_id = entity.get(key)
+        if entity_id and entity_id not in seen:
+            seen.add(entity_id)
+            yield entity_id
+
+def ids_except(entities, key, excluded):
+    """
+    Returns the set of key values of entities that are not in excluded.
+
+    DirectoryTables compare their GUID columns directly, so only the result is built as strings.
+    Ids are compared case-insensitively either way, since policies may spell a GUID in any case.
+    """
+    if hasattr(entities, 'ids_except'):
+        return entities.ids_except(excluded, key)
+    excluded = lowercase_ids(excluded)
+    return {entity_id for entity_id in iter_entity_ids(entities, key) if entity_id.lower() not in excluded}
+
+def lowercase_ids(ids):
+    return {entity_id.lower() for entity_id in ids}
+
+def referenced_groups(policies):
+    """
+    Returns the ids of the groups any policy includes or excludes, in first-seen order.
+    """
+    group_ids = {}
+    for policy in policies:
+        groups = compile_policy(policy).groups
+        group_ids.update(dict.fromkeys(sorted(groups.include | groups.exclude)))
+    return list(group_ids)
+
+def expand_excluded(users, groups, resolver=None):
+    """
+    Returns the excluded users and groups with the members of excluded groups, at any depth, added.
+
+    The coverage check only counts exclusions, so the groups policies include are not expanded.
+    """
+    if resolver is None:
+        return users, groups
+    groups = resolver.expand_groups(groups)
+    return users | resolver.expand_users(groups), groups
+
+def excluded_entities(policies, resolver=None):
+    """
+    Returns the users, groups and applications excluded by at least one policy, keyed by entity type.
 
-def save_results(df_analysis):
+    With a GroupResolver, the users and groups nested inside excluded groups are included.
+    """
+    excluded = {'user': set(), 'group': set(), 'application': set()}
+    for policy in policies:
+        compiled = compile_policy(policy)
+        if compiled.state is None:
+            continue
+        excluded['user'].update(compiled.users.exclude)
+        excluded['group'].update(compiled.groups.exclude)
+        excluded['application'].update(compiled.applications.exclude)
+    excluded['user'], excluded['group'] = expand_excluded(excluded['user'], excluded['group'], resolver)
+    return excluded
+
+def iter_coverage_rows(policies, all_users, all_groups, all_applications, include_reason=True, resolver=None):
+    """
+    Yields one row per uncovered user, group and application.
+
+    This is the long form of the coverage check rows from iter_analysis. Entities are tested
+    against the excluded sets one at a time, so the uncovered sets are never built in memory.
+    DirectoryTables are already unique and keep no per-entity state; a list of Graph objects is
+    deduplicated through a set of the ids seen so far, as in iter_entity_ids.
+    """
+    # Tables hold GUIDs in lowercase, and policies may spell them in any case
+    excluded = {entity_type: lowercase_ids(ids) for entity_type, ids in excluded_entities(policies, resolver).items()}
+    sources = [('user', all_users, 'id'), ('group', all_groups, 'id'), ('application', all_applications, 'appId')]
+
+    for entity_type, entities, key in sources:
+        for entity_id in iter_entity_ids(entities, key):
+            if entity_id.lower() in excluded[entity_type]:
+                continue
+            row = {'Entity Type': entity_type, 'Entity Id': entity_id}
+            if include_reason:
+                row['Reason'] = COVERAGE_REASON
+            yield row
+
+def save_results(df_analysis, output_dir=None):
+    try:
+        filename = output_filename(output_dir or DEFAULT_OUTPUT_DIR, 'analysis_results')
+
+        df_analysis.to_csv(filename, index=False)
+        print(f"Analysis complete. Results saved to '{filename}'.")
+    except Exception as e:
+        print(f"Error saving the results to file: {e}")
+        sys.exit(1)
+
+def stream_results(rows, output_format='csv', compression=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                   basename='analysis_results', fieldnames=ANALYSIS_FIELDS, metrics=None, output_dir=None,
+                   column_types=ANALYSIS_TYPES):
+    """
+    Writes result rows to disk in chunks as they are produced and returns the number of rows written.
+
+    With Metrics, the time spent producing rows is added to the analysis stage and the rest to save_results.
+    """
     try:
-        output_dir = os.path.join(os.path.dirname(__file__), '..', 'output')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        output_filename = os.path.join(output_dir, 'analysis_results.csv')
-        if os.path.exists(output_filename):
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_filename = os.path.join(output_dir, f'analysis_results_{timestamp}.csv')
-
-        df_analysis.to_csv(output_filename, index=False)
-        print(f"Analysis complete. Results saved to '{output_filename}'.")
+        filename = output_filename(output_dir or DEFAULT_OUTPUT_DIR, basename, output_format, compression)
+
+        start = time.perf_counter()
+        if metrics is not None:
+            rows = TimedIterator(rows)
+        with open_writer(filename, fieldnames, output_format, compression, chunk_size, column_types) as writer:
+            writer.write_rows(rows)
+        if metrics is not None:
+            metrics.add('analysis', rows.seconds)
+            metrics.add('save_results', time.perf_counter() - start - rows.seconds)
+        print(f"Analysis complete. {writer.rows_written} results saved to '{filename}'.")
+        return writer.rows_written
     except Exception as e:
         print(f"Error saving the results to file: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python pyCaOptics-python.py <tenant_id> <client_id>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Analyze Conditional Access policies using an App Registration.")
+    parser.add_argument('tenant_id', nargs='?', help="The Azure Active Directory tenant ID.")
+    parser.add_argument('client_id', nargs='?', help="The client ID of your Azure App Registration.")
+    add_run_arguments(parser)
+    add_auth_arguments(parser)
+    args = parser.parse_args()
 
-    tenant_id = sys.argv[1]
-    client_id = sys.argv[2]
-    main(tenant_id, client_id)
+    if args.from_snapshot:
+        analyze_snapshot(args.from_snapshot, allow_expired=args.allow_expired, **output_options(args))
+    elif not args.tenant_id or not args.client_id:
+        parser.error("tenant_id and client_id are required unless --from-snapshot is given")
+    else:
+        main(args.tenant_id, args.client_id, auth_options(args), **run_options(args))
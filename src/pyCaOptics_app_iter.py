@@ -1,21 +1,43 @@
+import argparse
 import os
 import sys
 import requests
 import pandas as pd
-from datetime import datetime
+from contextlib import nullcontext
 from itertools import product
-from azure.identity import InteractiveBrowserCredential
+from pyCaOptics_app import DEFAULT_NAMES_CACHE, name_resolver
+from pyCaOptics_auth import AuthError, add_auth_arguments, auth_options, build_credential, credential_headers
+from pyCaOptics_conflicts import ConflictIndex, control_conflicts, find_conflicts
+from pyCaOptics_incremental import ResultCache, content_hash, decode_bits, encode_bits, has_bit, set_bit
+from pyCaOptics_names import DEFAULT_CACHE_TTL_HOURS
+from pyCaOptics_output import DEFAULT_CHUNK_SIZE, OUTPUT_FORMATS, open_writer, output_filename
+from pyCaOptics_policy import compile_policy, compile_policies
+from pyCaOptics_regions import DIMENSIONS, iter_region_rows, uncovered_regions
+from pyCaOptics_snapshot import SnapshotError, load_snapshot
 
-def fetch_policies(tenant_id, client_id):
+FINDING_FIELDS = ['policy', 'permutation', 'issue']
+REGION_FIELDS = list(DIMENSIONS) + ['issue']
+CONFLICT_FIELDS = ['policy', 'conflicting_policy', 'issue']
+GAP_DIFF_FIELDS = ['change'] + FINDING_FIELDS
+FINDING_TYPES = {'permutation': 'list'}
+ANALYSIS_MODES = ['permutations', 'symbolic']
+DEFAULT_PERMUTATIONS_CACHE = os.path.join(os.path.dirname(__file__), '..', 'cache', 'permutations.json.gz')
+# Part of every permutations cache key: bump it whenever the gap or conflict rules or the bitmap layout change
+RESULTS_VERSION = 1
+
+def graph_headers(client_id, tenant_id=None, **credential_options):
+    """
+    Signs in and returns the headers for Graph requests, which refresh their token before it expires.
+
+    Signs in interactively unless credential_options choose another method (see build_credential).
+    """
+    return credential_headers(build_credential(tenant_id, client_id, **credential_options))
+
+def fetch_policies(tenant_id, client_id, headers=None):
     """
     Fetches all Conditional Access policies from Microsoft Graph API.
     """
-    token_credential = InteractiveBrowserCredential(client_id=client_id)
-    token = token_credential.get_token('https://graph.microsoft.com/.default')
-    headers = {
-        'Authorization': f'Bearer {token.token}',
-        'Content-Type': 'application/json'
-    }
+    headers = headers or graph_headers(client_id, tenant_id)
     url = f'https://graph.microsoft.com/v1.0/identity/conditionalAccess/policies'
     response = requests.get(url, headers=headers)
 
@@ -25,143 +47,289 @@ def fetch_policies(tenant_id, client_id):
 
     return response.json().get('value', [])
 
-def generate_permutations(policies):
+def _permutation_dimensions(policy):
     """
-    Generates permutations for each policy based on users, apps, platforms, locations, and client apps.
+    Returns the de-duplicated users, groups, apps, platforms, locations, and client apps of a policy.
     """
-    all_permutations = []
+    users = policy['conditions'].get('users', {}).get('includeUsers', []) + \
+            policy['conditions'].get('users', {}).get('excludeUsers', [])
     
-    for policy in policies:
-        users = policy['conditions'].get('users', {}).get('includeUsers', []) + \
-                policy['conditions'].get('users', {}).get('excludeUsers', [])
-        
-        groups = policy['conditions'].get('users', {}).get('includeGroups', []) + \
-                 policy['conditions'].get('users', {}).get('excludeGroups', [])
-        
-        apps = policy['conditions'].get('applications', {}).get('includeApplications', []) + \
-               policy['conditions'].get('applications', {}).get('excludeApplications', [])
-        
-        # Ensure platforms is not None before accessing its keys
-        platforms_data = policy['conditions'].get('platforms')
-        if platforms_data is None:
-            platforms = []
-        else:
-            platforms = platforms_data.get('includePlatforms', []) + platforms_data.get('excludePlatforms', [])
-        
-        # Ensure locations is not None before accessing its keys
-        locations_data = policy['conditions'].get('locations')
-        if locations_data is None:
-            locations = []
-        else:
-            locations = locations_data.get('includeLocations', []) + locations_data.get('excludeLocations', [])
-        
-        client_apps = policy['conditions'].get('clientAppTypes', [])
-
-        permutations = list(product(users, groups, apps, platforms, locations, client_apps))
-        all_permutations.extend(permutations)
+    groups = policy['conditions'].get('users', {}).get('includeGroups', []) + \
+             policy['conditions'].get('users', {}).get('excludeGroups', [])
+    
+    apps = policy['conditions'].get('applications', {}).get('includeApplications', []) + \
+           policy['conditions'].get('applications', {}).get('excludeApplications', [])
+    
+    # Ensure platforms is not None before accessing its keys
+    platforms_data = policy['conditions'].get('platforms')
+    if platforms_data is None:
+        platforms = []
+    else:
+        platforms = platforms_data.get('includePlatforms', []) + platforms_data.get('excludePlatforms', [])
+    
+    # Ensure locations is not None before accessing its keys
+    locations_data = policy['conditions'].get('locations')
+    if locations_data is None:
+        locations = []
+    else:
+        locations = locations_data.get('includeLocations', []) + locations_data.get('excludeLocations', [])
     
-    return all_permutations
+    client_apps = policy['conditions'].get('clientAppTypes', [])
 
-def analyze_permutations(policies):
+    return tuple(list(dict.fromkeys(values)) for values in (users, groups, apps, platforms, locations, client_apps))
+
+def generate_permutations(policies):
     """
-    Analyzes all permutations to check if there are any gaps or conflicts in the policy settings.
+    Lazily yields the unique permutations for each policy based on users, apps, platforms, locations, and client apps.
+
+    A permutation already produced by an earlier policy is recognised by checking it against that
+    policy's dimension sets, so memory is bounded by the size of the policies rather than by the
+    number of permutations.
     """
-    all_permutations = generate_permutations(policies)
-    gaps = []
-    conflicts = []
+    for _, permutations in permutation_blocks([_permutation_dimensions(policy) for policy in policies]):
+        yield from permutations
 
-    for policy in policies:
-        for permutation in all_permutations:
-            user, group, app, platform, location, client_app = permutation
+def permutation_blocks(dimensions):
+    """
+    Yields (dimensions, permutations) for each policy's dimensions from _permutation_dimensions.
+
+    permutations lazily produces the permutations of that policy that no earlier policy produced.
+    Policies with an empty dimension produce no block.
+    """
+    seen_dimensions = []
+
+    for block_dimensions in dimensions:
+        if not all(block_dimensions):
+            continue
+        yield block_dimensions, _new_permutations(block_dimensions, tuple(seen_dimensions))
+        seen_dimensions.append(tuple(frozenset(values) for values in block_dimensions))
+
+def _new_permutations(dimensions, seen_dimensions):
+    for permutation in product(*dimensions):
+        if any(all(value in values for value, values in zip(permutation, previous)) for previous in seen_dimensions):
+            continue
+        yield permutation
+
+def iter_findings(policies):
+    """
+    Lazily yields ('gap', record) and ('conflict', record) tuples for every permutation and policy.
+    """
+    compiled_policies = compile_policies(policies)
+    # Only policies whose scopes overlap with contradictory controls need checking per permutation
+    partners = ConflictIndex(compiled_policies).partners()
 
+    for permutation in generate_permutations(policies):
+        user, group, app, platform, location, client_app = permutation
+
+        for position, policy in enumerate(compiled_policies):
             # Check if this permutation is covered by the policy
             if not is_permutation_covered(policy, user, group, app, platform, location, client_app):
-                gaps.append({
-                    'policy': policy['displayName'],
+                yield 'gap', {
+                    'policy': policy.display_name,
                     'permutation': permutation,
                     'issue': 'Uncovered permutation'
-                })
+                }
 
             # Check for conflicts
-            if is_conflicting_policy(policy, user, group, app, platform, location, client_app):
-                conflicts.append({
-                    'policy': policy['displayName'],
+            others = [compiled_policies[other] for other in partners.get(position, ())]
+            if others and is_conflicting_policy(policy, user, group, app, platform, location, client_app, others):
+                yield 'conflict', {
+                    'policy': policy.display_name,
                     'permutation': permutation,
                     'issue': 'Conflicting policy settings'
-                })
+                }
+
+class _BlockCheck:
+    """
+    The gaps and conflicts of one policy over one block of permutations, from the cache or being computed.
+    """
+    __slots__ = ('policy', 'others', 'gap_key', 'conflict_key', 'gaps', 'conflicts', 'before')
+
+    def __init__(self, policy, others, gap_key, conflict_key, cache):
+        self.policy = policy
+        self.others = others
+        self.gap_key = gap_key
+        self.conflict_key = conflict_key
+        gaps, conflicts = cache.get(gap_key), cache.get(conflict_key)
+        # Cached bitmaps are read-only bytes; the ones being computed are bytearrays
+        self.gaps = bytearray() if gaps is None else decode_bits(gaps)
+        self.conflicts = bytearray() if conflicts is None else decode_bits(conflicts)
+        self.before = None
+
+def iter_cached_findings(policies, cache):
+    """
+    Yields the same findings as iter_findings, reusing the results of unchanged policies from a ResultCache.
+
+    Permutations are checked in blocks, one per policy that produces them. The gaps and conflicts
+    of each policy over each block are cached as bitmaps over the block's permutations, keyed by
+    the canonical JSON hash of the policy (and of its conflict partners) and of the dimensions
+    that define the block, so only the pairs whose inputs changed are checked again. Then
+    ('diff', row) tuples list the gaps added or removed since the previous run, and the run is
+    recorded in the cache for the next one.
+    """
+    compiled_policies = compile_policies(policies)
+    partners = ConflictIndex(compiled_policies).partners()
+    policy_keys = [content_hash(policy) for policy in policies]
+    identities = [policy.id or policy.display_name for policy in compiled_policies]
+    dimensions = [_permutation_dimensions(policy) for policy in policies]
+    previous = cache.previous if (cache.previous or {}).get('mode') == 'permutations' else None
+    previous_blocks = previous['blocks'] if previous else {}
+    run = {'mode': 'permutations', 'dimensions': dimensions, 'blocks': {}}
+    # Display names need not be unique, so gaps are tracked by policy identity and named on output
+    names = dict(zip(identities, (policy.display_name for policy in compiled_policies)))
+    # Gaps in blocks that only exist in this run, compared with the previous run's at the end
+    added = set()
+
+    block_key = ''
+    for block_dimensions, permutations in permutation_blocks(dimensions):
+        # Each block depends on its own dimensions and those of every earlier block
+        block_key = content_hash([block_key, block_dimensions])
+        block = run['blocks'][block_key] = {}
+        previous_block = previous_blocks.get(block_key)
+        checks = []
+        for position, policy in enumerate(compiled_policies):
+            partner_positions = partners.get(position, ())
+            check = _BlockCheck(policy, [compiled_policies[other] for other in partner_positions],
+                                content_hash(['gaps', RESULTS_VERSION, block_key, policy_keys[position]]),
+                                content_hash(['conflicts', RESULTS_VERSION, block_key, policy_keys[position],
+                                              sorted(policy_keys[other] for other in partner_positions)]), cache)
+            block[identities[position]] = [check.gap_key, policy.display_name]
+            if previous_block is not None:
+                gap_key = (previous_block.get(identities[position]) or [None])[0]
+                if gap_key != check.gap_key:
+                    check.before = decode_bits(cache.stored(gap_key) or '') if gap_key else b''
+            checks.append(check)
+        gone = [(name, decode_bits(cache.stored(gap_key) or '')) for identity, (gap_key, name) in
+                (previous_block or {}).items() if identity not in block]
+
+        for index, permutation in enumerate(permutations):
+            user, group, app, platform, location, client_app = permutation
+            for position, check in enumerate(checks):
+                policy = check.policy
+                if isinstance(check.gaps, bytearray):
+                    gap = not policy.covers(user, group, app, platform, location, client_app)
+                    if gap:
+                        set_bit(check.gaps, index)
+                else:
+                    gap = has_bit(check.gaps, index)
+                if gap:
+                    yield 'gap', {'policy': policy.display_name, 'permutation': permutation,
+                                  'issue': 'Uncovered permutation'}
+                if previous_block is None:
+                    if gap:
+                        added.add((identities[position], permutation))
+                elif check.before is not None and gap != has_bit(check.before, index):
+                    yield 'diff', {'change': 'added' if gap else 'removed', 'policy': policy.display_name,
+                                   'permutation': permutation, 'issue': 'Uncovered permutation'}
+
+                if isinstance(check.conflicts, bytearray):
+                    conflict = bool(check.others) and is_conflicting_policy(
+                        policy, user, group, app, platform, location, client_app, check.others)
+                    if conflict:
+                        set_bit(check.conflicts, index)
+                else:
+                    conflict = has_bit(check.conflicts, index)
+                if conflict:
+                    yield 'conflict', {'policy': policy.display_name, 'permutation': permutation,
+                                       'issue': 'Conflicting policy settings'}
+            for name, before in gone:
+                if has_bit(before, index):
+                    yield 'diff', {'change': 'removed', 'policy': name, 'permutation': permutation,
+                                   'issue': 'Uncovered permutation'}
+
+        for check in checks:
+            if isinstance(check.gaps, bytearray):
+                cache.put(check.gap_key, encode_bits(check.gaps))
+            if isinstance(check.conflicts, bytearray):
+                cache.put(check.conflict_key, encode_bits(check.conflicts))
+
+    if previous is not None:
+        removed = _previous_gaps(previous, run['blocks'], cache, names)
+        for change, gaps in (('added', added - removed), ('removed', removed - added)):
+            for name, _, permutation in sorted((names[identity], identity, permutation)
+                                               for identity, permutation in gaps):
+                yield 'diff', {'change': change, 'policy': name, 'permutation': permutation,
+                               'issue': 'Uncovered permutation'}
+    cache.run = run
+
+def _previous_gaps(previous, blocks, cache, names):
+    """
+    Returns the (policy identity, permutation) gaps of the previous run's blocks that this run no longer has.
+
+    The display names of policies that only the previous run had are added to names.
+    """
+    gaps = set()
+    block_key = ''
+    for block_dimensions, permutations in permutation_blocks(previous['dimensions']):
+        block_key = content_hash([block_key, block_dimensions])
+        if block_key in blocks:
+            continue
+        bitmaps = []
+        for identity, (gap_key, name) in previous['blocks'][block_key].items():
+            names.setdefault(identity, name)
+            bitmaps.append((identity, decode_bits(cache.stored(gap_key) or '')))
+        for index, permutation in enumerate(permutations):
+            for identity, bits in bitmaps:
+                if has_bit(bits, index):
+                    gaps.add((identity, permutation))
+    return gaps
+
+def analyze_permutations(policies):
+    """
+    Analyzes all permutations to check if there are any gaps or conflicts in the policy settings.
+    """
+    gaps = []
+    conflicts = []
+
+    for kind, finding in iter_findings(policies):
+        if kind == 'gap':
+            gaps.append(finding)
+        else:
+            conflicts.append(finding)
     
     return gaps, conflicts
 
 def is_permutation_covered(policy, user, group, app, platform, location, client_app):
     """
     Checks if a given permutation is covered by the policy.
+
+    Accepts either a Graph policy dict or a CompiledPolicy; callers checking many permutations
+    should compile the policy once up front.
     """
-    conditions = policy.get('conditions', {})
+    return compile_policy(policy).covers(user, group, app, platform, location, client_app)
 
-    # Check users and groups
-    if user in conditions.get('users', {}).get('excludeUsers', []) or \
-       group in conditions.get('users', {}).get('excludeGroups', []):
-        return False
-    
-    if user not in conditions.get('users', {}).get('includeUsers', []) and \
-       group not in conditions.get('users', {}).get('includeGroups', []):
-        return False
-    
-    # Check apps
-    if app in conditions.get('applications', {}).get('excludeApplications', []):
-        return False
-    
-    if app not in conditions.get('applications', {}).get('includeApplications', []):
-        return False
-    
-    # Check platforms
-    if platform in conditions.get('platforms', {}).get('excludePlatforms', []):
-        return False
-    
-    if platform not in conditions.get('platforms', {}).get('includePlatforms', []):
-        return False
-    
-    # Check locations
-    if location in conditions.get('locations', {}).get('excludeLocations', []):
-        return False
-    
-    if location not in conditions.get('locations', {}).get('includeLocations', []):
-        return False
-    
-    # Check client apps
-    if client_app not in conditions.get('clientAppTypes', []):
-        return False
+def is_conflicting_policy(policy, user, group, app, platform, location, client_app, others=()):
+    """
+    Checks if the policy and any of the other policies apply to the permutation with contradictory controls.
 
-    return True
+    A conflict is one policy blocking access that another grants, or both setting the same session
+    control differently. iter_findings passes only the policies ConflictIndex found to overlap.
+    """
+    policy = compile_policy(policy)
+    if not policy.covers(user, group, app, platform, location, client_app):
+        return False
+    for other in compile_policies(others):
+        if other is not policy and control_conflicts(policy, other) and \
+                other.covers(user, group, app, platform, location, client_app):
+            return True
+    return False
 
-def is_conflicting_policy(policy, user, group, app, platform, location, client_app):
+def _results_filenames(output_format='csv', compression=None):
     """
-    Checks if the policy has conflicting settings for the given permutation.
+    Returns the gaps and conflicts output file names, adding a timestamp if the files already exist.
     """
-    # Implement logic to detect conflicts between multiple policies or within the same policy
-    # Example: One policy grants access while another denies it for the same permutation
-    return False
+    # Define the output directory relative to the current script location
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'outputs')
+    gaps_filename = output_filename(output_dir, 'gaps_results', output_format, compression)
+    conflicts_filename = output_filename(output_dir, 'conflicts_results', output_format, compression)
+    return gaps_filename, conflicts_filename
 
 def save_results(gaps, conflicts):
     """
     Saves the analysis results to a CSV file.
     """
     try:
-        # Define the output directory relative to the current script location
-        output_dir = os.path.join(os.path.dirname(__file__), '..', 'outputs')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Prepare file names with timestamps
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        gaps_filename = os.path.join(output_dir, 'gaps_results.csv')
-        conflicts_filename = os.path.join(output_dir, 'conflicts_results.csv')
-
-        # Check if files already exist and add timestamp if they do
-        if os.path.exists(gaps_filename):
-            gaps_filename = os.path.join(output_dir, f'gaps_results_{timestamp}.csv')
-        
-        if os.path.exists(conflicts_filename):
-            conflicts_filename = os.path.join(output_dir, f'conflicts_results_{timestamp}.csv')
+        gaps_filename, conflicts_filename = _results_filenames()
 
         # Convert lists to DataFrames
         df_gaps = pd.DataFrame(gaps)
@@ -177,20 +345,165 @@ def save_results(gaps, conflicts):
         print(f"Error saving the results to file: {e}")
         sys.exit(1)
 
-def main(tenant_id, client_id):
-    policies = fetch_policies(tenant_id, client_id)
+def stream_results(findings, output_format='csv', compression=None, chunk_size=DEFAULT_CHUNK_SIZE, names=None,
+                   diff=False):
+    """
+    Writes findings from iter_findings to the gaps and conflicts files in chunks as they are produced.
+
+    With a NameResolver, GUIDs in the permutations are labelled with display names. With diff,
+    the ('diff', row) findings of iter_cached_findings are written to a gaps_diff file.
+    """
+    if names is not None:
+        findings = names.enrich(findings)
+    try:
+        gaps_filename, conflicts_filename = _results_filenames(output_format, compression)
+        diff_filename = output_filename(os.path.dirname(gaps_filename), 'gaps_diff', output_format, compression)
+
+        with open_writer(gaps_filename, FINDING_FIELDS, output_format, compression, chunk_size,
+                         FINDING_TYPES) as gaps_writer, \
+             open_writer(conflicts_filename, FINDING_FIELDS, output_format, compression, chunk_size,
+                         FINDING_TYPES) as conflicts_writer, \
+             (open_writer(diff_filename, GAP_DIFF_FIELDS, output_format, compression, chunk_size, FINDING_TYPES) if diff else
+              nullcontext()) as diff_writer:
+            writers = {'gap': gaps_writer, 'conflict': conflicts_writer, 'diff': diff_writer}
+            for kind, finding in findings:
+                writers[kind].write(finding)
+
+        print(f"Analysis complete. {gaps_writer.rows_written} gaps saved to '{gaps_filename}'. "
+              f"{conflicts_writer.rows_written} conflicts saved to '{conflicts_filename}'.")
+        if diff:
+            print(f"{diff_writer.rows_written} gaps added or removed since the previous run saved to '{diff_filename}'.")
+
+    except Exception as e:
+        print(f"Error saving the results to file: {e}")
+        sys.exit(1)
+
+def stream_regions(regions, conflicts=(), output_format='csv', compression=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                   names=None):
+    """
+    Writes uncovered regions from uncovered_regions and policy conflicts from find_conflicts to their files.
+    """
+    rows = iter_region_rows(regions)
+    if names is not None:
+        rows = names.enrich(rows)
+    try:
+        output_dir = os.path.join(os.path.dirname(__file__), '..', 'outputs')
+        regions_filename = output_filename(output_dir, 'uncovered_regions', output_format, compression)
+        conflicts_filename = output_filename(output_dir, 'policy_conflicts', output_format, compression)
+
+        with open_writer(regions_filename, REGION_FIELDS, output_format, compression, chunk_size) as regions_writer:
+            regions_writer.write_rows(rows)
+        with open_writer(conflicts_filename, CONFLICT_FIELDS, output_format, compression, chunk_size) as conflicts_writer:
+            conflicts_writer.write_rows(conflicts)
+
+        print(f"Analysis complete. {regions_writer.rows_written} uncovered regions saved to '{regions_filename}'. "
+              f"{conflicts_writer.rows_written} conflicts saved to '{conflicts_filename}'.")
+
+    except Exception as e:
+        print(f"Error saving the results to file: {e}")
+        sys.exit(1)
+
+def analyze(policies, mode='permutations', output_format='csv', compression=None, names=None, results_cache=None):
+    """
+    Runs the permutation or symbolic analysis on a list of policies and writes the results.
+
+    With results_cache, the permutation analysis reuses the results of unchanged policies from the
+    cache at that path and writes the gaps added or removed since the previous run.
+    """
+    if mode == 'symbolic':
+        stream_regions(uncovered_regions(policies), find_conflicts(policies), output_format, compression, names=names)
+    elif results_cache:
+        cache = ResultCache(results_cache)
+        if cache.previous is None:
+            print("No previous run to compare with; the next run will report what changed.")
+        stream_results(iter_cached_findings(policies, cache), output_format, compression, names=names,
+                       diff=cache.previous is not None)
+        print(f"Reused {cache.hits} of {cache.hits + cache.misses} cached results.")
+        try:
+            cache.save()
+        except OSError as e:
+            print(f"Error saving the results cache: {e}")
+    else:
+        stream_results(iter_findings(policies), output_format, compression, names=names)
+    if names is not None:
+        names.cache.save()
+
+def main(tenant_id, client_id, output_format='csv', compression=None, mode='permutations', names_cache=None,
+         names_ttl=DEFAULT_CACHE_TTL_HOURS, credential_options=None, results_cache=None):
+    try:
+        headers = graph_headers(client_id, tenant_id, **(credential_options or {}))
+    except AuthError as e:
+        print(f"Authentication error: {e}")
+        sys.exit(1)
+    policies = fetch_policies(tenant_id, client_id, headers)
     if not policies:
         print("No policies found or an error occurred during policy retrieval.")
         return
 
-    gaps, conflicts = analyze_permutations(policies)
-    save_results(gaps, conflicts)
+    analyze(policies, mode, output_format, compression, names=name_resolver(names_cache, names_ttl, headers),
+            results_cache=results_cache)
+
+def main_from_snapshot(snapshot_path, allow_expired=False, output_format='csv', compression=None, mode='permutations',
+                       names_cache=None, names_ttl=DEFAULT_CACHE_TTL_HOURS, results_cache=None):
+    """
+    Runs the permutation analysis on the policies in a snapshot, without authenticating or calling Graph.
+    """
+    try:
+        data, header = load_snapshot(snapshot_path, allow_expired=allow_expired)
+    except (OSError, SnapshotError) as e:
+        print(f"Error loading snapshot: {e}")
+        sys.exit(1)
+
+    policies = data.get('policies', [])
+    if not policies:
+        print("No policies found in the snapshot.")
+        return
+
+    print(f"Analyzing snapshot '{snapshot_path}' taken at {header['created_at']}.")
+    names = name_resolver(names_cache, names_ttl)
+    if names is not None:
+        names.seed(data.get('applications', []), key='appId')
+        names.seed(data.get('namedLocations', []))
+    analyze(policies, mode, output_format, compression, names=names, results_cache=results_cache)
 
 if __name__ == '__main__':
-    import sys
-    if len(sys.argv) != 3:
-        print("Usage: python pyCaOptics_app.py <tenant_id> <client_id>")
+    parser = argparse.ArgumentParser(description="Analyze Conditional Access policy permutations for gaps and conflicts.")
+    parser.add_argument('tenant_id', nargs='?', help="The Azure Active Directory tenant ID.")
+    parser.add_argument('client_id', nargs='?', help="The client ID of your Azure App Registration.")
+    parser.add_argument('--from-snapshot', default=None,
+                        help="Analyze the policies in a saved snapshot instead of fetching from Graph.")
+    parser.add_argument('--allow-expired', action='store_true',
+                        help="Analyze a snapshot even if it has expired.")
+    parser.add_argument('--mode', choices=ANALYSIS_MODES, default='permutations',
+                        help="'permutations' lists every uncovered permutation; 'symbolic' reports compact uncovered regions without enumerating them.")
+    parser.add_argument('--output-format', choices=list(OUTPUT_FORMATS), default='csv',
+                        help="Format of the results files. Parquet requires pyarrow.")
+    parser.add_argument('--compression', default=None,
+                        help="Compress the results: gzip, bz2 or xz for csv/jsonl; snappy, gzip, zstd, brotli or lz4 for parquet.")
+    parser.add_argument('--resolve-names', action='store_true',
+                        help="Label GUIDs in the results with display names, looked up in bulk and cached.")
+    parser.add_argument('--names-cache', default=None,
+                        help="Path of the display name cache for --resolve-names (default: cache/names.json.gz).")
+    parser.add_argument('--names-ttl', type=float, default=DEFAULT_CACHE_TTL_HOURS,
+                        help="Hours before a cached display name is looked up again (0 for never).")
+    parser.add_argument('--reuse-results', action='store_true',
+                        help="Reuse the permutation results of unchanged policies from the last run and report the gaps added or removed since.")
+    parser.add_argument('--results-cache', default=None,
+                        help="Path of the results cache for --reuse-results (default: cache/permutations.json.gz).")
+    add_auth_arguments(parser)
+    args = parser.parse_args()
+    options = {
+        'names_cache': (args.names_cache or DEFAULT_NAMES_CACHE) if args.resolve_names else None,
+        'names_ttl': args.names_ttl,
+        'results_cache': (args.results_cache or DEFAULT_PERMUTATIONS_CACHE) if args.reuse_results else None
+    }
+
+    if args.from_snapshot:
+        main_from_snapshot(args.from_snapshot, allow_expired=args.allow_expired,
+                           output_format=args.output_format, compression=args.compression, mode=args.mode,
+                           **options)
+    elif not args.tenant_id or not args.client_id:
+        parser.error("tenant_id and client_id are required unless --from-snapshot is given")
     else:
-        tenant_id = sys.argv[1]
-        client_id = sys.argv[2]
-        main(tenant_id, client_id)
+        main(args.tenant_id, args.client_id, output_format=args.output_format, compression=args.compression, mode=args.mode,
+             credential_options=auth_options(args), **options)
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from collections.abc import Mapping
+from azure.identity import (AuthenticationRecord, CertificateCredential, ClientSecretCredential, DeviceCodeCredential,
+                            InteractiveBrowserCredential, TokenCachePersistenceOptions)
+
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+AUTH_METHODS = ['interactive', 'device-code', 'client-secret', 'certificate']
+DEFAULT_TOKEN_CACHE = 'pyCaOptics'
+DEFAULT_REFRESH_MARGIN = 300
+CLIENT_SECRET_VARIABLE = 'AZURE_CLIENT_SECRET'
+CERTIFICATE_PASSWORD_VARIABLE = 'AZURE_CLIENT_CERTIFICATE_PASSWORD'
+AUTH_RECORD_DIR = os.path.join(os.path.dirname(__file__), '..', 'cache')
+
+class AuthError(Exception):
+    pass
+
+def auth_record_path(tenant_id, client_id=None):
+    """
+    Returns the default path of the saved sign-in record for a tenant and client.
+    """
+    name = '_'.join(part for part in (tenant_id or 'organizations', client_id) if part)
+    return os.path.join(AUTH_RECORD_DIR, f'{name}.auth_record.json')
+
+def load_authentication_record(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return AuthenticationRecord.deserialize(f.read())
+
+def save_authentication_record(record, path):
+    """
+    Saves a sign-in record. It holds the account and authority, not tokens, which stay in the encrypted cache.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(record.serialize())
+
+def build_credential(tenant_id, client_id=None, method='interactive', certificate_path=None, token_cache=DEFAULT_TOKEN_CACHE,
+                     allow_unencrypted_cache=False, record_path=None, secret_variable=CLIENT_SECRET_VARIABLE):
+    """
+    Returns an azure-identity credential for method, with a persistent token cache named token_cache.
+
+    The cache is encrypted at rest by the operating system (DPAPI, Keychain or the Linux secret
+    service); allow_unencrypted_cache falls back to a plain file where no secret service exists.
+    Interactive and device code sign-ins save a record at record_path the first time, so later
+    runs take their token from the cache without prompting. Client secret and certificate
+    credentials are for unattended runs; the secret and certificate password are read from the
+    AZURE_CLIENT_SECRET and AZURE_CLIENT_CERTIFICATE_PASSWORD environment variables so they never
+    appear on a command line; secret_variable names another variable, for a secret per tenant.
+    """
+    options = {}
+    if token_cache:
+        options['cache_persistence_options'] = TokenCachePersistenceOptions(
+            name=token_cache, allow_unencrypted_storage=allow_unencrypted_cache)
+
+    if method == 'client-secret':
+        secret = os.environ.get(secret_variable)
+        if not client_id or not secret:
+            raise AuthError(f"Client secret sign-in needs a client ID and the {secret_variable} environment variable.")
+        return ClientSecretCredential(tenant_id, client_id, secret, **options)
+    if method == 'certificate':
+        if not client_id or not certificate_path:
+            raise AuthError("Certificate sign-in needs a client ID and a certificate path.")
+        return CertificateCredential(tenant_id, client_id, certificate_path,
+                                     password=os.environ.get(CERTIFICATE_PASSWORD_VARIABLE), **options)
+    if method not in ('interactive', 'device-code'):
+        raise AuthError(f"Unknown sign-in method '{method}'. Choose one of {', '.join(AUTH_METHODS)}.")
+
+    record_path = record_path or (auth_record_path(tenant_id, client_id) if token_cache else None)
+    record = load_authentication_record(record_path)
+    if record is not None:
+        options['authentication_record'] = record
+    if client_id:
+        options['client_id'] = client_id
+    credential_class = InteractiveBrowserCredential if method == 'interactive' else DeviceCodeCredential
+    credential = credential_class(tenant_id=tenant_id, **options)
+    if record is None and record_path:
+        save_authentication_record(credential.authenticate(scopes=[GRAPH_SCOPE]), record_path)
+    return credential
+
+class TokenProvider:
+    """
+    Hands out a Graph access token from a credential, refreshing it before it expires.
+
+    A token is reused until fewer than refresh_margin seconds of its lifetime remain, then the
+    credential is asked for a new one, which comes from its cache or a silent refresh. The
+    provider is shared by all fetch threads, so only one of them refreshes at a time.
+    """
+
+    def __init__(self, credential, scope=GRAPH_SCOPE, refresh_margin=DEFAULT_REFRESH_MARGIN, clock=time.time):
+        self.credential = credential
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self.refreshes = 0
+        self._token = None
+        self._lock = threading.Lock()
+
+    def token(self):
+        with self._lock:
+            if self._token is None or self._token.expires_on - self.clock() < self.refresh_margin:
+                self._token = self.credential.get_token(self.scope)
+                self.refreshes += 1
+            return self._token.token
+
+class GraphHeaders(Mapping):
+    """
+    Request headers whose Authorization value is read from a TokenProvider each time they are used.
+
+    Every request copies its headers when it is sent, so passing GraphHeaders wherever a headers
+    dict is expected gives each page of a long crawl a token that is still valid.
+    """
+
+    def __init__(self, provider, extra=None):
+        self.provider = provider
+        self.extra = dict(extra or {'Content-Type': 'application/json'})
+
+    def __getitem__(self, name):
+        if name == 'Authorization':
+            return f"Bearer {self.provider.token()}"
+        return self.extra[name]
+
+    def __iter__(self):
+        yield 'Authorization'
+        yield from self.extra
+
+    def __len__(self):
+        return len(self.extra) + 1
+
+def credential_headers(credential, refresh_margin=DEFAULT_REFRESH_MARGIN):
+    """
+    Returns GraphHeaders for credential, fetching the first token now so sign-in problems surface before any request.
+    """
+    provider = TokenProvider(credential, refresh_margin=refresh_margin)
+    provider.token()
+    return GraphHeaders(provider)
+
+def add_auth_arguments(parser, default_method='interactive'):
+    """
+    Adds the sign-in options to an argument parser.
+    """
+    parser.add_argument('--auth', choices=AUTH_METHODS, default=default_method,
+                        help=f"Sign-in method (default: {default_method}). client-secret reads the secret from "
+                             f"{CLIENT_SECRET_VARIABLE}.")
+    parser.add_argument('--certificate', default=None,
+                        help="PEM or PKCS12 certificate for --auth certificate. A password is read from "
+                             f"{CERTIFICATE_PASSWORD_VARIABLE}.")
+    parser.add_argument('--token-cache', default=DEFAULT_TOKEN_CACHE,
+                        help="Name of the persistent, encrypted token cache shared between runs.")
+    parser.add_argument('--no-token-cache', action='store_true',
+                        help="Keep tokens in memory only and sign in again on every run.")
+    parser.add_argument('--allow-unencrypted-token-cache', action='store_true',
+                        help="Store the token cache unencrypted where the OS has no secret store, e.g. headless Linux.")
+    parser.add_argument('--auth-record', default=None,
+                        help="Path of the saved sign-in record (default: cache/<tenant>_<client>.auth_record.json).")
+
+def auth_options(args):
+    """
+    Converts parsed arguments from add_auth_arguments into keyword arguments for build_credential().
+    """
+    return {
+        'method': args.auth,
+        'certificate_path': args.certificate,
+        'token_cache': None if args.no_token_cache else args.token_cache,
+        'allow_unencrypted_cache': args.allow_unencrypted_token_cache,
+        'record_path': args.auth_record
+    }
@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+from pyCaOptics_fetch import DEFAULT_MAX_WORKERS, GRAPH_BASE_URL, create_session
+from pyCaOptics_scheduler import RETRYABLE_STATUS_CODES, THROTTLE_STATUS_CODES, RequestScheduler, parse_retry_after
+
+# Graph accepts at most 20 requests in one JSON batch
+MAX_BATCH_SIZE = 20
+
+class BatchClient:
+    """
+    Fetches many Graph URLs by packing them into JSON $batch requests.
+
+    Each round sends the pending sub-requests in batches of up to batch_size, up to max_workers
+    batches at a time. Sub-requests that come back throttled or failing transiently are retried in
+    the next round after the backoff the scheduler picks, and collections are followed through
+    their @odata.nextLink, so every URL ends up fully fetched without a round trip per object.
+    """
+
+    def __init__(self, headers, session=None, scheduler=None, base_url=GRAPH_BASE_URL, batch_size=MAX_BATCH_SIZE,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        self.headers = headers
+        self.session = session
+        self.scheduler = scheduler or RequestScheduler(max_concurrency=max_workers)
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.max_workers = max_workers
+        self.batches = 0
+        self.errors = {}
+
+    def relative_url(self, url):
+        """
+        Returns url relative to the Graph version root, as $batch sub-requests require.
+        """
+        if url.startswith(self.base_url):
+            url = url[len(self.base_url):]
+        return url if url.startswith('/') else f'/{url}'
+
+    def fetch(self, urls):
+        """
+        Fetches every URL and returns a dict of results.
+
+        urls is either a dict from key to URL, like the endpoints passed to fetch_data, or a list
+        of URLs used as their own keys. Collections return the list of items across all pages,
+        other resources the object itself. Sub-requests that fail for good are left out of the
+        results and recorded in errors as {'status': ..., 'error': ...}.
+        """
+        if not isinstance(urls, dict):
+            urls = {url: url for url in urls}
+        results = {}
+        self.errors = {}
+        pending = [(key, self.relative_url(url), 0) for key, url in urls.items()]
+
+        owns_session = self.session is None
+        if owns_session:
+            self.session = create_session(self.max_workers)
+        try:
+            while pending:
+                batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+                with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(batches)))) as executor:
+                    responses = list(executor.map(self._send, batches))
+
+                pending, retries = [], []
+                for batch, batch_responses in zip(batches, responses):
+                    for position, (key, url, attempt) in enumerate(batch):
+                        # A sub-response missing from the batch is treated as a transient failure
+                        response = batch_responses.get(str(position), {'status': 503})
+                        next_page = self._handle(results, retries, key, url, attempt, response)
+                        if next_page is not None:
+                            pending.append((key, next_page, 0))
+
+                if retries:
+                    delays = [retry_after for _, _, _, retry_after, _ in retries if retry_after is not None]
+                    self.scheduler.wait_before_retry(max(attempt for _, _, attempt, _, _ in retries),
+                                                     max(delays) if delays else None,
+                                                     any(throttled for _, _, _, _, throttled in retries))
+                    pending.extend((key, url, attempt + 1) for key, url, attempt, _, _ in retries)
+        finally:
+            if owns_session:
+                self.session.close()
+                self.session = None
+        return results
+
+    def _send(self, batch):
+        body = {'requests': [{'id': str(position), 'method': 'GET', 'url': url} for position, (key, url, attempt) in enumerate(batch)]}
+        headers = dict(self.headers, **{'Content-Type': 'application/json'})
+        response = self.scheduler.request(self.session.post, f'{self.base_url}/$batch', json=body, headers=headers)
+        response.raise_for_status()
+        self.batches += 1
+        return {item['id']: item for item in response.json().get('responses', [])}
+
+    def _handle(self, results, retries, key, url, attempt, response):
+        """
+        Stores one sub-response, queueing it in retries if it should be sent again.
+
+        Returns the relative URL of the next page of a collection, or None.
+        """
+        status = response.get('status', 500)
+        body = response.get('body') or {}
+        if status in RETRYABLE_STATUS_CODES and attempt < self.scheduler.max_retries:
+            headers = {name.lower(): value for name, value in (response.get('headers') or {}).items()}
+            retries.append((key, url, attempt, parse_retry_after(headers.get('retry-after')), status in THROTTLE_STATUS_CODES))
+            return None
+        if status >= 400:
+            results.pop(key, None)
+            self.errors[key] = {'status': status, 'error': body.get('error')}
+            return None
+        if key in self.errors:
+            return None
+
+        if 'value' in body:
+            results.setdefault(key, []).extend(body['value'])
+            if body.get('@odata.nextLink'):
+                return self.relative_url(body['@odata.nextLink'])
+        else:
+            results[key] = body
+        return None
+
+def fetch_batch(headers, urls, session=None, scheduler=None, base_url=GRAPH_BASE_URL, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Fetches many Graph URLs through JSON $batch requests. See BatchClient.fetch.
+    """
+    client = BatchClient(headers, session=session, scheduler=scheduler, base_url=base_url, max_workers=max_workers)
+    results = client.fetch(urls)
+    for key, error in client.errors.items():
+        print(f"Error fetching {key} in batch: {error['status']} {error['error']}")
+    return results
@@ -0,0 +1,175 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import pandas as pd
+from pyCaOptics_app import ANALYSIS_FIELDS, ANALYSIS_TYPES, analysis
+from pyCaOptics_app_iter import analyze_permutations, generate_permutations
+from pyCaOptics_fetch import build_endpoints, fetch_data, fetch_paginated_data
+from pyCaOptics_mockgraph import MockGraphServer, graph_resources
+from pyCaOptics_output import open_writer
+from pyCaOptics_regions import uncovered_regions
+from pyCaOptics_synthetic import TenantGenerator, generate_tenant
+from pyCaOptics_whatif import DecisionIndex
+
+REPORT_VERSION = 1
+DEFAULT_THRESHOLD = 0.2
+
+def measure(function, repeat=3, memory=True):
+    """
+    Times function over repeat runs and, with memory, measures its peak traced allocation in one more run.
+
+    Returns (result of the last run, {'seconds': best, 'runs': [...], 'peak_memory_bytes': ...}).
+    Memory is measured separately because tracing allocations slows the code down considerably.
+    """
+    runs = []
+    result = None
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        runs.append(round(time.perf_counter() - start, 6))
+
+    stats = {'seconds': min(runs), 'runs': runs}
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            function()
+            stats['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, stats
+
+def run_benchmarks(users=1000, seed=0, repeat=3, memory=True, page_size=999, benchmarks=None, latency=0.0,
+                   signins=100000):
+    """
+    Generates a synthetic tenant and benchmarks the main stages against it.
+
+    Returns a report dict with one entry per benchmark, ready to be written with save_report. The
+    fetch benchmarks run against a MockGraphServer that delays each response by latency seconds.
+    """
+    data = generate_tenant(users, seed=seed)
+    policies = data['policies']
+    entities = (data['users'], data['groups'], data['applications'])
+    results = {}
+
+    def record(name, function, items=None):
+        if benchmarks and name not in benchmarks:
+            return None
+        result, stats = measure(function, repeat, memory)
+        stats['items'] = items(result) if items else None
+        results[name] = stats
+        print(f"{name}: {stats['seconds']:.4f}s" +
+              (f", peak {stats['peak_memory_bytes'] / 1e6:.1f} MB" if 'peak_memory_bytes' in stats else ''))
+        return result
+
+    rows = analysis(policies, *entities)
+    record('analysis', lambda: analysis(policies, *entities), len)
+    record('generate_permutations', lambda: sum(1 for _ in generate_permutations(policies)), lambda count: count)
+    record('analyze_permutations', lambda: analyze_permutations(policies), lambda found: len(found[0]) + len(found[1]))
+    record('uncovered_regions', lambda: uncovered_regions(policies), len)
+    # A generator with the same seed has the same ids as the tenant, so the sign-ins hit its policies
+    if not benchmarks or 'whatif' in benchmarks:
+        sample = list(TenantGenerator(users, seed=seed).signins(signins))
+        record('whatif', lambda: sum(1 for _ in DecisionIndex(policies).evaluate_all(sample)), lambda count: count)
+
+    with MockGraphServer(graph_resources(data), page_size=page_size, latency=latency) as server:
+        endpoints = build_endpoints(base_url=server.base_url)
+        record('fetch_paginated_data', lambda: fetch_paginated_data(endpoints['users'], {}), len)
+        record('fetch_data', lambda: fetch_data({}, endpoints), lambda fetched: sum(len(items) for items in fetched.values()))
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        path = os.path.join(output_dir, 'analysis_results.csv')
+        # save_results writes a DataFrame to CSV; measure the same work in a scratch directory
+        record('save_results', lambda: pd.DataFrame(rows).to_csv(path, index=False), lambda _: len(rows))
+
+        def stream():
+            with open_writer(path, ANALYSIS_FIELDS, column_types=ANALYSIS_TYPES) as writer:
+                writer.write_rows(rows)
+            return writer.rows_written
+        record('stream_results', stream, lambda written: written)
+
+    return {
+        'version': REPORT_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': {kind: len(items) for kind, items in data.items()},
+        'signins': signins,
+        'seed': seed,
+        'repeat': repeat,
+        'latency': latency,
+        'results': results
+    }
+
+def save_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def compare_reports(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares two reports benchmark by benchmark.
+
+    Returns a list of rows with the relative change in time and peak memory; a row is marked as
+    a regression when either grew by more than threshold (0.2 is 20%).
+    """
+    rows = []
+    for name, stats in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        row = {'benchmark': name, 'seconds': stats['seconds'], 'baseline_seconds': before['seconds'], 'regression': False}
+        for metric in ('seconds', 'peak_memory_bytes'):
+            if stats.get(metric) is not None and before.get(metric):
+                change = stats[metric] / before[metric] - 1
+                row[f'{metric}_change'] = round(change, 4)
+                row['regression'] = row['regression'] or change > threshold
+        rows.append(row)
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark pyCaOptics against a synthetic tenant.")
+    parser.add_argument('--users', type=int, default=10000, help="Number of users in the synthetic tenant (1k to 1M).")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for the synthetic tenant.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per benchmark; the best is reported.")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the peak memory measurement.")
+    parser.add_argument('--page-size', type=int, default=999, help="Page size of the mock Graph server.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds the mock Graph server delays each response.")
+    parser.add_argument('--signins', type=int, default=100000, help="Synthetic sign-ins for the what-if benchmark.")
+    parser.add_argument('--only', nargs='+', default=None, help="Run only these benchmarks.")
+    parser.add_argument('--output', default=None,
+                        help="Path of the JSON report (default: benchmarks/benchmark_<users>_<timestamp>.json).")
+    parser.add_argument('--compare', default=None, help="Compare against a previous report and fail on regressions.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown or memory growth counted as a regression (default 0.2).")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.users, seed=args.seed, repeat=args.repeat, memory=not args.no_memory,
+                            page_size=args.page_size, benchmarks=args.only, latency=args.latency,
+                            signins=args.signins)
+    output = args.output or os.path.join(os.path.dirname(__file__), '..', 'benchmarks',
+                                         f"benchmark_{args.users}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    save_report(report, output)
+    print(f"Benchmark report saved to '{output}'.")
+
+    if args.compare:
+        comparison = compare_reports(load_report(args.compare), report, args.threshold)
+        for row in comparison:
+            changes = [f"{row[f'{metric}_change']:+.1%} {label}"
+                       for metric, label in (('seconds', 'time'), ('peak_memory_bytes', 'memory')) if f'{metric}_change' in row]
+            flag = 'REGRESSION' if row['regression'] else 'ok'
+            print(f"{row['benchmark']}: {row['baseline_seconds']:.4f}s -> {row['seconds']:.4f}s ({', '.join(changes)}) {flag}")
+        if any(row['regression'] for row in comparison):
+            sys.exit(1)
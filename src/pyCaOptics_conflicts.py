@@ -0,0 +1,133 @@
+from pyCaOptics_policy import compile_policies
+from pyCaOptics_regions import DIMENSIONS, policy_regions
+
+# Grant controls that let a sign-in through once satisfied, as opposed to 'block'
+GRANTING_CONTROLS = frozenset([
+    'mfa', 'compliantDevice', 'domainJoinedDevice', 'approvedApplication', 'compliantApplication', 'passwordChange'
+])
+# Session controls and the settings two policies must agree on when both enable them
+SESSION_SETTINGS = {
+    'signInFrequency': ('value', 'type', 'frequencyInterval'),
+    'persistentBrowser': ('mode',),
+    'cloudAppSecurity': ('cloudAppSecurityType',),
+    'continuousAccessEvaluation': ('mode',)
+}
+
+def _session_setting(session_controls, name):
+    control = session_controls.get(name)
+    if not control or control.get('isEnabled') is False:
+        return None
+    return tuple(control.get(key) for key in SESSION_SETTINGS[name])
+
+def control_conflicts(policy, other):
+    """
+    Returns the reasons two compiled policies contradict each other, or an empty list if they agree.
+    """
+    reasons = []
+    for blocking, granting in ((policy, other), (other, policy)):
+        controls = granting.built_in_controls & GRANTING_CONTROLS
+        if 'block' in blocking.built_in_controls and controls:
+            reasons.append(f"'{blocking.display_name}' blocks access that '{granting.display_name}' "
+                           f"grants with {', '.join(sorted(controls))}")
+
+    for name in SESSION_SETTINGS:
+        settings = _session_setting(policy.session_controls, name), _session_setting(other.session_controls, name)
+        if None not in settings and settings[0] != settings[1]:
+            reasons.append(f"Different {name} session control settings")
+    return reasons
+
+def regions_overlap(region, other):
+    """
+    Checks if two regions share at least one sign-in.
+    """
+    return all(not values.intersection(other_values).is_empty() for values, other_values in zip(region, other))
+
+class ConflictIndex:
+    """
+    Finds pairs of policies that apply to the same sign-ins with contradictory controls.
+
+    Each policy's regions are indexed per dimension, from condition value to the regions that
+    include it, alongside the regions that include everything except some values. The candidates
+    for a region are then the intersection, over the dimensions it restricts to a finite set, of
+    the regions that share one of those values or include all of them, so only pairs that can
+    overlap are compared.
+    """
+
+    def __init__(self, policies, states=('enabled',)):
+        self.policies = compile_policies(policies)
+        self.regions = []
+        self.owners = []
+        for position, policy in enumerate(self.policies):
+            if policy.state in states:
+                for region in policy_regions(policy):
+                    self.regions.append(region)
+                    self.owners.append(position)
+
+        self.value_index = [{} for _ in DIMENSIONS]
+        self.complement_index = [set() for _ in DIMENSIONS]
+        for region_id, region in enumerate(self.regions):
+            for dimension, values in enumerate(region):
+                if values.complement:
+                    self.complement_index[dimension].add(region_id)
+                else:
+                    for value in values.values:
+                        self.value_index[dimension].setdefault(value, set()).add(region_id)
+
+    def candidates(self, region_id):
+        """
+        Returns the ids of the regions that may overlap the given region.
+        """
+        candidates = None
+        for dimension, values in enumerate(self.regions[region_id]):
+            if values.complement:
+                continue
+            matching = set(self.complement_index[dimension])
+            for value in values.values:
+                matching.update(self.value_index[dimension].get(value, ()))
+            candidates = matching if candidates is None else candidates & matching
+            if not candidates:
+                break
+        return set(range(len(self.regions))) if candidates is None else candidates
+
+    def pairs(self):
+        """
+        Yields (position, other position, reasons) for every conflicting pair of policies, once per pair.
+        """
+        reported = set()
+        for region_id, owner in enumerate(self.owners):
+            for candidate in self.candidates(region_id):
+                other = self.owners[candidate]
+                pair = (owner, other)
+                if owner >= other or pair in reported:
+                    continue
+                reasons = control_conflicts(self.policies[owner], self.policies[other])
+                if not reasons:
+                    reported.add(pair)
+                elif regions_overlap(self.regions[region_id], self.regions[candidate]):
+                    reported.add(pair)
+                    yield owner, other, reasons
+
+    def partners(self):
+        """
+        Returns a dict from each policy position to the positions of the policies it conflicts with.
+        """
+        partners = {}
+        for position, other, reasons in self.pairs():
+            partners.setdefault(position, set()).add(other)
+            partners.setdefault(other, set()).add(position)
+        return partners
+
+def find_conflicts(policies, states=('enabled',)):
+    """
+    Returns one row per contradiction between two policies whose scopes overlap.
+    """
+    index = ConflictIndex(policies, states)
+    rows = []
+    for position, other, reasons in index.pairs():
+        for reason in reasons:
+            rows.append({
+                'policy': index.policies[position].display_name,
+                'conflicting_policy': index.policies[other].display_name,
+                'issue': reason
+            })
+    return rows
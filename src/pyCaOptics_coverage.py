@@ -0,0 +1,191 @@
+import numpy as np
+from pyCaOptics_groups import GroupResolver
+from pyCaOptics_policy import compile_policy
+
+def _ids(entities, key):
+    if hasattr(entities, 'iter_ids'):
+        return entities.iter_ids(key)
+    return (entity.get(key) for entity in entities)
+
+class EntityIndex:
+    """
+    Maps entity IDs to dense integer indexes, preserving first-seen order.
+    """
+    __slots__ = ('ids', 'positions')
+
+    def __init__(self, ids):
+        self.ids = list(dict.fromkeys(entity_id for entity_id in ids if entity_id))
+        self.positions = {entity_id: position for position, entity_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.positions
+
+    def index_of(self, entity_id):
+        return self.positions[entity_id]
+
+    def mask(self, entity_ids):
+        """
+        Returns a boolean vector with True at the position of every known ID in entity_ids.
+        """
+        mask = np.zeros(len(self.ids), dtype=bool)
+        positions = [self.positions[entity_id] for entity_id in entity_ids if entity_id in self.positions]
+        if positions:
+            mask[positions] = True
+        return mask
+
+def _signatures(matrix):
+    """
+    Packs each column of a policies x entities matrix into a byte signature and groups equal ones.
+
+    Returns the unique signatures (one row per distinct column) and, for every entity, the row of
+    its signature.
+    """
+    packed = np.packbits(matrix.T, axis=1)
+    if packed.shape[1] == 0:
+        packed = np.zeros((matrix.shape[1], 1), dtype=np.uint8)
+    packed = np.ascontiguousarray(packed)
+    # Viewing each row as one opaque value lets np.unique compare rows as single keys
+    rows = packed.view(np.dtype((np.void, packed.shape[1]))).reshape(-1)
+    unique, inverse = np.unique(rows, return_inverse=True)
+    return unique.view(np.uint8).reshape(-1, packed.shape[1]), inverse.reshape(-1)
+
+class CoverageEngine:
+    """
+    Vectorized effective coverage of users, groups and applications across a set of policies.
+
+    Every user, group and application is mapped to a dense index and every policy becomes a
+    boolean row saying which of them it applies to, after includes, exclusions and group
+    membership are resolved. Users and applications that share the same set of applicable
+    policies collapse to one bit-packed signature, so the users x applications coverage is
+    computed between distinct signatures rather than between individual entities.
+    """
+
+    def __init__(self, policies, user_ids, group_ids, application_ids, group_members=None, states=('enabled',)):
+        self.policies = [policy for policy in (compile_policy(p) for p in policies) if policy.state in states]
+        self.users = EntityIndex(user_ids)
+        self.groups = EntityIndex(group_ids)
+        self.applications = EntityIndex(application_ids)
+        self._group_members = {
+            group_id: self.users.mask(members) for group_id, members in (group_members or {}).items()
+        }
+
+        policy_count = len(self.policies)
+        self.user_matrix = np.zeros((policy_count, len(self.users)), dtype=bool)
+        self.group_matrix = np.zeros((policy_count, len(self.groups)), dtype=bool)
+        self.application_matrix = np.zeros((policy_count, len(self.applications)), dtype=bool)
+
+        for row, policy in enumerate(self.policies):
+            self.user_matrix[row] = self._user_row(policy)
+            self.group_matrix[row] = self._group_row(policy)
+            self.application_matrix[row] = self._application_row(policy)
+
+        self._user_signatures, self._user_signature_of = _signatures(self.user_matrix)
+        self._application_signatures, self._application_signature_of = _signatures(self.application_matrix)
+        # Coverage between every distinct user signature and every distinct application signature
+        self._signature_coverage = np.array([
+            np.bitwise_and(signature, self._application_signatures).any(axis=1)
+            for signature in self._user_signatures
+        ], dtype=bool).reshape(len(self._user_signatures), len(self._application_signatures))
+
+    @classmethod
+    def from_data(cls, data, states=('enabled',)):
+        """
+        Builds an engine from the dict returned by fetch_data or load_snapshot.
+
+        Group members are resolved through nested groups when the data holds memberships
+        (fetched with --resolve-groups).
+        """
+        group_members = None
+        if data.get('memberships'):
+            group_members = GroupResolver.from_memberships(data['memberships']).effective_members()
+        return cls(data['policies'], _ids(data.get('users', []), 'id'), _ids(data.get('groups', []), 'id'),
+                   _ids(data.get('applications', []), 'appId'), group_members=group_members, states=states)
+
+    def _members_mask(self, group_ids):
+        mask = np.zeros(len(self.users), dtype=bool)
+        for group_id in group_ids:
+            members = self._group_members.get(group_id)
+            if members is not None:
+                mask |= members
+        return mask
+
+    def _user_row(self, policy):
+        if policy.users.include_all:
+            included = np.ones(len(self.users), dtype=bool)
+        else:
+            included = self.users.mask(policy.users.include) | self._members_mask(policy.groups.include)
+        excluded = self.users.mask(policy.users.exclude) | self._members_mask(policy.groups.exclude)
+        return included & ~excluded
+
+    def _group_row(self, policy):
+        if policy.users.include_all:
+            included = np.ones(len(self.groups), dtype=bool)
+        else:
+            included = self.groups.mask(policy.groups.include)
+        return included & ~self.groups.mask(policy.groups.exclude)
+
+    def _application_row(self, policy):
+        if policy.applications.include_all:
+            included = np.ones(len(self.applications), dtype=bool)
+        else:
+            included = self.applications.mask(policy.applications.include)
+        return included & ~self.applications.mask(policy.applications.exclude)
+
+    def policies_for(self, user_id, application_id):
+        """
+        Returns the policies that apply to a user signing in to an application.
+        """
+        applies = (self.user_matrix[:, self.users.index_of(user_id)] &
+                   self.application_matrix[:, self.applications.index_of(application_id)])
+        return [self.policies[row] for row in np.flatnonzero(applies)]
+
+    def is_covered(self, user_id, application_id):
+        return bool(self._signature_coverage[
+            self._user_signature_of[self.users.index_of(user_id)],
+            self._application_signature_of[self.applications.index_of(application_id)]
+        ])
+
+    def uncovered_users(self):
+        """
+        Returns the IDs of users that no policy applies to.
+        """
+        return [self.users.ids[i] for i in np.flatnonzero(~self.user_matrix.any(axis=0))]
+
+    def uncovered_groups(self):
+        return [self.groups.ids[i] for i in np.flatnonzero(~self.group_matrix.any(axis=0))]
+
+    def uncovered_applications(self):
+        """
+        Returns the IDs of applications that no policy applies to.
+        """
+        return [self.applications.ids[i] for i in np.flatnonzero(~self.application_matrix.any(axis=0))]
+
+    def user_policy_counts(self):
+        return self.user_matrix.sum(axis=0)
+
+    def iter_coverage_matrix(self, chunk_size=8192, packed=True):
+        """
+        Yields (first user index, block) pairs covering the full users x applications matrix.
+
+        Each block holds chunk_size users; with packed, its rows are bit-packed along the
+        application axis so the whole matrix never needs to be held in memory as booleans.
+        """
+        # Expand to one row per distinct user signature first; users then only need a row gather
+        rows = self._signature_coverage[:, self._application_signature_of]
+        if packed:
+            rows = np.packbits(rows, axis=1)
+        for start in range(0, len(self.users), chunk_size):
+            yield start, rows[self._user_signature_of[start:start + chunk_size]]
+
+    def coverage_matrix(self, packed=True):
+        """
+        Returns the full users x applications coverage matrix, bit-packed along applications by default.
+        """
+        blocks = [block for _, block in self.iter_coverage_matrix(packed=packed)]
+        if not blocks:
+            width = (len(self.applications) + 7) // 8 if packed else len(self.applications)
+            return np.zeros((0, width), dtype=np.uint8 if packed else bool)
+        return np.concatenate(blocks)
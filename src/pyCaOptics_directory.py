@@ -0,0 +1,188 @@
+import sys
+import uuid
+import numpy as np
+
+# A GUID as two unsigned 64-bit halves, 16 bytes per value instead of a 36-character string
+GUID_DTYPE = np.dtype([('hi', '<u8'), ('lo', '<u8')])
+LOW_MASK = (1 << 64) - 1
+INITIAL_CAPACITY = 1024
+
+# The fields analysis reads from each directory endpoint; every other property is dropped on ingest
+DIRECTORY_TABLES = {
+    'users': {'guid_fields': ['id']},
+    'groups': {'guid_fields': ['id']},
+    'applications': {'guid_fields': ['id', 'appId']}
+}
+
+def guid_to_int(guid):
+    """
+    Returns the 128-bit integer value of a GUID string, or None if it is missing.
+    """
+    if not guid:
+        return None
+    try:
+        # Parsing the hex digits directly is several times faster than uuid.UUID for canonical GUIDs
+        if len(guid) == 36 and guid[8] == guid[13] == guid[18] == guid[23] == '-':
+            return int(guid.replace('-', ''), 16)
+        return uuid.UUID(guid).int
+    except (ValueError, AttributeError, TypeError):
+        raise ValueError(f"'{guid}' is not a GUID.")
+
+def int_to_guid(value):
+    return str(uuid.UUID(int=value))
+
+class DirectoryTable:
+    """
+    Column storage for the GUID fields of one kind of directory object.
+
+    Each GUID field is a NumPy column of 128-bit values that grows by doubling, and the id column
+    is indexed by a dict from the id's integer value to its row. Other fields listed in
+    text_fields are kept as interned strings. Objects are ingested a page at a time and nothing
+    else of them is kept, so the table is the only copy of the directory in memory. Objects whose
+    GUID fields are not GUIDs are skipped with a warning and counted in skipped.
+    """
+
+    def __init__(self, guid_fields=('id',), text_fields=(), capacity=INITIAL_CAPACITY):
+        self.guid_fields = ['id'] + [name for name in guid_fields if name != 'id']
+        self.text_fields = list(text_fields)
+        self.positions = {}
+        self.skipped = 0
+        self._size = 0
+        self._columns = {name: np.zeros(capacity, dtype=GUID_DTYPE) for name in self.guid_fields}
+        self._text = {name: [] for name in self.text_fields}
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, guid):
+        try:
+            return guid_to_int(guid) in self.positions
+        except ValueError:
+            return False
+
+    def _grow(self):
+        for name, column in self._columns.items():
+            grown = np.zeros(max(INITIAL_CAPACITY, len(column) * 2), dtype=GUID_DTYPE)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _position(self, key):
+        position = self.positions.get(key)
+        if position is None:
+            if self._size == len(self._columns['id']):
+                self._grow()
+            position = self._size
+            self._size += 1
+            self.positions[key] = position
+            for name in self.text_fields:
+                self._text[name].append(None)
+        return position
+
+    def add(self, item):
+        """
+        Stores the needed fields of one object, replacing the row of an object with the same id.
+        """
+        self.ingest([item])
+
+    def ingest(self, items):
+        """
+        Adds a page of objects and returns how many were stored.
+
+        Rows are located first and each GUID column is then written in one vectorized assignment.
+        """
+        positions = []
+        values = {name: [] for name in self.guid_fields}
+        for item in items:
+            try:
+                keys = [guid_to_int(item.get(name)) for name in self.guid_fields]
+            except ValueError as e:
+                if not self.skipped:
+                    print(f"Warning: skipping directory objects with malformed ids, starting with {e}")
+                self.skipped += 1
+                continue
+            if keys[0] is None:
+                continue
+            position = self._position(keys[0])
+            positions.append(position)
+            for name, key in zip(self.guid_fields, keys):
+                values[name].append(key or 0)
+            for name in self.text_fields:
+                value = item.get(name)
+                self._text[name][position] = sys.intern(value) if isinstance(value, str) else value
+
+        if positions:
+            for name, column_values in values.items():
+                self._columns[name][positions] = np.array(
+                    [(value >> 64, value & LOW_MASK) for value in column_values], dtype=GUID_DTYPE
+                )
+        return len(positions)
+
+    def column(self, name='id'):
+        """
+        Returns a GUID column as a structured array of (hi, lo) halves, one per row.
+        """
+        return self._columns[name][:self._size]
+
+    def guid(self, position, name='id'):
+        hi, lo = self._columns[name][position]
+        value = (int(hi) << 64) | int(lo)
+        return int_to_guid(value) if value else None
+
+    def iter_ids(self, name='id'):
+        """
+        Yields the GUID strings of a column, skipping rows where the field was missing.
+        """
+        for position in range(self._size):
+            guid = self.guid(position, name)
+            if guid:
+                yield guid
+
+    def ids_except(self, excluded, name='id'):
+        """
+        Returns the set of GUID strings in a column that are not in excluded.
+
+        Only the surviving ids are converted to strings; the comparison itself runs on the
+        128-bit columns.
+        """
+        values = []
+        for guid in excluded:
+            try:
+                value = guid_to_int(guid)
+            except ValueError:
+                continue
+            if value is not None:
+                values.append((value >> 64, value & LOW_MASK))
+        column = self.column(name)
+        keep = ~np.isin(column, np.array(values, dtype=GUID_DTYPE))
+        keep &= (column['hi'] != 0) | (column['lo'] != 0)
+        return {self.guid(position, name) for position in np.flatnonzero(keep)}
+
+    def __iter__(self):
+        """
+        Yields each object as a small dict of its stored fields, for code that expects Graph objects.
+        """
+        for position in range(self._size):
+            item = {name: self.guid(position, name) for name in self.guid_fields}
+            item.update((name, self._text[name][position]) for name in self.text_fields)
+            yield item
+
+    def nbytes(self):
+        """
+        Returns the approximate memory used by the columns and the id index.
+        """
+        columns = sum(column.nbytes for column in self._columns.values())
+        index = sys.getsizeof(self.positions) + sum(sys.getsizeof(key) for key in self.positions)
+        text = sum(sys.getsizeof(values) for values in self._text.values())
+        return columns + index + text
+
+def directory_tables(text_fields=None):
+    """
+    Returns an empty DirectoryTable for each directory endpoint, to pass as fetch_data's tables.
+
+    text_fields maps endpoint names to extra string properties to keep, such as displayName.
+    """
+    text_fields = text_fields or {}
+    return {
+        name: DirectoryTable(layout['guid_fields'], text_fields.get(name, ()))
+        for name, layout in DIRECTORY_TABLES.items()
+    }
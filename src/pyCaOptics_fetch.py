@@ -0,0 +1,164 @@
+import sys
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from pyCaOptics_scheduler import RequestScheduler
+
+DEFAULT_MAX_WORKERS = 4
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+
+# Each profile lists the properties analysis reads from an endpoint ($select) and the largest
+# page size Graph allows for it ($top). Endpoints without a select list return full objects.
+ENDPOINT_PROFILES = {
+    "policies": {"path": "/identity/conditionalAccess/policies"},
+    "namedLocations": {"path": "/identity/conditionalAccess/namedLocations"},
+    "users": {"path": "/users", "select": ["id"], "top": 999},
+    "groups": {"path": "/groups", "select": ["id"], "top": 999},
+    "applications": {"path": "/applications", "select": ["id", "appId"], "top": 999}
+}
+
+def build_endpoint(path, select=None, top=None, base_url=GRAPH_BASE_URL):
+    """
+    Builds a Graph URL for path with optional $select and $top query options.
+    """
+    options = []
+    if select:
+        options.append(f"$select={','.join(dict.fromkeys(select))}")
+    if top:
+        options.append(f"$top={top}")
+    url = f"{base_url}{path}"
+    return f"{url}?{'&'.join(options)}" if options else url
+
+def build_endpoints(profiles=None, extra_select=None, base_url=GRAPH_BASE_URL):
+    """
+    Builds the endpoints dict passed to fetch_data from endpoint profiles.
+
+    extra_select maps endpoint names to additional properties to request, for analysis steps
+    that need more than the default fields.
+    """
+    profiles = ENDPOINT_PROFILES if profiles is None else profiles
+    extra_select = extra_select or {}
+    endpoints = {}
+    for name, profile in profiles.items():
+        select = profile.get("select")
+        if select and name in extra_select:
+            select = list(select) + list(extra_select[name])
+        endpoints[name] = build_endpoint(profile["path"], select, profile.get("top"), base_url)
+    return endpoints
+
+def create_session(max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Creates a keep-alive session whose connection pool is large enough for max_workers concurrent requests.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def fetch_data(headers, endpoints, max_workers=DEFAULT_MAX_WORKERS, session=None, scheduler=None, tables=None,
+               metrics=None):
+    """
+    Fetches every endpoint concurrently over a shared pooled session.
+
+    At most max_workers endpoints are paginated at once, so the total time is close to that of
+    the slowest endpoint rather than the sum of all of them. All requests go through one
+    RequestScheduler, which retries throttled pages and adapts concurrency for the whole fetch.
+    Endpoints with an entry in tables are ingested page by page into that table (see
+    directory_tables) and the table is returned in place of a list. With a Metrics object, the
+    requests, pages and bytes of each endpoint are counted under its key. If any endpoint fails,
+    the error is reported once, the endpoints not yet started are cancelled and the run exits.
+    """
+    tables = tables or {}
+    owns_session = session is None
+    if owns_session:
+        session = create_session(max_workers)
+    if scheduler is None:
+        scheduler = RequestScheduler(max_concurrency=max_workers)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(endpoints)))) as executor:
+            futures = {}
+            for key, url in endpoints.items():
+                if key in tables:
+                    future = executor.submit(ingest_paginated_data, url, headers, tables[key], session, scheduler,
+                                             metrics, key)
+                else:
+                    future = executor.submit(fetch_paginated_data, url, headers, session, scheduler, metrics, key)
+                futures[key] = (url, future)
+            data = {}
+            for key, (url, future) in futures.items():
+                try:
+                    data[key] = future.result()
+                except requests.exceptions.RequestException as e:
+                    for _, pending in futures.values():
+                        pending.cancel()
+                    print(f"Error fetching data from {url}: {e}")
+                    if e.response is not None:
+                        print(f"Response headers: {e.response.headers}")
+                        print(f"Response content: {e.response.content}")
+                    sys.exit(1)
+            return data
+    finally:
+        if owns_session:
+            session.close()
+
+def iter_pages(url, headers, session=None, scheduler=None, metrics=None, endpoint=None):
+    """
+    Yields each page of a paginated Graph response as parsed JSON.
+
+    With a scheduler, a throttled or failed page is retried from its own @odata.nextLink, so
+    pages already yielded are never fetched again. With a Metrics object, every attempt, page,
+    response byte and second spent waiting or decoding is counted under endpoint.
+    """
+    get = session.get if session is not None else requests.get
+    if metrics is not None:
+        get = _counted(get, metrics, endpoint or url)
+    while url:
+        start = time.perf_counter()
+        if scheduler is not None:
+            response = scheduler.request(get, url, headers=headers)
+        else:
+            response = get(url, headers=headers)
+        response.raise_for_status()
+        decode_start = time.perf_counter()
+        data = response.json()
+        if metrics is not None:
+            metrics.count(endpoint or url, pages=1, items=len(data.get('value', [])), bytes=len(response.content),
+                          request_seconds=decode_start - start, decode_seconds=time.perf_counter() - decode_start)
+        yield data
+        url = data.get('@odata.nextLink')
+
+def _counted(get, metrics, endpoint):
+    # Each call is one attempt, so calls beyond the first for a page are the scheduler's retries
+    attempts = {'url': None}
+
+    def counted_get(url, **kwargs):
+        retry = attempts['url'] == url
+        attempts['url'] = url
+        metrics.count(endpoint, requests=1, retries=int(retry))
+        return get(url, **kwargs)
+    return counted_get
+
+def fetch_paginated_data(url, headers, session=None, scheduler=None, metrics=None, endpoint=None):
+    """
+    Returns the items of every page of a paginated endpoint.
+
+    Raises requests.exceptions.RequestException if a page fails, for the caller to report.
+    """
+    items = []
+    for page in iter_pages(url, headers, session, scheduler, metrics, endpoint):
+        items.extend(page.get('value', []))
+    return items
+
+def ingest_paginated_data(url, headers, table, session=None, scheduler=None, metrics=None, endpoint=None):
+    """
+    Feeds each page of a paginated endpoint to table.ingest and returns the table.
+
+    Pages are dropped as soon as they are ingested, so memory stays close to the size of the table.
+    Raises requests.exceptions.RequestException if a page fails, as fetch_paginated_data does.
+    """
+    for page in iter_pages(url, headers, session, scheduler, metrics, endpoint):
+        table.ingest(page.get('value', []))
+    return table
@@ -0,0 +1,215 @@
+from pyCaOptics_batch import fetch_batch
+from pyCaOptics_fetch import DEFAULT_MAX_WORKERS, GRAPH_BASE_URL, build_endpoint
+
+def _member_kind(member):
+    """
+    Returns 'user', 'group' or None from a directory object's @odata.type.
+    """
+    odata_type = member.get('@odata.type', '')
+    if odata_type.endswith('.group'):
+        return 'group'
+    if odata_type.endswith('.user'):
+        return 'user'
+    return None
+
+def fetch_group_members(headers, group_ids, max_workers=DEFAULT_MAX_WORKERS, session=None, scheduler=None,
+                        base_url=GRAPH_BASE_URL):
+    """
+    Fetches the direct members of group_ids and of every group nested inside them.
+
+    Groups are fetched level by level, each level packed into $batch requests, and only groups
+    reachable from group_ids are requested. Returns a list of {'id': group id, 'members': [...]}
+    records, one per group, in the shape GroupResolver.from_memberships expects and snapshots can store.
+    """
+    memberships = {}
+    pending = list(dict.fromkeys(group_ids))
+    while pending:
+        endpoints = {
+            group_id: build_endpoint(f'/groups/{group_id}/members', ['id'], 999, base_url) for group_id in pending
+        }
+        level = fetch_batch(headers, endpoints, session=session, scheduler=scheduler, base_url=base_url,
+                            max_workers=max_workers)
+        pending = []
+        for group_id, members in level.items():
+            memberships[group_id] = members
+            for member in members:
+                if _member_kind(member) == 'group' and member['id'] not in memberships and member['id'] not in pending:
+                    pending.append(member['id'])
+    return [{'id': group_id, 'members': members} for group_id, members in memberships.items()]
+
+class GroupResolver:
+    """
+    Resolves nested group membership into transitive members, memoized per group.
+
+    Groups are condensed with Tarjan's strongly connected components algorithm, so groups that
+    are members of each other (directly or through other groups) share one component instead of
+    recursing forever. A component only records its direct users and the components nested in
+    it; the closure of a component is built when it is first asked for and shared by all its
+    groups, so memory grows with the closures actually used rather than with nesting depth.
+    """
+
+    def __init__(self, direct_users, direct_groups):
+        self.direct_users = {group_id: set(users) for group_id, users in direct_users.items()}
+        self.direct_groups = {group_id: set(groups) for group_id, groups in direct_groups.items()}
+        self.cycles = []
+        # Group id to component index, and per component its groups, direct users and nested components
+        self._component = {}
+        self._component_groups = []
+        self._component_users = []
+        self._children = []
+        self._cyclic = set()
+        self._user_closures = {}
+        self._group_closures = {}
+
+    @classmethod
+    def from_memberships(cls, memberships):
+        """
+        Builds a resolver from the records returned by fetch_group_members.
+        """
+        direct_users, direct_groups = {}, {}
+        for record in memberships:
+            users = direct_users.setdefault(record['id'], set())
+            groups = direct_groups.setdefault(record['id'], set())
+            for member in record.get('members', []):
+                kind = _member_kind(member)
+                if kind == 'user':
+                    users.add(member['id'])
+                elif kind == 'group':
+                    groups.add(member['id'])
+        return cls(direct_users, direct_groups)
+
+    def members(self, group_id):
+        """
+        Returns every user in group_id, directly or through nested groups.
+        """
+        component = self._component_of(group_id)
+        return self._closure(component, self._user_closures, self._component_users, self._component_users)
+
+    def subgroups(self, group_id):
+        """
+        Returns every group nested inside group_id, at any depth.
+        """
+        component = self._component_of(group_id)
+        # A group is only nested in itself through a cycle
+        own = self._component_groups if component in self._cyclic else None
+        return self._closure(component, self._group_closures, own, self._component_groups) - {group_id}
+
+    def effective_members(self, group_ids=None):
+        """
+        Returns a dict from group id to its transitive user members, for CoverageEngine's group_members.
+        """
+        group_ids = self.direct_users.keys() | self.direct_groups.keys() if group_ids is None else group_ids
+        return {group_id: self.members(group_id) for group_id in group_ids}
+
+    def expand_users(self, group_ids):
+        """
+        Returns the users in any of group_ids, directly or through nested groups.
+        """
+        users = set()
+        for group_id in group_ids:
+            users.update(self.members(group_id))
+        return users
+
+    def expand_groups(self, group_ids):
+        """
+        Returns group_ids together with every group nested inside them.
+        """
+        groups = set(group_ids)
+        for group_id in group_ids:
+            groups.update(self.subgroups(group_id))
+        return groups
+
+    def _component_of(self, group_id):
+        if group_id not in self._component:
+            self._resolve(group_id)
+        return self._component[group_id]
+
+    def _closure(self, component, closures, own, reached):
+        """
+        Returns the union of reached[c] over every component c nested in component, plus own[component].
+
+        Nested components whose closure is already known contribute it instead of being walked again.
+        """
+        closure = closures.get(component)
+        if closure is not None:
+            return closure
+        closure = set(own[component]) if own is not None else set()
+        seen, pending = {component}, list(self._children[component])
+        while pending:
+            child = pending.pop()
+            if child in seen:
+                continue
+            seen.add(child)
+            closure.update(reached[child])
+            if child in closures:
+                closure.update(closures[child])
+            else:
+                pending.extend(self._children[child])
+        closure = closures[component] = frozenset(closure)
+        return closure
+
+    def _resolve(self, start):
+        """
+        Condenses start and every group reachable from it that is not yet in a component.
+
+        Iterative Tarjan: components are completed sinks first, so the components nested in a
+        component are always known when the component itself is finished.
+        """
+        index, lowlink, on_stack = {}, {}, set()
+        stack = []
+        work = [(start, iter(self.direct_groups.get(start, ())))]
+        index[start] = lowlink[start] = 0
+        stack.append(start)
+        on_stack.add(start)
+
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for successor in successors:
+                if successor in self._component:
+                    continue
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(self.direct_groups.get(successor, ()))))
+                    advanced = True
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            if advanced:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = set()
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.add(member)
+                    if member == node:
+                        break
+                self._finish_component(component)
+
+    def _finish_component(self, component):
+        index = len(self._component_groups)
+        for group_id in component:
+            self._component[group_id] = index
+        users, children = set(), set()
+        cyclic = len(component) > 1
+        for group_id in component:
+            users.update(self.direct_users.get(group_id, ()))
+            for subgroup in self.direct_groups.get(group_id, ()):
+                if subgroup in component:
+                    cyclic = True
+                else:
+                    children.add(self._component[subgroup])
+        if cyclic:
+            self._cyclic.add(index)
+            self.cycles.append(sorted(component))
+        self._component_groups.append(frozenset(component))
+        self._component_users.append(users)
+        self._children.append(children)
@@ -0,0 +1,152 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+DEFAULT_RESULTS_CACHE = os.path.join(os.path.dirname(__file__), '..', 'cache', 'analysis.json.gz')
+DIFF_FIELDS = ['Change', 'Policy Name', 'Gap']
+
+def content_hash(value):
+    """
+    Returns the SHA-256 of the canonical JSON of value.
+
+    Keys are sorted and whitespace dropped, so the same policy hashes the same whatever order Graph
+    returned its properties in.
+    """
+    text = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def directory_version(id_lists, memberships=None):
+    """
+    Returns a hash identifying a directory by the ids in each of id_lists and its group memberships.
+    """
+    digest = hashlib.sha256()
+    for ids in id_lists:
+        for object_id in ids:
+            digest.update(object_id.encode('utf-8'))
+            digest.update(b'\n')
+        digest.update(b'\0')
+    if memberships is not None:
+        digest.update(content_hash(memberships).encode('ascii'))
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Analysis results of earlier runs keyed by the content hash of their inputs, persisted to disk.
+
+    A run looks results up with get() and stores new ones with put(). Saving keeps only the
+    entries the run used, so the file holds what the next run can reuse and does not grow from
+    run to run. A summary of the run's findings is saved with it as run and is read back as
+    previous by the next run, to report what changed.
+    """
+
+    def __init__(self, path=DEFAULT_RESULTS_CACHE):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.previous = None
+        self.run = None
+        self._stored = {}
+        self._used = {}
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._used)
+
+    def get(self, key):
+        """
+        Returns the result stored under key, or None, keeping it for the next run if found.
+        """
+        value = self._used.get(key)
+        if value is None:
+            value = self._stored.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used[key] = value
+        return value
+
+    def put(self, key, value):
+        self._used[key] = value
+
+    def stored(self, key):
+        """
+        Returns the result an earlier run stored under key without keeping it, for diffs against that run.
+        """
+        return self._stored.get(key)
+
+    def load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            state = json.load(f)
+        self._stored = state.get('results', {})
+        self.previous = state.get('run')
+
+    def save(self):
+        """
+        Writes the results used by this run and its summary to disk, replacing the file atomically.
+        """
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f'{self.path}.tmp'
+        state = {'saved_at': datetime.now(timezone.utc).isoformat(), 'results': self._used, 'run': self.run}
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+
+def encode_bits(bits):
+    """
+    Encodes a bytearray bitmap from set_bit() as a string for the cache.
+    """
+    return base64.b64encode(bytes(bits)).decode('ascii')
+
+def decode_bits(text):
+    return base64.b64decode(text)
+
+def set_bit(bits, index):
+    position = index >> 3
+    if position >= len(bits):
+        bits.extend(bytes(position - len(bits) + 1))
+    bits[position] |= 1 << (index & 7)
+
+def has_bit(bits, index):
+    position = index >> 3
+    return position < len(bits) and bool(bits[position] >> (index & 7) & 1)
+
+def iter_gap_diff(previous, current):
+    """
+    Yields a diff row for every gap added or removed between two analysis run summaries.
+
+    A summary maps 'gaps' to the gaps of each policy by id, 'names' to the display name of each
+    policy by id and 'uncovered' to the uncovered ids of each entity type, as recorded by
+    iter_analysis. Policies are listed in the order of the current run, then those that no
+    longer exist, under their latest display name.
+    """
+    previous = previous or {}
+    previous_gaps = previous.get('gaps', {})
+    current_gaps = current.get('gaps', {})
+    names = {**previous.get('names', {}), **current.get('names', {})}
+    for policy in list(current_gaps) + [policy for policy in previous_gaps if policy not in current_gaps]:
+        before, after = previous_gaps.get(policy, []), current_gaps.get(policy, [])
+        yield from _diff_rows(names.get(policy, policy), before, after)
+
+    # Runs writing the long coverage output record no coverage check to compare
+    if 'uncovered' not in previous or 'uncovered' not in current:
+        return
+    previous_uncovered, current_uncovered = previous['uncovered'], current['uncovered']
+    for kind in dict.fromkeys(list(current_uncovered) + list(previous_uncovered)):
+        yield from _diff_rows('Coverage Check', previous_uncovered.get(kind, []), current_uncovered.get(kind, []),
+                              f"Uncovered {kind}: {{}}")
+
+def _diff_rows(policy, before, after, template='{}'):
+    before_set, after_set = set(before), set(after)
+    for gap in after:
+        if gap not in before_set:
+            yield {'Change': 'added', 'Policy Name': policy, 'Gap': template.format(gap)}
+    for gap in before:
+        if gap not in after_set:
+            yield {'Change': 'removed', 'Policy Name': policy, 'Gap': template.format(gap)}
@@ -0,0 +1,277 @@
+import argparse
+import gzip
+import ipaddress
+import os
+import socket
+import sys
+import time
+from bisect import bisect_right
+from pyCaOptics_incremental import content_hash
+from pyCaOptics_output import DEFAULT_CHUNK_SIZE, OUTPUT_FORMATS, open_writer, output_filename
+
+# Location condition values that are not named location ids
+TRUSTED_LOCATIONS = 'AllTrusted'
+SPECIAL_LOCATIONS = frozenset(['All', TRUSTED_LOCATIONS])
+OVERLAP_FIELDS = ['location', 'range', 'other_location', 'other_range', 'issue']
+IP_LOOKUP_FIELDS = ['ip', 'locations', 'trusted']
+IP_LOOKUP_TYPES = {'locations': 'list', 'trusted': 'bool'}
+# The upper 96 bits of an IPv4-mapped IPv6 address, ::ffff:0:0/96
+IPV4_MAPPED_PREFIX = 0xFFFF
+
+class LocationIndex:
+    """
+    Maps IP addresses to the named locations whose IP ranges contain them.
+
+    The CIDR ranges of all IP named locations are cut into sorted, disjoint segments, one list for
+    IPv4 and one for IPv6, each segment holding the tuple of location ids that cover it. Looking
+    up an address is a bisect over the segment starts, so it costs O(log n) in the number of
+    ranges however much they overlap. Country named locations are matched by country code, since
+    resolving an address to a country needs a geolocation database.
+    """
+
+    def __init__(self, named_locations):
+        self.names = {}
+        self.trusted = set()
+        self.countries = {}
+        self.ranges = {4: [], 6: []}
+        self.invalid = []
+        for location in named_locations:
+            location_id = location.get('id')
+            if not location_id:
+                continue
+            self.names[location_id] = location.get('displayName') or location_id
+            if location.get('isTrusted'):
+                self.trusted.add(location_id)
+            for country in location.get('countriesAndRegions') or ():
+                self.countries.setdefault(country.upper(), []).append(location_id)
+            for ip_range in location.get('ipRanges') or ():
+                cidr = ip_range.get('cidrAddress')
+                try:
+                    network = ipaddress.ip_network(cidr, strict=False)
+                except (TypeError, ValueError):
+                    self.invalid.append((location_id, cidr))
+                    continue
+                self.ranges[network.version].append(
+                    (int(network.network_address), int(network.broadcast_address), location_id, network))
+        self._segments = {version: _segments(ranges) for version, ranges in self.ranges.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def version(self):
+        """
+        A hash of everything lookups depend on, for keying results cached across runs.
+        """
+        ranges = {version: [(str(network), location_id) for _, _, location_id, network in ranges]
+                  for version, ranges in self.ranges.items()}
+        return content_hash([self.names, sorted(self.trusted), self.countries, ranges, self.invalid])
+
+    def lookup(self, address):
+        """
+        Returns the sorted tuple of named location ids whose IP ranges contain address.
+
+        Unparseable addresses match no location. IPv4-mapped IPv6 addresses are looked up as IPv4.
+        """
+        version, value = _parse_address(address)
+        if version is None:
+            return ()
+        starts, locations = self._segments[version]
+        position = bisect_right(starts, value) - 1
+        return locations[position] if position >= 0 else ()
+
+    def locate(self, address, country=None):
+        """
+        Returns the location condition values a sign-in from address and country matches.
+
+        These are the named locations containing the address or listing the country, plus
+        AllTrusted if any of them is trusted, ready for the location key of a what-if sign-in.
+        """
+        locations = list(self.lookup(address))
+        if country:
+            locations.extend(location_id for location_id in self.countries.get(country.upper(), ())
+                             if location_id not in locations)
+        if any(location_id in self.trusted for location_id in locations):
+            locations.append(TRUSTED_LOCATIONS)
+        return locations
+
+    def signin_locations(self, record):
+        """
+        Returns the location values of a Graph signIn record, for signin_from_graph's locate hook.
+        """
+        return self.locate(record.get('ipAddress'), (record.get('location') or {}).get('countryOrRegion'))
+
+    def unknown(self, location_ids):
+        """
+        Returns the ids in location_ids that are not named locations of this tenant.
+        """
+        return sorted(set(location_ids) - SPECIAL_LOCATIONS - set(self.names))
+
+    def overlapping_pairs(self):
+        """
+        Returns the set of (location id, location id) pairs of different locations with overlapping ranges.
+        """
+        pairs = set()
+        for other, current in self._iter_overlaps():
+            first, second = other[2], current[2]
+            if first != second:
+                pairs.add((first, second))
+                pairs.add((second, first))
+        return pairs
+
+    def _iter_overlaps(self):
+        # CIDR blocks are either nested or disjoint, so sorting by start and then widest first
+        # puts every range after all the ranges that contain it
+        for ranges in self.ranges.values():
+            active = []
+            for current in sorted(ranges, key=lambda item: (item[0], -item[1])):
+                active = [other for other in active if other[1] >= current[0]]
+                for other in active:
+                    yield other, current
+                active.append(current)
+
+    def iter_overlap_rows(self):
+        """
+        Yields a report row for every duplicate, shadowed or invalid named location range.
+
+        A range is shadowed when a wider range of the same or another location contains it: in
+        the same location it is redundant, in another one both locations match its addresses.
+        """
+        for location_id, cidr in self.invalid:
+            yield {'location': self.names[location_id], 'range': cidr, 'other_location': None, 'other_range': None,
+                   'issue': 'Invalid IP range'}
+        for other, current in self._iter_overlaps():
+            if (other[0], other[1]) == (current[0], current[1]):
+                issue = 'Duplicate range' if other[2] == current[2] else 'Range also in another location'
+            else:
+                issue = 'Redundant range' if other[2] == current[2] else 'Shadowed by a wider range'
+            if other[2] != current[2] and (other[2] in self.trusted) != (current[2] in self.trusted):
+                issue += ' with different trust'
+            yield {'location': self.names[current[2]], 'range': str(current[3]),
+                   'other_location': self.names[other[2]], 'other_range': str(other[3]), 'issue': issue}
+
+def _parse_address(address):
+    """
+    Returns (IP version, integer value) of an address, or (None, None) if it is not one.
+    """
+    # inet_pton is several times faster than ipaddress and handles the plain addresses sign-in logs hold
+    for version, family in ((4, socket.AF_INET), (6, socket.AF_INET6)):
+        try:
+            value = int.from_bytes(socket.inet_pton(family, address), 'big')
+            break
+        except (OSError, TypeError):
+            continue
+    else:
+        try:
+            parsed = ipaddress.ip_address(address)
+        except (TypeError, ValueError):
+            return None, None
+        version, value = parsed.version, int(parsed)
+    if version == 6 and value >> 32 == IPV4_MAPPED_PREFIX:
+        return 4, value & 0xFFFFFFFF
+    return version, value
+
+def _segments(ranges):
+    """
+    Cuts (first, last, location id, network) ranges into disjoint segments.
+
+    Returns the sorted segment starts and the tuple of location ids covering each segment; the
+    segment after the last range, and any gaps, map to the empty tuple. Adjacent segments with
+    the same locations are merged and equal tuples are shared.
+    """
+    events = {}
+    for first, last, location_id, _ in ranges:
+        events.setdefault(first, []).append((location_id, 1))
+        events.setdefault(last + 1, []).append((location_id, -1))
+
+    starts, locations, interned = [], [], {}
+    active = {}
+    for position in sorted(events):
+        for location_id, change in events[position]:
+            count = active.get(location_id, 0) + change
+            if count:
+                active[location_id] = count
+            else:
+                del active[location_id]
+        covering = tuple(sorted(active))
+        covering = interned.setdefault(covering, covering)
+        if locations and locations[-1] == covering:
+            continue
+        starts.append(position)
+        locations.append(covering)
+    return starts, locations
+
+def read_addresses(path):
+    """
+    Streams IP addresses from a text file with one address per line, optionally gzip-compressed.
+
+    Blank lines and lines starting with # are skipped.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+def iter_lookup_rows(index, addresses):
+    """
+    Yields the named locations of each address as a result row.
+    """
+    for address in addresses:
+        locations = index.lookup(address)
+        yield {'ip': address, 'locations': [index.names[location_id] for location_id in locations],
+               'trusted': any(location_id in index.trusted for location_id in locations)}
+
+def save_overlaps(index, output_format='csv', compression=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Writes the overlap report of a LocationIndex to the named_location_overlaps file.
+    """
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'output')
+    filename = output_filename(output_dir, 'named_location_overlaps', output_format, compression)
+    with open_writer(filename, OVERLAP_FIELDS, output_format, compression, chunk_size) as writer:
+        writer.write_rows(index.iter_overlap_rows())
+    print(f"{writer.rows_written} overlapping or invalid named location ranges saved to '{filename}'.")
+    return filename
+
+def lookup_file(index, addresses_path, output_format='csv', compression=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Looks up every address in a file and writes the named locations of each to the ip_locations file.
+    """
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'output')
+    filename = output_filename(output_dir, 'ip_locations', output_format, compression)
+    start = time.perf_counter()
+    with open_writer(filename, IP_LOOKUP_FIELDS, output_format, compression, chunk_size, IP_LOOKUP_TYPES) as writer:
+        writer.write_rows(iter_lookup_rows(index, read_addresses(addresses_path)))
+    elapsed = time.perf_counter() - start
+    rate = f" ({writer.rows_written / elapsed:,.0f} per second)" if elapsed else ''
+    print(f"Looked up {writer.rows_written} addresses in {len(index)} named locations{rate}. Results saved to '{filename}'.")
+    return filename
+
+if __name__ == '__main__':
+    from pyCaOptics_snapshot import SnapshotError, load_snapshot
+
+    parser = argparse.ArgumentParser(description="Report overlapping named location ranges and look up IP addresses.")
+    parser.add_argument('--from-snapshot', required=True, help="Snapshot holding the named locations.")
+    parser.add_argument('--allow-expired', action='store_true', help="Use the snapshot even if it has expired.")
+    parser.add_argument('--lookup', default=None,
+                        help="Text file of IP addresses, one per line, to map to named locations.")
+    parser.add_argument('--output-format', choices=list(OUTPUT_FORMATS), default='csv',
+                        help="Format of the results files. Parquet requires pyarrow.")
+    parser.add_argument('--compression', default=None,
+                        help="Compress the results: gzip, bz2 or xz for csv/jsonl; snappy, gzip, zstd, brotli or lz4 for parquet.")
+    args = parser.parse_args()
+
+    try:
+        data, _ = load_snapshot(args.from_snapshot, allow_expired=args.allow_expired)
+    except (OSError, SnapshotError) as e:
+        print(f"Error loading snapshot: {e}")
+        sys.exit(1)
+    if 'namedLocations' not in data:
+        print("The snapshot has no named locations. Take a new snapshot to include them.")
+        sys.exit(1)
+
+    index = LocationIndex(data['namedLocations'])
+    save_overlaps(index, args.output_format, args.compression)
+    if args.lookup:
+        lookup_file(index, args.lookup, args.output_format, args.compression)
@@ -0,0 +1,243 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then left out of the metrics
+    resource = None
+
+METRICS_FORMATS = ['json', 'prometheus']
+METRICS_VERSION = 1
+PROMETHEUS_PREFIX = 'pycaoptics'
+ENDPOINT_COUNTERS = ['requests', 'pages', 'items', 'bytes', 'retries', 'request_seconds', 'decode_seconds']
+
+def current_rss():
+    """
+    Returns the resident set size of this process in bytes, or None where it cannot be read.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return peak_rss()
+
+def peak_rss():
+    """
+    Returns the highest resident set size this process has reached in bytes, or None without the resource module.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Metrics:
+    """
+    Collects per-stage timings, per-endpoint request counters and memory use of one run.
+
+    Stages are timed with the stage() context manager and may nest, so a stage's time includes
+    the stages inside it. fetch_data and iter_pages add request, page, byte and retry counts per
+    endpoint with count(). With sample_interval, a background thread samples the resident set
+    size and records the peak seen during each stage; without it, each stage records the RSS at
+    its end. The counters are thread-safe, since endpoints are fetched concurrently.
+    """
+
+    def __init__(self, sample_interval=None, clock=time.perf_counter):
+        self.clock = clock
+        self.sample_interval = sample_interval
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.stages = {}
+        self.endpoints = {}
+        self.scheduler = {}
+        self._lock = threading.Lock()
+        self._active = []
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def __enter__(self):
+        self.start_sampling()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop_sampling()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the block as stage name, adding to its total if the stage runs more than once.
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'peak_rss_bytes': None})
+            self._active.append(stage)
+        self._record_rss(stage, current_rss())
+        start = self.clock()
+        try:
+            yield stage
+        finally:
+            elapsed = self.clock() - start
+            self._record_rss(stage, current_rss())
+            with self._lock:
+                stage['seconds'] += elapsed
+                stage['calls'] += 1
+                self._active.remove(stage)
+
+    def add(self, name, seconds, calls=1):
+        """
+        Adds seconds measured elsewhere to stage name, for work that is not one contiguous block.
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'peak_rss_bytes': None})
+            stage['seconds'] += seconds
+            stage['calls'] += calls
+        self._record_rss(stage, current_rss())
+
+    def count(self, endpoint, **counters):
+        """
+        Adds counters such as requests=1 or bytes=512 to an endpoint's totals.
+        """
+        with self._lock:
+            totals = self.endpoints.setdefault(endpoint, dict.fromkeys(ENDPOINT_COUNTERS, 0))
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+
+    def record_scheduler(self, stats):
+        """
+        Stores the retry and backoff counters from RequestScheduler.stats().
+        """
+        self.scheduler = dict(stats)
+
+    def _record_rss(self, stage, rss):
+        if rss is None:
+            return
+        with self._lock:
+            if stage['peak_rss_bytes'] is None or rss > stage['peak_rss_bytes']:
+                stage['peak_rss_bytes'] = rss
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            rss = current_rss()
+            with self._lock:
+                active = list(self._active)
+            for stage in active:
+                self._record_rss(stage, rss)
+
+    def start_sampling(self):
+        if self.sample_interval and self._sampler is None:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+            self._sampler.start()
+
+    def stop_sampling(self):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'version': METRICS_VERSION,
+                'started_at': self.started_at,
+                'stages': {name: {**stage, 'seconds': round(stage['seconds'], 6)} for name, stage in self.stages.items()},
+                'endpoints': {
+                    name: {counter: round(value, 6) if isinstance(value, float) else value for counter, value in totals.items()}
+                    for name, totals in self.endpoints.items()
+                },
+                'scheduler': dict(self.scheduler),
+                'peak_rss_bytes': peak_rss()
+            }
+
+    def prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format, for a node exporter textfile collector.
+        """
+        metrics = self.as_dict()
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            if not samples:
+                return
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape_label(label)}"' for key, label in labels.items())
+                lines.append(f"{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value}" if labels
+                             else f"{PROMETHEUS_PREFIX}_{name} {value}")
+
+        stages = metrics['stages']
+        family('stage_seconds', 'gauge', 'Wall-clock seconds spent in each stage.',
+               [({'stage': name}, stage['seconds']) for name, stage in stages.items()])
+        family('stage_calls', 'gauge', 'Number of times each stage ran.',
+               [({'stage': name}, stage['calls']) for name, stage in stages.items()])
+        family('stage_peak_rss_bytes', 'gauge', 'Highest resident set size seen during each stage.',
+               [({'stage': name}, stage['peak_rss_bytes']) for name, stage in stages.items()
+                if stage['peak_rss_bytes'] is not None])
+        for counter in ENDPOINT_COUNTERS:
+            suffix = counter if counter.endswith('seconds') else f'{counter}_total'
+            family(f'endpoint_{suffix}', 'counter', f"Per-endpoint {counter.replace('_', ' ')}.",
+                   [({'endpoint': name}, totals.get(counter, 0)) for name, totals in metrics['endpoints'].items()])
+        for counter, value in metrics['scheduler'].items():
+            family(f'scheduler_{counter}', 'gauge', f"Request scheduler {counter.replace('_', ' ')}.", [({}, value)])
+        if metrics['peak_rss_bytes'] is not None:
+            family('peak_rss_bytes', 'gauge', 'Highest resident set size of the process.', [({}, metrics['peak_rss_bytes'])])
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path, metrics_format='json'):
+        """
+        Writes the metrics to path as JSON or Prometheus text.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            if metrics_format == 'prometheus':
+                f.write(self.prometheus())
+            else:
+                json.dump(self.as_dict(), f, indent=2)
+
+class TimedIterator:
+    """
+    Wraps an iterable and adds up the time spent producing its items in seconds.
+
+    Used to split a streamed write into the time spent computing rows and the time spent writing them.
+    """
+
+    def __init__(self, iterable, clock=time.perf_counter):
+        self.iterator = iter(iterable)
+        self.clock = clock
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = self.clock()
+        try:
+            return next(self.iterator)
+        finally:
+            self.seconds += self.clock() - start
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+@contextmanager
+def profiled(path=None):
+    """
+    Runs the block under cProfile and dumps the stats to path, for pstats or snakeviz. Does nothing without a path.
+    """
+    if not path:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        profiler.dump_stats(path)
@@ -0,0 +1,332 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+class MockGraphServer:
+    """
+    A local stand-in for the Microsoft Graph endpoints used by pyCaOptics.
+
+    Objects are held per resource (users, groups, applications, ...) and every change is recorded
+    with a version number, so /<resource>/delta can serve an initial full sync followed by
+    incremental changes, the same way Graph delta queries do. Use it as a context manager; the
+    server listens on a free local port and base_url points at its /v1.0 root.
+
+    For load testing, latency delays every response by that many seconds, and throttle_every
+    answers every nth GET with 429 and a Retry-After of retry_after seconds, without advancing the
+    page. Pages hold page_size objects, or fewer if the request asks for a smaller $top.
+    """
+
+    def __init__(self, resources=None, page_size=100, host='127.0.0.1', port=0, latency=0.0, throttle_every=0,
+                 retry_after=0):
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.version = 0
+        self.resources = {}
+        self.changes = {}
+        self.requests = []
+        self.throttled_requests = 0
+        self._gets = 0
+        self._listings = {}
+        self._lock = threading.Lock()
+        for name, items in (resources or {}).items():
+            self.resources[name] = {}
+            self.changes[name] = []
+            for item in items:
+                self.upsert(name, item)
+
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @classmethod
+    def synthetic(cls, users=1000, seed=0, **options):
+        """
+        Returns a server for a synthetic tenant from pyCaOptics_synthetic, with the endpoints fetch_data reads.
+        """
+        from pyCaOptics_synthetic import generate_tenant
+        return cls(graph_resources(generate_tenant(users, seed=seed)), **options)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1.0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def upsert(self, resource, item):
+        """
+        Adds or replaces an object and records the change for delta queries.
+        """
+        with self._lock:
+            self.version += 1
+            self.resources.setdefault(resource, {})[item['id']] = dict(item)
+            self.changes.setdefault(resource, []).append((self.version, item['id']))
+
+    def delete(self, resource, item_id):
+        """
+        Removes an object and records the deletion for delta queries.
+        """
+        with self._lock:
+            self.version += 1
+            self.resources.get(resource, {}).pop(item_id, None)
+            self.changes.setdefault(resource, []).append((self.version, item_id))
+
+    def _delta_items(self, resource, since):
+        objects = self.resources.get(resource, {})
+        if since == 0:
+            return list(objects.values())
+
+        changed_ids = dict.fromkeys(item_id for version, item_id in self.changes.get(resource, []) if version > since)
+        items = []
+        for item_id in changed_ids:
+            if item_id in objects:
+                items.append(objects[item_id])
+            else:
+                items.append({'id': item_id, '@removed': {'reason': 'deleted'}})
+        return items
+
+    def _page(self, base, items, offset, next_query, final_link, query):
+        page_size = self.page_size
+        if '$top' in query:
+            page_size = max(1, min(page_size, int(query['$top'][0])))
+        # Only the objects on this page are projected, so serving a page costs O(page_size)
+        page = {'value': self._select(items[offset:offset + page_size], query)}
+        if offset + page_size < len(items):
+            page['@odata.nextLink'] = f"{base}?{next_query}{offset + page_size}"
+        elif final_link:
+            page.update(final_link)
+        return page
+
+    def _select(self, items, query):
+        select = query.get('$select')
+        if not select:
+            return items
+        fields = set(select[0].split(',')) | {'id', '@removed', '@odata.type'}
+        return [{key: value for key, value in item.items() if key in fields} for item in items]
+
+    def _listing(self, resource):
+        # The object list of a resource is rebuilt only after a change, not for every page
+        listing = self._listings.get(resource)
+        if listing is None or listing[0] != self.version:
+            listing = (self.version, list(self.resources[resource].values()))
+            self._listings[resource] = listing
+        return listing[1]
+
+    def _query_prefix(self, query):
+        options = [f"{name}={query[name][0]}" for name in ('$select', '$top') if name in query]
+        return ''.join(f"{option}&" for option in options)
+
+    def throttle(self):
+        """
+        Counts a GET request and returns True if it should be answered with 429.
+        """
+        with self._lock:
+            self._gets += 1
+            if self.throttle_every and self._gets % self.throttle_every == 0:
+                self.throttled_requests += 1
+                return True
+            return False
+
+    def handle(self, path, query):
+        """
+        Returns (status, body) for a GET request.
+        """
+        host, port = self._server.server_address[:2]
+        base = f"http://{host}:{port}{path}"
+        parts = [part for part in path.split('/') if part][1:]
+
+        with self._lock:
+            if len(parts) == 2 and parts[1] == 'delta':
+                resource = parts[0]
+                if resource not in self.resources:
+                    return 404, {'error': {'code': 'Request_ResourceNotFound', 'message': path}}
+                if '$deltatoken' in query:
+                    since, offset = int(query['$deltatoken'][0]), 0
+                elif '$skiptoken' in query:
+                    since, offset = (int(token) for token in query['$skiptoken'][0].split(':'))
+                else:
+                    since, offset = 0, 0
+                if since > self.version:
+                    return 410, {'error': {'code': 'syncStateNotFound', 'message': 'The delta token has expired.'}}
+
+                items = self._delta_items(resource, since)
+                prefix = self._query_prefix(query)
+                return 200, self._page(base, items, offset, f"{prefix}$skiptoken={since}:",
+                                       {'@odata.deltaLink': f"{base}?{prefix}$deltatoken={self.version}"}, query)
+
+            resource = '/'.join(parts)
+            if resource not in self.resources:
+                return 404, {'error': {'code': 'Request_ResourceNotFound', 'message': path}}
+            offset = int(query['$skiptoken'][0]) if '$skiptoken' in query else 0
+            return 200, self._page(base, self._listing(resource), offset, f"{self._query_prefix(query)}$skiptoken=",
+                                   None, query)
+
+    def _batch_item(self, request):
+        """
+        Returns the response to one sub-request of a $batch call.
+        """
+        url = urlsplit(f"/v1.0/{request.get('url', '').lstrip('/')}")
+        status, body = self.handle(url.path, parse_qs(url.query))
+        return {'id': request.get('id'), 'status': status, 'headers': {'Content-Type': 'application/json'}, 'body': body}
+
+    def handle_batch(self, body):
+        """
+        Returns (status, body) for a JSON $batch request, answering each sub-request like a GET.
+        """
+        requests = body.get('requests', [])
+        if len(requests) > 20:
+            return 400, {'error': {'code': 'BadRequest', 'message': 'A batch may contain at most 20 requests.'}}
+        return 200, {'responses': [self._batch_item(request) for request in requests]}
+
+    def get_by_ids(self, body):
+        """
+        Returns (status, body) for directoryObjects/getByIds, searching every top-level resource.
+        """
+        ids = body.get('ids', [])
+        if len(ids) > 1000:
+            return 400, {'error': {'code': 'BadRequest', 'message': 'At most 1000 ids are allowed.'}}
+        with self._lock:
+            objects = {}
+            for resource, items in self.resources.items():
+                if '/' not in resource:
+                    objects.update(items)
+            return 200, {'value': [objects[object_id] for object_id in ids if object_id in objects]}
+
+    def handle_post(self, path, body):
+        """
+        Returns (status, body) for a POST request.
+        """
+        path = path.rstrip('/')
+        if path.endswith('/$batch'):
+            return self.handle_batch(body)
+        if path.endswith('/directoryObjects/getByIds'):
+            return self.get_by_ids(body)
+        return 405, {'error': {'code': 'MethodNotAllowed', 'message': path}}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                server.requests.append(self.path)
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.throttle():
+                    self._respond(429, {'error': {'code': 'TooManyRequests', 'message': 'Too many requests.'}},
+                                  {'Retry-After': str(server.retry_after)})
+                    return
+                status, body = server.handle(url.path, parse_qs(url.query))
+                self._respond(status, body)
+
+            def do_POST(self):
+                server.requests.append(self.path)
+                if server.latency:
+                    time.sleep(server.latency)
+                length = int(self.headers.get('Content-Length') or 0)
+                status, body = server.handle_post(urlsplit(self.path).path, json.loads(self.rfile.read(length) or b'{}'))
+                self._respond(status, body)
+
+            def _respond(self, status, body, headers=None):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def graph_resources(data):
+    """
+    Maps tenant data onto the MockGraphServer resources that build_endpoints requests.
+    """
+    return {
+        'identity/conditionalAccess/policies': data['policies'],
+        'identity/conditionalAccess/namedLocations': data.get('namedLocations', []),
+        'users': data['users'],
+        'groups': data['groups'],
+        'applications': data['applications']
+    }
+
+def measure_fetch(server, max_workers=4, scheduler=None):
+    """
+    Fetches every endpoint of a running server with fetch_data and returns throughput statistics.
+    """
+    from pyCaOptics_fetch import build_endpoints, fetch_data
+    from pyCaOptics_metrics import Metrics
+    from pyCaOptics_scheduler import RequestScheduler
+
+    scheduler = scheduler or RequestScheduler(max_concurrency=max_workers)
+    metrics = Metrics()
+    start = time.perf_counter()
+    data = fetch_data({}, build_endpoints(base_url=server.base_url), max_workers=max_workers, scheduler=scheduler,
+                      metrics=metrics)
+    seconds = time.perf_counter() - start
+    endpoints = metrics.as_dict()['endpoints']
+    items = sum(len(values) for values in data.values())
+    return {
+        'seconds': round(seconds, 6),
+        'items': items,
+        'items_per_second': round(items / seconds, 1) if seconds else None,
+        'pages': sum(counters['pages'] for counters in endpoints.values()),
+        'bytes': sum(counters['bytes'] for counters in endpoints.values()),
+        'retries': scheduler.stats()['retries'],
+        'endpoints': endpoints
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a synthetic tenant from a local mock Graph server.")
+    parser.add_argument('--users', type=int, default=10000, help="Number of users in the synthetic tenant.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for the synthetic tenant.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on.")
+    parser.add_argument('--port', type=int, default=0, help="Port to listen on (default: a free port).")
+    parser.add_argument('--page-size', type=int, default=999, help="Largest number of objects per page.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to delay every response.")
+    parser.add_argument('--throttle-every', type=int, default=0, help="Answer every nth GET with 429 (0 to never throttle).")
+    parser.add_argument('--retry-after', type=int, default=0, help="Retry-After seconds sent with injected 429s.")
+    parser.add_argument('--measure', action='store_true',
+                        help="Fetch the tenant once with fetch_data, print the throughput and exit instead of serving.")
+    parser.add_argument('--max-workers', type=int, default=4, help="Endpoints fetched concurrently with --measure.")
+    args = parser.parse_args()
+
+    server = MockGraphServer.synthetic(args.users, seed=args.seed, page_size=args.page_size, host=args.host,
+                                       port=args.port, latency=args.latency, throttle_every=args.throttle_every,
+                                       retry_after=args.retry_after)
+    with server:
+        if args.measure:
+            stats = measure_fetch(server, max_workers=args.max_workers)
+            print(f"Fetched {stats['items']} objects in {stats['pages']} pages ({stats['bytes'] / 1e6:.1f} MB) "
+                  f"in {stats['seconds']:.2f}s: {stats['items_per_second']} objects/s, {stats['retries']} retries.")
+        else:
+            print(f"Serving a synthetic tenant with {args.users} users at {server.base_url}. Press Ctrl+C to stop.")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
@@ -0,0 +1,211 @@
+import gzip
+import json
+import os
+import re
+import requests
+import time
+from collections import OrderedDict
+from pyCaOptics_fetch import GRAPH_BASE_URL, create_session
+from pyCaOptics_scheduler import RequestScheduler
+
+GUID_PATTERN = re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b')
+# directoryObjects/getByIds accepts at most 1000 ids per call
+MAX_IDS_PER_CALL = 1000
+DEFAULT_CACHE_ENTRIES = 200000
+DEFAULT_CACHE_TTL_HOURS = 168
+
+class NameCache:
+    """
+    A least-recently-used cache of directory object names with a time to live, persisted to disk.
+
+    Ids Graph could not resolve are cached too, with a name of None, so they are not looked up
+    again on every run. Entries older than ttl_hours count as missing, and once max_entries is
+    exceeded the least recently used entries are dropped.
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_CACHE_ENTRIES, ttl_hours=DEFAULT_CACHE_TTL_HOURS, clock=time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_hours * 3600 if ttl_hours else None
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, object_id):
+        return self._fresh(object_id) is not None
+
+    def _fresh(self, object_id):
+        entry = self._entries.get(object_id.lower())
+        if entry is None:
+            return None
+        if self.ttl_seconds is not None and self.clock() - entry[1] > self.ttl_seconds:
+            del self._entries[object_id.lower()]
+            return None
+        return entry
+
+    def get(self, object_id):
+        """
+        Returns the cached name of object_id, or None if it is unknown, unresolvable or expired.
+        """
+        entry = self._fresh(object_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(object_id.lower())
+        return entry[0]
+
+    def put(self, object_id, name):
+        key = object_id.lower()
+        self._entries[key] = (name, self.clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            entries = json.load(f)
+        self._entries = OrderedDict((object_id, (name, fetched_at)) for object_id, name, fetched_at in entries)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        """
+        Writes the cache to disk in least to most recently used order, replacing the file atomically.
+        """
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f'{self.path}.tmp'
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump([[object_id, name, fetched_at] for object_id, (name, fetched_at) in self._entries.items()], f,
+                      separators=(',', ':'))
+        os.replace(temp_path, self.path)
+
+def object_name(item):
+    """
+    Returns the most readable name of a directory object.
+    """
+    return item.get('displayName') or item.get('userPrincipalName') or item.get('appId') or item.get('id')
+
+def collect_ids(value, ids=None):
+    """
+    Collects every GUID in a result row or any string, list, tuple, set or dict inside it.
+    """
+    ids = set() if ids is None else ids
+    if isinstance(value, str):
+        ids.update(match.lower() for match in GUID_PATTERN.findall(value))
+    elif isinstance(value, dict):
+        for item in value.values():
+            collect_ids(item, ids)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            collect_ids(item, ids)
+    return ids
+
+class NameResolver:
+    """
+    Resolves GUIDs to display names in bulk and labels them in result rows as they are written.
+
+    Names come from the cache first; the rest are looked up through directoryObjects/getByIds,
+    up to 1000 ids per call. Without headers the resolver only uses the cache, which is how
+    offline snapshot analysis still gets names from earlier runs. Names only label the results,
+    so if a lookup fails, for example without Directory.Read.All, a warning is printed once and
+    the rest of the run uses the cache alone.
+    """
+
+    def __init__(self, headers=None, cache=None, session=None, scheduler=None, base_url=GRAPH_BASE_URL):
+        self.headers = headers
+        self.cache = cache if cache is not None else NameCache()
+        self.session = session
+        self.scheduler = scheduler or RequestScheduler()
+        self.base_url = base_url.rstrip('/')
+        self.lookups = 0
+        self.lookup_error = None
+
+    def seed(self, items, key='id'):
+        """
+        Caches the names of objects that were already fetched, such as applications keyed by appId.
+        """
+        for item in items:
+            if item.get(key) and (item.get('displayName') or item.get('userPrincipalName')):
+                self.cache.put(item[key], object_name(item))
+
+    def resolve(self, ids):
+        """
+        Returns a dict from each resolvable id to its name, fetching the ids missing from the cache.
+        """
+        ids = {object_id.lower() for object_id in ids}
+        missing = [object_id for object_id in sorted(ids) if object_id not in self.cache]
+        if missing and self.headers is not None and self.lookup_error is None:
+            try:
+                self._fetch(missing)
+            except requests.exceptions.RequestException as e:
+                self.lookup_error = e
+                print(f"Warning: could not look up display names, labelling results from the cache only: {e}")
+        names = {}
+        for object_id in ids:
+            name = self.cache.get(object_id)
+            if name:
+                names[object_id] = name
+        return names
+
+    def _fetch(self, ids):
+        owns_session = self.session is None
+        session = create_session() if owns_session else self.session
+        try:
+            for start in range(0, len(ids), MAX_IDS_PER_CALL):
+                chunk = ids[start:start + MAX_IDS_PER_CALL]
+                response = self.scheduler.request(session.post, f'{self.base_url}/directoryObjects/getByIds',
+                                                  json={'ids': chunk}, headers=dict(self.headers, **{'Content-Type': 'application/json'}))
+                response.raise_for_status()
+                self.lookups += 1
+                found = {item['id'].lower(): object_name(item) for item in response.json().get('value', [])}
+                for object_id in chunk:
+                    self.cache.put(object_id, found.get(object_id))
+        finally:
+            if owns_session:
+                session.close()
+
+    def label(self, value, names):
+        """
+        Returns value with every GUID in it replaced by 'Name (GUID)' where the name is known.
+        """
+        if isinstance(value, str):
+            return GUID_PATTERN.sub(lambda match: self._label(match.group(0), names), value)
+        if isinstance(value, dict):
+            return {key: self.label(item, names) for key, item in value.items()}
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return type(value)(self.label(item, names) for item in value)
+        return value
+
+    def _label(self, object_id, names):
+        name = names.get(object_id.lower())
+        return f'{name} ({object_id})' if name else object_id
+
+    def enrich(self, rows, chunk_size=1000):
+        """
+        Lazily yields rows with their GUIDs labelled, resolving the ids of each chunk of rows in bulk.
+        """
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield from self._enrich_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._enrich_chunk(chunk)
+
+    def _enrich_chunk(self, rows):
+        ids = set()
+        for row in rows:
+            collect_ids(row, ids)
+        names = self.resolve(ids)
+        for row in rows:
+            yield self.label(row, names)
@@ -0,0 +1,168 @@
+import bz2
+import csv
+import gzip
+import json
+import lzma
+import os
+from datetime import datetime
+
+OUTPUT_FORMATS = {'csv': '.csv', 'jsonl': '.jsonl', 'parquet': '.parquet'}
+# Stream compression for the text formats; Parquet compresses internally with its own codecs
+TEXT_COMPRESSION = {'gzip': ('.gz', gzip.open), 'bz2': ('.bz2', bz2.open), 'xz': ('.xz', lzma.open)}
+PARQUET_COMPRESSION = ['snappy', 'gzip', 'zstd', 'brotli', 'lz4']
+DEFAULT_CHUNK_SIZE = 10000
+# Column types a writer can be given; columns without one are strings
+COLUMN_TYPES = ['string', 'list', 'int', 'float', 'bool']
+
+def output_filename(output_dir, basename, fmt='csv', compression=None):
+    """
+    Returns the path for a results file, adding a timestamp if the file already exists.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    extension = OUTPUT_FORMATS[fmt]
+    if compression and fmt != 'parquet':
+        extension += TEXT_COMPRESSION[compression][0]
+
+    filename = os.path.join(output_dir, f'{basename}{extension}')
+    if os.path.exists(filename):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = os.path.join(output_dir, f'{basename}_{timestamp}{extension}')
+    return filename
+
+def _open_text(path, compression):
+    if compression:
+        return TEXT_COMPRESSION[compression][1](path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+class ResultWriter:
+    """
+    Buffers result rows and writes them to disk in chunks of chunk_size.
+
+    Subclasses implement _write_chunk. Use as a context manager so the last partial chunk is
+    flushed and the file closed. column_types maps field names to one of COLUMN_TYPES, for
+    formats that store typed columns.
+    """
+
+    def __init__(self, path, fieldnames, chunk_size=DEFAULT_CHUNK_SIZE, column_types=None):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.column_types = {name: (column_types or {}).get(name, 'string') for name in self.fieldnames}
+        self.chunk_size = max(1, chunk_size)
+        self.rows_written = 0
+        self._buffer = []
+
+    def write(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        if self._buffer:
+            self._write_chunk(self._buffer)
+            self.rows_written += len(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+
+    def _write_chunk(self, rows):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class CsvResultWriter(ResultWriter):
+    def __init__(self, path, fieldnames, chunk_size=DEFAULT_CHUNK_SIZE, compression=None, column_types=None):
+        super().__init__(path, fieldnames, chunk_size, column_types)
+        self._file = _open_text(path, compression)
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def _write_chunk(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+class JsonLinesResultWriter(ResultWriter):
+    def __init__(self, path, fieldnames, chunk_size=DEFAULT_CHUNK_SIZE, compression=None, column_types=None):
+        super().__init__(path, fieldnames, chunk_size, column_types)
+        self._file = _open_text(path, compression)
+
+    def _write_chunk(self, rows):
+        self._file.write(''.join(
+            json.dumps({name: row.get(name) for name in self.fieldnames}, default=str) + '\n' for row in rows
+        ))
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+class ParquetResultWriter(ResultWriter):
+    """
+    Writes each chunk as a Parquet row group. Requires the optional pyarrow package.
+
+    The schema is fixed from fieldnames and column_types when the writer opens, so a column that
+    is empty in the first chunk does not get a type that later values cannot be stored in. Values
+    of string columns are stored as text and the items of list columns as lists of text.
+    """
+
+    def __init__(self, path, fieldnames, chunk_size=DEFAULT_CHUNK_SIZE, compression=None, column_types=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow. Install it with 'pip install pyarrow'.")
+        super().__init__(path, fieldnames, chunk_size, column_types)
+        self._pyarrow = pyarrow
+        arrow_types = {'string': pyarrow.string(), 'list': pyarrow.list_(pyarrow.string()), 'int': pyarrow.int64(),
+                       'float': pyarrow.float64(), 'bool': pyarrow.bool_()}
+        self.schema = pyarrow.schema([(name, arrow_types[self.column_types[name]]) for name in self.fieldnames])
+        self._parquet_writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression=compression or 'snappy')
+
+    def _column(self, rows, name):
+        values = [row.get(name) for row in rows]
+        column_type = self.column_types[name]
+        if column_type == 'string':
+            return [value if value is None or isinstance(value, str) else str(value) for value in values]
+        if column_type == 'list':
+            # Tuples (such as permutations) and sets become lists; a single value becomes a list of one
+            return [None if value is None else [value] if isinstance(value, str) else [str(item) for item in value]
+                    for value in values]
+        return values
+
+    def _write_chunk(self, rows):
+        columns = {name: self._column(rows, name) for name in self.fieldnames}
+        self._parquet_writer.write_table(self._pyarrow.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        super().close()
+        self._parquet_writer.close()
+
+WRITERS = {'csv': CsvResultWriter, 'jsonl': JsonLinesResultWriter, 'parquet': ParquetResultWriter}
+
+def open_writer(path, fieldnames, fmt='csv', compression=None, chunk_size=DEFAULT_CHUNK_SIZE, column_types=None):
+    """
+    Opens a streaming writer for the given format: 'csv', 'jsonl' or 'parquet'.
+
+    compression is 'gzip', 'bz2' or 'xz' for the text formats, or a Parquet codec such as
+    'snappy' or 'zstd' for Parquet. column_types maps the fields that are not strings to 'list',
+    'int', 'float' or 'bool', which Parquet stores as typed columns.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported output format '{fmt}'. Choose one of: {', '.join(WRITERS)}.")
+    allowed = PARQUET_COMPRESSION if fmt == 'parquet' else list(TEXT_COMPRESSION)
+    if compression and compression not in allowed:
+        raise ValueError(f"Unsupported compression '{compression}' for {fmt}. Choose one of: {', '.join(allowed)}.")
+    unknown = sorted(set((column_types or {}).values()) - set(COLUMN_TYPES))
+    if unknown:
+        raise ValueError(f"Unsupported column types: {', '.join(unknown)}. Choose from: {', '.join(COLUMN_TYPES)}.")
+    return WRITERS[fmt](path, fieldnames, chunk_size=chunk_size, compression=compression, column_types=column_types)
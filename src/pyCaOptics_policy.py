@@ -0,0 +1,131 @@
+# Sentinel values Graph uses inside include lists
+ALL_VALUES = frozenset(['All', 'all'])
+NONE_VALUES = frozenset(['None', 'none'])
+
+class Condition:
+    """
+    A single include/exclude condition with the All/None sentinels resolved.
+
+    include_all is True when the condition applies to every value, either because the include
+    list contains 'All' or because the condition is not configured at all.
+    """
+    __slots__ = ('include', 'exclude', 'include_all', 'configured')
+
+    def __init__(self, include, exclude, include_all, configured):
+        self.include = include
+        self.exclude = exclude
+        self.include_all = include_all
+        self.configured = configured
+
+    def includes(self, value):
+        return self.include_all or value in self.include
+
+    def matches(self, value):
+        return value not in self.exclude and (self.include_all or value in self.include)
+
+    def __repr__(self):
+        include = 'All' if self.include_all else sorted(self.include)
+        return f"Condition(include={include}, exclude={sorted(self.exclude)})"
+
+def compile_condition(include_values, exclude_values=None, all_when_empty=False):
+    """
+    Builds a Condition from Graph include/exclude lists.
+
+    include_values may be None when Graph reports the condition as not configured. With
+    all_when_empty, an empty include list also means the condition applies to every value, as it
+    does for clientAppTypes and risk levels.
+    """
+    configured = bool(include_values) or bool(exclude_values)
+    include_values = set(include_values or [])
+    exclude_values = set(exclude_values or [])
+
+    include_all = bool(include_values & ALL_VALUES) or (all_when_empty and not include_values)
+    include = frozenset(include_values - ALL_VALUES - NONE_VALUES)
+    exclude = frozenset(exclude_values - ALL_VALUES - NONE_VALUES)
+    return Condition(include, exclude, include_all, configured)
+
+class CompiledPolicy:
+    """
+    A Conditional Access policy normalized for fast coverage checks.
+    """
+    __slots__ = (
+        'id', 'display_name', 'state',
+        'users', 'groups', 'roles', 'applications', 'platforms', 'locations', 'client_app_types',
+        'user_risk_levels', 'sign_in_risk_levels', 'device_states_configured',
+        'grant_operator', 'built_in_controls', 'session_controls'
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def covers_user(self, user, group):
+        """
+        Checks if a user, or a group the user belongs to, is in scope of the policy.
+        """
+        if user in self.users.exclude or group in self.groups.exclude:
+            return False
+        return self.users.include_all or user in self.users.include or group in self.groups.include
+
+    def covers(self, user, group, app, platform, location, client_app):
+        """
+        Checks if a given permutation is covered by the policy.
+        """
+        return (self.covers_user(user, group) and
+                self.applications.matches(app) and
+                self.platforms.matches(platform) and
+                self.locations.matches(location) and
+                self.client_app_types.matches(client_app))
+
+    def __repr__(self):
+        return f"CompiledPolicy(id={self.id!r}, display_name={self.display_name!r}, state={self.state!r})"
+
+def compile_policy(policy):
+    """
+    Normalizes a Graph Conditional Access policy dict into a CompiledPolicy.
+
+    Policies that are already compiled are returned unchanged.
+    """
+    if not isinstance(policy, dict):
+        return policy
+
+    conditions = policy.get('conditions') or {}
+    users = conditions.get('users') or {}
+    applications = conditions.get('applications') or {}
+    # Platforms and locations are null when not configured, which means the policy applies everywhere
+    platforms = conditions.get('platforms')
+    locations = conditions.get('locations')
+    grant_controls = policy.get('grantControls') or {}
+
+    return CompiledPolicy(
+        id=policy.get('id'),
+        display_name=policy.get('displayName', 'Unnamed Policy'),
+        state=policy.get('state'),
+        users=compile_condition(users.get('includeUsers'), users.get('excludeUsers')),
+        groups=compile_condition(users.get('includeGroups'), users.get('excludeGroups')),
+        roles=compile_condition(users.get('includeRoles'), users.get('excludeRoles')),
+        applications=compile_condition(applications.get('includeApplications'), applications.get('excludeApplications')),
+        platforms=compile_condition(
+            platforms.get('includePlatforms') if platforms else None,
+            platforms.get('excludePlatforms') if platforms else None,
+            all_when_empty=not platforms
+        ),
+        locations=compile_condition(
+            locations.get('includeLocations') if locations else None,
+            locations.get('excludeLocations') if locations else None,
+            all_when_empty=not locations
+        ),
+        client_app_types=compile_condition(conditions.get('clientAppTypes'), all_when_empty=True),
+        user_risk_levels=compile_condition(conditions.get('userRiskLevels'), all_when_empty=True),
+        sign_in_risk_levels=compile_condition(conditions.get('signInRiskLevels'), all_when_empty=True),
+        device_states_configured=bool(conditions.get('deviceStates')),
+        grant_operator=grant_controls.get('operator') or 'OR',
+        built_in_controls=frozenset(grant_controls.get('builtInControls') or []),
+        session_controls=policy.get('sessionControls') or {}
+    )
+
+def compile_policies(policies):
+    """
+    Compiles a list of policies, preserving their order.
+    """
+    return [compile_policy(policy) for policy in policies]
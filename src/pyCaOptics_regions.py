@@ -0,0 +1,212 @@
+from pyCaOptics_policy import compile_policy
+
+# The dimensions of the sign-in space, in the same order as a permutation tuple
+DIMENSIONS = ('users', 'groups', 'applications', 'platforms', 'locations', 'clientAppTypes')
+
+class SymbolicSet:
+    """
+    A set of condition values that is either finite or everything except a finite set.
+
+    With complement=False the set is exactly values; with complement=True it is every possible
+    value except those in values. Both forms are closed under intersection, union and
+    difference, which is all the region algebra needs.
+    """
+    __slots__ = ('values', 'complement')
+
+    def __init__(self, values=(), complement=False):
+        self.values = frozenset(values)
+        self.complement = complement
+
+    @classmethod
+    def everything(cls):
+        return cls(complement=True)
+
+    @classmethod
+    def from_condition(cls, condition):
+        if condition.include_all:
+            return cls(condition.exclude, complement=True)
+        return cls(condition.include - condition.exclude)
+
+    def is_empty(self):
+        return not self.complement and not self.values
+
+    def inverse(self):
+        return SymbolicSet(self.values, not self.complement)
+
+    def intersection(self, other):
+        if self.complement and other.complement:
+            return SymbolicSet(self.values | other.values, complement=True)
+        if self.complement:
+            return SymbolicSet(other.values - self.values)
+        if other.complement:
+            return SymbolicSet(self.values - other.values)
+        return SymbolicSet(self.values & other.values)
+
+    def union(self, other):
+        if self.complement and other.complement:
+            return SymbolicSet(self.values & other.values, complement=True)
+        if self.complement:
+            return SymbolicSet(self.values - other.values, complement=True)
+        if other.complement:
+            return SymbolicSet(other.values - self.values, complement=True)
+        return SymbolicSet(self.values | other.values)
+
+    def difference(self, other):
+        return self.intersection(other.inverse())
+
+    def describe(self):
+        if not self.complement:
+            return ', '.join(sorted(self.values)) if self.values else '(none)'
+        if not self.values:
+            return 'All'
+        return f"All except {', '.join(sorted(self.values))}"
+
+    def __eq__(self, other):
+        return isinstance(other, SymbolicSet) and self.values == other.values and self.complement == other.complement
+
+    def __hash__(self):
+        return hash((self.values, self.complement))
+
+    def __repr__(self):
+        return f"SymbolicSet({self.describe()})"
+
+def universe():
+    return tuple(SymbolicSet.everything() for _ in DIMENSIONS)
+
+def is_empty_region(region):
+    return any(values.is_empty() for values in region)
+
+def _merge_first_dimension(regions):
+    """
+    Merges regions whose dimensions after the first are identical by joining their first dimension.
+    """
+    merged = {}
+    for region in regions:
+        rest = region[1:]
+        merged[rest] = merged[rest].union(region[0]) if rest in merged else region[0]
+    return [(first,) + rest for rest, first in merged.items()]
+
+def _split_dimension(boxes, active, index):
+    """
+    Splits dimension index into groups of values that lie in exactly the same active boxes.
+
+    Returns (symbolic set, boxes containing it) pairs. Values no active box mentions all behave
+    alike, so they form one group together with any mentioned values that share their boxes.
+    """
+    complemented = frozenset(box for box in active if boxes[box][index].complement)
+    added, removed = {}, {}
+    for box in active:
+        values = boxes[box][index]
+        target = removed if values.complement else added
+        for value in values.values:
+            target.setdefault(value, set()).add(box)
+
+    groups = {}
+    for value in set(added) | set(removed):
+        containing = (complemented - removed.get(value, set())) | added.get(value, set())
+        groups.setdefault(frozenset(containing), set()).add(value)
+
+    mentioned = set(added) | set(removed)
+    other_values = groups.pop(complemented, set())
+    splits = [(SymbolicSet(mentioned - other_values, complement=True), complemented)]
+    splits.extend((SymbolicSet(values), containing) for containing, values in groups.items())
+    return splits
+
+def _uncovered_last(sets):
+    finite = frozenset().union(*(values.values for values in sets if not values.complement))
+    complemented = [values.values for values in sets if values.complement]
+    if complemented:
+        uncovered = SymbolicSet(frozenset.intersection(*complemented) - finite)
+    else:
+        uncovered = SymbolicSet(finite, complement=True)
+    return [] if uncovered.is_empty() else [(uncovered,)]
+
+def _uncovered(boxes, active, index, memo):
+    """
+    Returns the uncovered regions of dimensions index and later, given the boxes still in play.
+    """
+    dimensions = len(boxes[0]) if boxes else 0
+    if index == dimensions:
+        return [] if active else [()]
+    if not active:
+        return [tuple(SymbolicSet.everything() for _ in range(index, dimensions))]
+    # A box that allows everything in the remaining dimensions covers the whole subspace
+    if any(all(values.complement and not values.values for values in boxes[box][index:]) for box in active):
+        return []
+
+    if index == dimensions - 1:
+        # In the last dimension the uncovered values are simply those outside every active box
+        return _uncovered_last([boxes[box][index] for box in active])
+
+    key = (index, active)
+    if key not in memo:
+        regions = []
+        for values, containing in _split_dimension(boxes, active, index):
+            if values.is_empty():
+                continue
+            regions.extend((values,) + rest for rest in _uncovered(boxes, containing, index + 1, memo))
+        memo[key] = _merge_first_dimension(regions)
+    return memo[key]
+
+def policy_regions(policy):
+    """
+    Returns the regions of the sign-in space a policy applies to.
+
+    A user is in scope when the user or one of their groups is included, so a policy is the
+    union of up to two regions: one selected by includeUsers and one by includeGroups.
+    """
+    compiled = compile_policy(policy)
+    rest = tuple(SymbolicSet.from_condition(condition) for condition in (
+        compiled.applications, compiled.platforms, compiled.locations, compiled.client_app_types
+    ))
+    users, groups = compiled.users, compiled.groups
+    any_group = SymbolicSet(groups.exclude, complement=True)
+
+    regions = [(SymbolicSet.from_condition(users), any_group) + rest]
+    if not users.include_all and groups.include:
+        regions.append((SymbolicSet(users.exclude, complement=True), SymbolicSet(groups.include - groups.exclude)) + rest)
+    return [region for region in regions if not is_empty_region(region)]
+
+def uncovered_regions(policies, states=('enabled',)):
+    """
+    Computes the regions of the sign-in space that no policy applies to, without enumerating permutations.
+
+    Each policy is a hyper-rectangle of symbolic sets. Dimension by dimension, values that fall
+    in exactly the same policies are grouped into one symbolic set and only those groups are
+    explored further, with results memoized on the policies still in play. The cost therefore
+    follows the number of policies and distinct condition values, not the product of their lengths.
+    """
+    boxes = []
+    for policy in policies:
+        compiled = compile_policy(policy)
+        if compiled.state in states:
+            boxes.extend(policy_regions(compiled))
+    if not boxes:
+        return [universe()]
+
+    # Splitting the dimensions with the fewest distinct values first keeps the upper levels of the
+    # search narrow and lets the many-valued users and groups merge into large symbolic sets
+    order = sorted(range(len(DIMENSIONS)), key=lambda index: len(set().union(*(box[index].values for box in boxes))))
+    reordered = [tuple(box[index] for index in order) for box in boxes]
+    regions = _uncovered(reordered, frozenset(range(len(boxes))), 0, {})
+
+    restore = [order.index(index) for index in range(len(DIMENSIONS))]
+    return [tuple(region[position] for position in restore) for region in regions]
+
+def region_contains(region, permutation):
+    """
+    Checks if a permutation tuple falls inside a region.
+    """
+    for values, value in zip(region, permutation):
+        if (value in values.values) == values.complement:
+            return False
+    return True
+
+def iter_region_rows(regions):
+    """
+    Yields one result row per region, describing each dimension.
+    """
+    for region in regions:
+        row = {dimension: values.describe() for dimension, values in zip(DIMENSIONS, region)}
+        row['issue'] = 'Uncovered region'
+        yield row
@@ -0,0 +1,313 @@
+import argparse
+import heapq
+import os
+import sys
+from pyCaOptics_fetch import GRAPH_BASE_URL, build_endpoint, iter_pages
+from pyCaOptics_output import DEFAULT_CHUNK_SIZE, OUTPUT_FORMATS, open_writer, output_filename
+from pyCaOptics_whatif import DecisionIndex, read_signins
+
+DEFAULT_CAPACITY = 10000
+SIGNINS_PATH = '/auditLogs/signIns'
+SIGNINS_PAGE_SIZE = 1000
+UNCOVERED_FIELDS = ['user', 'application', 'location', 'signins', 'error']
+POLICY_FIELDS = ['policy', 'display_name', 'signins']
+REPLAY_TYPES = {'signins': 'int'}
+
+# clientAppUsed values of Graph sign-in logs, mapped to Conditional Access client app types
+CLIENT_APPS = {
+    'browser': 'browser',
+    'mobile apps and desktop clients': 'mobileAppsAndDesktopClients',
+    'exchange activesync': 'exchangeActiveSync'
+}
+# Substrings of deviceDetail.operatingSystem, checked in order, mapped to device platforms
+PLATFORMS = [('windows', 'windows'), ('ios', 'iOS'), ('android', 'android'), ('mac', 'macOS'), ('linux', 'linux')]
+
+def signin_platform(operating_system):
+    operating_system = (operating_system or '').lower()
+    for fragment, platform in PLATFORMS:
+        if fragment in operating_system:
+            return platform
+    return None
+
+def signin_from_graph(record, user_groups=None, locate=None):
+    """
+    Converts a Graph signIn record into the sign-in dict DecisionIndex evaluates.
+
+    Records that already have a user key, such as exports in the what-if format, are used as
+    they are. Sign-in logs carry no group or role memberships, so groups come from user_groups,
+    a dict from user id to the policy-referenced groups the user belongs to. locate, given the
+    record, returns the named location ids the sign-in came from; without it, a sign-in from a
+    trusted named location matches AllTrusted.
+    """
+    if 'user' in record:
+        signin = record
+    else:
+        client_app = (record.get('clientAppUsed') or '').lower()
+        network = record.get('networkLocationDetails') or []
+        signin = {
+            'user': record.get('userId'),
+            'roles': [],
+            'application': record.get('appId'),
+            'platform': signin_platform((record.get('deviceDetail') or {}).get('operatingSystem')),
+            'client_app': CLIENT_APPS.get(client_app, 'other' if client_app else None),
+            'user_risk': record.get('riskLevelAggregated'),
+            'sign_in_risk': record.get('riskLevelDuringSignIn'),
+            'location': ['AllTrusted'] if any(detail.get('networkType') == 'trustedNamedLocation' for detail in network) else []
+        }
+        if locate is not None:
+            signin['location'] = locate(record)
+    if user_groups is not None:
+        signin = dict(signin, groups=user_groups.get(signin.get('user'), ()))
+    return signin
+
+def user_groups(resolver, group_ids):
+    """
+    Returns a dict from user id to the groups in group_ids the user is in, directly or through nesting.
+
+    Only the groups policies reference matter to DecisionIndex, so only their members are indexed.
+    """
+    groups = {}
+    for group_id in group_ids:
+        for user_id in resolver.members(group_id):
+            groups.setdefault(user_id, []).append(group_id)
+    return groups
+
+class SpaceSavingCounter:
+    """
+    Counts the most frequent keys of a stream in a fixed number of counters.
+
+    This is the Space-Saving algorithm: while there is room every key gets its own counter; once
+    capacity keys are tracked, a new key takes over the counter with the smallest count and
+    inherits that count as its error. Any key seen more than total / capacity times is
+    guaranteed to be tracked, and each reported count overestimates the true count by at most
+    its error. The smallest counter is found through a heap whose stale entries are refreshed
+    lazily.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = max(1, capacity)
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        self._heap = []
+        # Heap entries carry a sequence number so that keys themselves are never compared
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, key, count=1):
+        self.total += count
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+            return
+        error = 0
+        if len(counts) >= self.capacity:
+            error = self._evict()
+        counts[key] = error + count
+        self.errors[key] = error
+        self._sequence += 1
+        heapq.heappush(self._heap, (counts[key], self._sequence, key))
+
+    def _evict(self):
+        heap, counts = self._heap, self.counts
+        while True:
+            count, _, key = heap[0]
+            if counts[key] == count:
+                heapq.heappop(heap)
+                del counts[key]
+                del self.errors[key]
+                return count
+            self._sequence += 1
+            heapq.heapreplace(heap, (counts[key], self._sequence, key))
+
+    def most_common(self, n=None):
+        """
+        Returns (key, count, error) tuples, most frequent first.
+        """
+        items = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return [(key, count, self.errors[key]) for key, count in items[:n]]
+
+class ReplayAggregator:
+    """
+    Evaluates a stream of sign-ins against a DecisionIndex and keeps bounded coverage counters.
+
+    Uncovered sign-ins, which no policy applies to, are counted per (user, application,
+    location) combination and per user, application and location, each in a SpaceSavingCounter
+    of capacity entries. Covered sign-ins are counted per distinct set of matching policies, of
+    which a tenant has few, and expanded into per-policy counts only when results are read.
+    Memory therefore stays the same whatever the size of the log.
+    """
+
+    def __init__(self, index, capacity=DEFAULT_CAPACITY):
+        self.index = index
+        self.signins = 0
+        self.uncovered = 0
+        self.combinations = SpaceSavingCounter(capacity)
+        self.users = SpaceSavingCounter(capacity)
+        self.applications = SpaceSavingCounter(capacity)
+        self.locations = SpaceSavingCounter(capacity)
+        self.matches = {}
+
+    def add(self, signin):
+        mask = self.index.match(signin)
+        self.signins += 1
+        if mask:
+            self.matches[mask] = self.matches.get(mask, 0) + 1
+            return
+        self.uncovered += 1
+        user = signin.get('user')
+        application = signin.get('application')
+        location = signin.get('location')
+        location = ';'.join(sorted(location)) if isinstance(location, (list, tuple)) else location
+        self.combinations.add((user, application, location or None))
+        self.users.add(user)
+        self.applications.add(application)
+        self.locations.add(location or None)
+
+    def add_all(self, signins):
+        for signin in signins:
+            self.add(signin)
+        return self
+
+    def policy_counts(self):
+        """
+        Returns the number of sign-ins each policy applied to, in policy order.
+        """
+        counts = [0] * len(self.index)
+        for mask, count in self.matches.items():
+            remaining = mask
+            while remaining:
+                low = remaining & -remaining
+                counts[low.bit_length() - 1] += count
+                remaining ^= low
+        return counts
+
+    def grant_counts(self):
+        """
+        Returns the number of sign-ins per effective grant control, including 'uncovered'.
+        """
+        grants = {'uncovered': self.uncovered} if self.uncovered else {}
+        for mask, count in self.matches.items():
+            controls = self.index.decision(mask)[1]
+            grants[controls] = grants.get(controls, 0) + count
+        return grants
+
+    def iter_uncovered_rows(self):
+        for (user, application, location), count, error in self.combinations.most_common():
+            yield {'user': user, 'application': application, 'location': location, 'signins': count, 'error': error}
+
+    def iter_policy_rows(self):
+        for policy, count in zip(self.index.policies, self.policy_counts()):
+            yield {'policy': policy.id, 'display_name': policy.display_name, 'signins': count}
+
+    def summary(self):
+        return {
+            'signins': self.signins,
+            'uncovered': self.uncovered,
+            'coverage': round(1 - self.uncovered / self.signins, 6) if self.signins else None,
+            'grant_controls': self.grant_counts(),
+            'top_uncovered_users': self.users.most_common(10),
+            'top_uncovered_applications': self.applications.most_common(10),
+            'top_uncovered_locations': self.locations.most_common(10)
+        }
+
+def signins_endpoint(base_url=GRAPH_BASE_URL, since=None):
+    """
+    Builds the URL of the sign-in log, optionally only for sign-ins at or after since (an ISO 8601 time).
+    """
+    url = build_endpoint(SIGNINS_PATH, top=SIGNINS_PAGE_SIZE, base_url=base_url)
+    return f"{url}&$filter=createdDateTime ge {since}" if since else url
+
+def iter_graph_signins(headers, url, session=None, scheduler=None, metrics=None):
+    """
+    Yields sign-in records from the Graph sign-in log one page at a time.
+    """
+    for page in iter_pages(url, headers, session, scheduler, metrics, 'signIns'):
+        yield from page.get('value', [])
+
+def replay(policies, records, capacity=DEFAULT_CAPACITY, states=('enabled',), user_groups=None, locate=None):
+    """
+    Streams sign-in records through a ReplayAggregator and returns it.
+
+    records may be Graph signIn records or what-if sign-in dicts, from iter_graph_signins or
+    read_signins, and are never held in memory together.
+    """
+    aggregator = ReplayAggregator(DecisionIndex(policies, states), capacity)
+    return aggregator.add_all(signin_from_graph(record, user_groups, locate) for record in records)
+
+def save_replay(aggregator, output_format='csv', compression=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Writes the uncovered combinations and per-policy sign-in counts, and prints a summary.
+    """
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'output')
+    filenames = []
+    for basename, fieldnames, rows in (('replay_uncovered', UNCOVERED_FIELDS, aggregator.iter_uncovered_rows()),
+                                       ('replay_policies', POLICY_FIELDS, aggregator.iter_policy_rows())):
+        filename = output_filename(output_dir, basename, output_format, compression)
+        with open_writer(filename, fieldnames, output_format, compression, chunk_size, REPLAY_TYPES) as writer:
+            writer.write_rows(rows)
+        filenames.append(filename)
+
+    summary = aggregator.summary()
+    coverage = f"{summary['coverage']:.2%}" if summary['coverage'] is not None else 'n/a'
+    print(f"Replayed {summary['signins']} sign-ins: {summary['uncovered']} not covered by any policy "
+          f"(coverage {coverage}). Results saved to '{filenames[0]}' and '{filenames[1]}'.")
+    return filenames
+
+if __name__ == '__main__':
+    from pyCaOptics_app import referenced_groups
+    from pyCaOptics_auth import AuthError, add_auth_arguments, auth_options, build_credential, credential_headers
+    from pyCaOptics_groups import GroupResolver
+    from pyCaOptics_locations import LocationIndex
+    from pyCaOptics_snapshot import SnapshotError, load_snapshot
+
+    parser = argparse.ArgumentParser(description="Replay sign-in logs against Conditional Access policies to measure real coverage.")
+    parser.add_argument('--from-snapshot', required=True, help="Snapshot holding the policies (and memberships) to evaluate.")
+    parser.add_argument('--allow-expired', action='store_true', help="Use the snapshot even if it has expired.")
+    parser.add_argument('--signins', default=None,
+                        help="JSON Lines export of Graph sign-in records or what-if sign-ins, optionally gzipped.")
+    parser.add_argument('--base-url', default=None,
+                        help="Read the sign-in log from this Graph root instead, such as a local mock server.")
+    parser.add_argument('--tenant-id', default=None, help="Sign in to this tenant to read its sign-in log from --base-url.")
+    parser.add_argument('--client-id', default=None, help="Client ID to sign in with.")
+    parser.add_argument('--since', default=None, help="Only replay sign-ins at or after this ISO 8601 time (with --base-url).")
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY,
+                        help="Counters kept for uncovered combinations; memory stays fixed at this size.")
+    parser.add_argument('--include-report-only', action='store_true',
+                        help="Also count report-only policies as covering sign-ins.")
+    parser.add_argument('--output-format', choices=list(OUTPUT_FORMATS), default='csv',
+                        help="Format of the results files. Parquet requires pyarrow.")
+    parser.add_argument('--compression', default=None,
+                        help="Compress the results: gzip, bz2 or xz for csv/jsonl; snappy, gzip, zstd, brotli or lz4 for parquet.")
+    add_auth_arguments(parser)
+    args = parser.parse_args()
+    if bool(args.signins) == bool(args.base_url):
+        parser.error("give exactly one of --signins or --base-url")
+
+    try:
+        data, _ = load_snapshot(args.from_snapshot, allow_expired=args.allow_expired)
+    except (OSError, SnapshotError) as e:
+        print(f"Error loading snapshot: {e}")
+        sys.exit(1)
+
+    groups = None
+    if data.get('memberships'):
+        groups = user_groups(GroupResolver.from_memberships(data['memberships']), referenced_groups(data['policies']))
+    if args.signins:
+        records = read_signins(args.signins)
+    else:
+        headers = {}
+        if args.tenant_id:
+            try:
+                headers = credential_headers(build_credential(args.tenant_id, args.client_id, **auth_options(args)))
+            except AuthError as e:
+                print(f"Authentication error: {e}")
+                sys.exit(1)
+        records = iter_graph_signins(headers, signins_endpoint(args.base_url, args.since))
+    # With the tenant's named locations, sign-ins are placed by IP address rather than by Graph's trusted flag
+    locate = LocationIndex(data['namedLocations']).signin_locations if 'namedLocations' in data else None
+    states = ('enabled', 'enabledForReportingButNotEnforced') if args.include_report_only else ('enabled',)
+    save_replay(replay(data['policies'], records, args.capacity, states, groups, locate), args.output_format,
+                args.compression)
@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+
+# Status codes Graph uses for throttling and transient service failures
+THROTTLE_STATUS_CODES = frozenset([429, 503])
+RETRYABLE_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+def parse_retry_after(value):
+    """
+    Returns the delay in seconds requested by a Retry-After header, or None if it is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class RequestScheduler:
+    """
+    Sends Graph requests with throttling-aware retries and adaptive concurrency.
+
+    Throttled and transient responses are retried after the delay given by Retry-After, or after a
+    jittered exponential backoff when the header is absent. Every throttle halves the number of
+    requests allowed in flight; each run of increase_after successful requests lets one more in,
+    up to max_concurrency. The scheduler is shared by all fetch threads.
+    """
+
+    def __init__(self, max_concurrency=4, min_concurrency=1, max_retries=8, base_delay=1.0, max_delay=60.0,
+                 increase_after=20, sleep=time.sleep):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.increase_after = increase_after
+        self.sleep = sleep
+
+        self.concurrency = self.max_concurrency
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.backoff_seconds = 0.0
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._successes = 0
+
+    def _acquire(self):
+        with self._condition:
+            while self._in_flight >= self.concurrency:
+                self._condition.wait()
+            self._in_flight += 1
+            self.requests += 1
+
+    def _release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _record_success(self):
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.increase_after and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def _record_retry(self, delay, throttled):
+        with self._condition:
+            self.retries += 1
+            self.backoff_seconds += delay
+            self._successes = 0
+            if throttled:
+                self.throttled += 1
+                self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """
+        Returns how long to wait before retry number attempt (starting at 0).
+        """
+        if retry_after is not None:
+            # Honor the server's delay, with a little jitter so threads do not retry in lockstep
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def request(self, get, url, **kwargs):
+        """
+        Performs get(url, **kwargs), retrying throttled and transient failures.
+
+        The last response is returned once it succeeds or the retries are exhausted, so callers
+        keep using raise_for_status() for error handling.
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                response = get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                response = None
+            finally:
+                self._release()
+
+            if response is not None and response.status_code not in RETRYABLE_STATUS_CODES:
+                self._record_success()
+                return response
+            if response is not None and attempt >= self.max_retries:
+                return response
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+            self.wait_before_retry(attempt, retry_after, response is not None and response.status_code in THROTTLE_STATUS_CODES)
+            attempt += 1
+
+    def wait_before_retry(self, attempt, retry_after=None, throttled=False):
+        """
+        Records a retry and sleeps for its backoff delay.
+
+        Used by request() and by callers that retry work themselves, such as the items of a
+        $batch call that came back throttled.
+        """
+        delay = self.backoff_delay(attempt, retry_after)
+        self._record_retry(delay, throttled)
+        self.sleep(delay)
+
+    def stats(self):
+        """
+        Returns the request, retry and backoff counters.
+        """
+        with self._condition:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'backoff_seconds': round(self.backoff_seconds, 3),
+                'concurrency': self.concurrency
+            }
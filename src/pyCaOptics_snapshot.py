@@ -0,0 +1,114 @@
+import gzip
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+
+SNAPSHOT_FORMAT = 'pyCaOptics-snapshot'
+SNAPSHOT_VERSION = 1
+DEFAULT_TTL_HOURS = 24
+# Raised by gzip/json when a snapshot is cut short or its bytes are damaged.
+CORRUPT_ERRORS = (EOFError, gzip.BadGzipFile, zlib.error, ValueError)
+
+class SnapshotError(Exception):
+    """
+    Raised when a snapshot is malformed, expired or fails its content hash check.
+    """
+
+def _record_line(kind, item):
+    return json.dumps({'kind': kind, 'item': item}, sort_keys=True, separators=(',', ':'))
+
+def save_snapshot(data, path, ttl_hours=DEFAULT_TTL_HOURS, tenant_id=None):
+    """
+    Writes the dict returned by fetch_data to a gzip-compressed JSON Lines snapshot.
+
+    The first line is a header with the creation and expiry times, followed by one line per object
+    and a trailer holding the object counts and the SHA-256 of all object lines. The file is
+    written to a temporary name and moved into place once complete.
+    """
+    created_at = datetime.now(timezone.utc)
+    header = {
+        'format': SNAPSHOT_FORMAT,
+        'version': SNAPSHOT_VERSION,
+        'tenant_id': tenant_id,
+        'created_at': created_at.isoformat(),
+        'expires_at': (created_at + timedelta(hours=ttl_hours)).isoformat() if ttl_hours else None
+    }
+    content_hash = hashlib.sha256()
+    counts = {}
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(header) + '\n')
+        for kind, items in data.items():
+            counts[kind] = 0
+            for item in items:
+                line = _record_line(kind, item)
+                content_hash.update(line.encode('utf-8'))
+                f.write(line + '\n')
+                counts[kind] += 1
+        f.write(json.dumps({'counts': counts, 'content_hash': content_hash.hexdigest()}) + '\n')
+    os.replace(temp_path, path)
+    return header
+
+def read_snapshot_header(path):
+    """
+    Returns the header of a snapshot without reading its objects.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            header = json.loads(f.readline())
+        except CORRUPT_ERRORS + (OSError,) as e:
+            raise SnapshotError(f"{path} is not a readable snapshot: {e}")
+    if not isinstance(header, dict) or header.get('format') != SNAPSHOT_FORMAT or header.get('version') != SNAPSHOT_VERSION:
+        raise SnapshotError(f"{path} is not a version {SNAPSHOT_VERSION} {SNAPSHOT_FORMAT} file.")
+    return header
+
+def is_expired(header, now=None):
+    expires_at = header.get('expires_at')
+    if not expires_at:
+        return False
+    return (now or datetime.now(timezone.utc)) >= datetime.fromisoformat(expires_at)
+
+def load_snapshot(path, allow_expired=False, verify=True):
+    """
+    Reads a snapshot back into the dict shape returned by fetch_data.
+
+    Returns (data, header). Raises SnapshotError if the snapshot has expired (unless
+    allow_expired), is truncated, or its content hash does not match.
+    """
+    header = read_snapshot_header(path)
+    if not allow_expired and is_expired(header):
+        raise SnapshotError(f"Snapshot {path} expired at {header['expires_at']}.")
+
+    content_hash = hashlib.sha256()
+    data = {}
+    trailer = None
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                record = json.loads(line)
+                if 'kind' not in record:
+                    trailer = record
+                    break
+                if verify:
+                    content_hash.update(_record_line(record['kind'], record['item']).encode('utf-8'))
+                data.setdefault(record['kind'], []).append(record['item'])
+    except CORRUPT_ERRORS as e:
+        raise SnapshotError(f"Snapshot {path} is corrupt or truncated: {e}")
+    except (KeyError, TypeError) as e:
+        raise SnapshotError(f"Snapshot {path} holds a malformed record: {e}")
+
+    if trailer is None:
+        raise SnapshotError(f"Snapshot {path} is truncated.")
+    for kind in trailer.get('counts', {}):
+        data.setdefault(kind, [])
+    if verify and trailer.get('content_hash') != content_hash.hexdigest():
+        raise SnapshotError(f"Snapshot {path} failed its content hash check.")
+    header['content_hash'] = trailer.get('content_hash')
+    header['counts'] = trailer.get('counts', {})
+    return data, header
@@ -0,0 +1,164 @@
+import gzip
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import requests
+from pyCaOptics_fetch import (DEFAULT_MAX_WORKERS, ENDPOINT_PROFILES, GRAPH_BASE_URL, build_endpoint, create_session,
+                              fetch_paginated_data, iter_pages)
+from pyCaOptics_scheduler import RequestScheduler
+
+# Directory endpoints that support Graph delta queries
+DELTA_RESOURCES = ["users", "groups", "applications"]
+# Endpoints without delta support, small enough to fetch in full on every sync
+FULL_RESOURCES = ["policies", "namedLocations"]
+
+class DeltaStateStore:
+    """
+    Persists the delta link and local copy of each synced endpoint under state_dir.
+
+    Each endpoint is kept in its own gzip-compressed JSON file, replaced atomically so an
+    interrupted run never leaves a half-written state behind.
+    """
+
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.state_dir, f'{name}.json.gz')
+
+    def load(self, name, url=None):
+        """
+        Returns (delta_link, objects by id) for an endpoint, or (None, {}) if it was never synced.
+
+        With url, a state synced from a different delta URL (for example with other $select
+        fields) is ignored too, since its delta link would keep returning the old fields.
+        """
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None, {}
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            state = json.load(f)
+        if url is not None and state.get('url') != url:
+            return None, {}
+        return state.get('delta_link'), {item['id']: item for item in state.get('objects', [])}
+
+    def save(self, name, delta_link, objects, url=None):
+        path = self._path(name)
+        temp_path = f'{path}.tmp'
+        state = {
+            'url': url,
+            'delta_link': delta_link,
+            'synced_at': datetime.now(timezone.utc).isoformat(),
+            'objects': list(objects.values())
+        }
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+def apply_delta_page(objects, page):
+    """
+    Applies one page of delta results to objects, returning the number of changes.
+    """
+    changes = 0
+    for item in page.get('value', []):
+        item_id = item.get('id')
+        if item_id is None:
+            continue
+        if '@removed' in item:
+            objects.pop(item_id, None)
+        else:
+            # Delta results only carry the properties that changed, so merge into the stored copy
+            objects.setdefault(item_id, {}).update(item)
+        changes += 1
+    return changes
+
+def sync_endpoint(name, url, headers, store, session=None, scheduler=None, metrics=None):
+    """
+    Brings the stored copy of one endpoint up to date and returns its objects.
+
+    The first run follows url from scratch; later runs start from the saved delta link and only
+    apply changes. If Graph no longer recognises the delta token, the endpoint is resynced in full.
+    """
+    delta_link, objects = store.load(name, url)
+    start_url = delta_link or url
+    try:
+        changes, delta_link = _follow_delta(objects, start_url, headers, session, scheduler, metrics, name)
+    except requests.exceptions.HTTPError as e:
+        if delta_link is None or e.response is None or e.response.status_code not in (400, 410):
+            raise
+        print(f"Delta token for {name} is no longer valid, resyncing from scratch.")
+        objects = {}
+        changes, delta_link = _follow_delta(objects, url, headers, session, scheduler, metrics, name)
+
+    store.save(name, delta_link, objects, url)
+    print(f"Synced {name}: {changes} changes, {len(objects)} objects.")
+    return list(objects.values())
+
+def _follow_delta(objects, url, headers, session, scheduler, metrics=None, name=None):
+    changes = 0
+    delta_link = None
+    for page in iter_pages(url, headers, session, scheduler, metrics, name):
+        changes += apply_delta_page(objects, page)
+        delta_link = page.get('@odata.deltaLink', delta_link)
+    return changes, delta_link
+
+def delta_endpoints(base_url=GRAPH_BASE_URL, profiles=None, extra_select=None):
+    """
+    Builds the delta URL of each directory endpoint, selecting the same fields as its fetch profile.
+
+    extra_select adds properties per endpoint, as in build_endpoints.
+    """
+    profiles = ENDPOINT_PROFILES if profiles is None else profiles
+    extra_select = extra_select or {}
+    endpoints = {}
+    for name in DELTA_RESOURCES:
+        if name not in profiles:
+            continue
+        select = profiles[name].get('select')
+        if select and name in extra_select:
+            select = list(select) + list(extra_select[name])
+        endpoints[name] = build_endpoint(f"{profiles[name]['path']}/delta", select, base_url=base_url)
+    return endpoints
+
+def sync_data(headers, state_dir, max_workers=DEFAULT_MAX_WORKERS, session=None, scheduler=None,
+              base_url=GRAPH_BASE_URL, metrics=None, extra_select=None):
+    """
+    Returns the same data as fetch_data, syncing the directory endpoints incrementally.
+
+    Policies and named locations are small and always fetched in full; users, groups and applications come from the
+    local state in state_dir, updated with Graph delta queries. extra_select requests additional
+    properties per endpoint, as in build_endpoints; changing it resyncs the affected endpoints in full.
+    """
+    owns_session = session is None
+    if owns_session:
+        session = create_session(max_workers)
+    if scheduler is None:
+        scheduler = RequestScheduler(max_concurrency=max_workers)
+    store = DeltaStateStore(state_dir)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                name: executor.submit(sync_endpoint, name, url, headers, store, session, scheduler, metrics)
+                for name, url in delta_endpoints(base_url, extra_select=extra_select).items()
+            }
+            for name in FULL_RESOURCES:
+                url = build_endpoint(ENDPOINT_PROFILES[name]['path'], base_url=base_url)
+                futures[name] = executor.submit(fetch_paginated_data, url, headers, session, scheduler, metrics, name)
+
+            data = {}
+            for name, future in futures.items():
+                try:
+                    data[name] = future.result()
+                except requests.exceptions.RequestException as e:
+                    for pending in futures.values():
+                        pending.cancel()
+                    print(f"Error syncing {name}: {e}")
+                    sys.exit(1)
+            return data
+    finally:
+        if owns_session:
+            session.close()
@@ -0,0 +1,227 @@
+import argparse
+import random
+import uuid
+
+PLATFORMS = ['android', 'iOS', 'windows', 'macOS', 'linux']
+CLIENT_APP_TYPES = ['browser', 'mobileAppsAndDesktopClients', 'exchangeActiveSync', 'other']
+RISK_LEVELS = ['low', 'medium', 'high']
+STATES = ['enabled'] * 8 + ['enabledForReportingButNotEnforced', 'disabled']
+GRANT_CONTROLS = ['mfa', 'compliantDevice', 'domainJoinedDevice', 'approvedApplication', 'compliantApplication']
+# Well-known directory role template ids used in includeRoles
+ADMIN_ROLES = [
+    '62e90394-69f5-4237-9190-012177145e10', '194ae4cb-b126-40b2-bd5b-6091b380977d',
+    'f28a1f50-f6e7-4571-818b-6a12f2af6b6c', '29232cdf-9323-42fd-ade2-1d097af3e4de'
+]
+
+def default_scale(users):
+    """
+    Returns the group, application, location and policy counts of a realistic tenant with the given users.
+    """
+    return {
+        'users': users,
+        'groups': max(10, users // 50),
+        'applications': max(10, users // 200),
+        'locations': max(3, min(50, users // 5000)),
+        'policies': max(15, min(300, 15 + users // 4000))
+    }
+
+class TenantGenerator:
+    """
+    Generates a synthetic tenant in the shape fetch_data returns, reproducibly from a seed.
+
+    Policies follow common Conditional Access templates: MFA for all users with break-glass
+    exclusions, legacy authentication blocks, admin role policies, risk-based policies, device
+    platform and compliance policies, location blocks and per-application group policies. Some
+    are report-only or disabled, and some carry session controls.
+    """
+
+    def __init__(self, users=1000, groups=None, applications=None, locations=None, policies=None, seed=0):
+        scale = default_scale(users)
+        self.counts = {
+            'users': users,
+            'groups': scale['groups'] if groups is None else groups,
+            'applications': scale['applications'] if applications is None else applications,
+            'locations': scale['locations'] if locations is None else locations,
+            'policies': scale['policies'] if policies is None else policies
+        }
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.user_ids = [self.guid() for _ in range(self.counts['users'])]
+        self.group_ids = [self.guid() for _ in range(self.counts['groups'])]
+        self.app_ids = [self.guid() for _ in range(self.counts['applications'])]
+        self.app_object_ids = [self.guid() for _ in range(self.counts['applications'])]
+        self.location_ids = [self.guid() for _ in range(self.counts['locations'])]
+        self.break_glass = self.user_ids[:2]
+
+    def guid(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def sample(self, values, low, high):
+        return self.rng.sample(values, min(len(values), self.rng.randint(low, high)))
+
+    def users(self):
+        for n, user_id in enumerate(self.user_ids):
+            yield {'id': user_id, 'displayName': f'User {n}', 'userPrincipalName': f'user{n}@contoso.example'}
+
+    def groups(self):
+        for n, group_id in enumerate(self.group_ids):
+            yield {'id': group_id, 'displayName': f'Group {n}'}
+
+    def applications(self):
+        for n, (object_id, app_id) in enumerate(zip(self.app_object_ids, self.app_ids)):
+            yield {'id': object_id, 'appId': app_id, 'displayName': f'App {n}'}
+
+    def memberships(self, max_members=200, nesting=0.1):
+        """
+        Yields membership records for fetch_group_members' shape, with some groups nested in others.
+        """
+        for group_id in self.group_ids:
+            members = [{'id': user_id, '@odata.type': '#microsoft.graph.user'}
+                       for user_id in self.sample(self.user_ids, 1, max_members)]
+            if self.rng.random() < nesting:
+                members.extend({'id': subgroup, '@odata.type': '#microsoft.graph.group'}
+                               for subgroup in self.sample(self.group_ids, 1, 3) if subgroup != group_id)
+            yield {'id': group_id, 'members': members}
+
+    def policy(self, n):
+        template = self.rng.choice([
+            self._mfa_all_users, self._block_legacy, self._admin_roles, self._risk,
+            self._device_platforms, self._location_block, self._per_application
+        ])
+        conditions = {
+            'users': {'includeUsers': [], 'excludeUsers': [], 'includeGroups': [], 'excludeGroups': [],
+                      'includeRoles': [], 'excludeRoles': []},
+            'applications': {'includeApplications': ['All'], 'excludeApplications': []},
+            'platforms': None,
+            'locations': None,
+            'clientAppTypes': ['all'],
+            'userRiskLevels': [],
+            'signInRiskLevels': []
+        }
+        name, grant = template(conditions)
+        policy = {
+            'id': self.guid(),
+            'displayName': f'CA{n:03d} - {name}',
+            'state': self.rng.choice(STATES),
+            'conditions': conditions,
+            'grantControls': {'operator': self.rng.choice(['OR', 'AND']), 'builtInControls': grant},
+            'sessionControls': None
+        }
+        if self.rng.random() < 0.3:
+            policy['sessionControls'] = {
+                'signInFrequency': {'value': self.rng.choice([1, 4, 12, 24]), 'type': 'hours', 'isEnabled': True},
+                'persistentBrowser': {'mode': self.rng.choice(['always', 'never']), 'isEnabled': self.rng.random() < 0.5}
+            }
+        return policy
+
+    def _exclusions(self, users):
+        users['excludeUsers'] = list(self.break_glass) + self.sample(self.user_ids, 0, 5)
+        users['excludeGroups'] = self.sample(self.group_ids, 0, 3)
+
+    def _mfa_all_users(self, conditions):
+        conditions['users']['includeUsers'] = ['All']
+        self._exclusions(conditions['users'])
+        conditions['applications']['excludeApplications'] = self.sample(self.app_ids, 0, 3)
+        return 'Require MFA for all users', ['mfa']
+
+    def _block_legacy(self, conditions):
+        conditions['users']['includeUsers'] = ['All']
+        self._exclusions(conditions['users'])
+        conditions['clientAppTypes'] = ['exchangeActiveSync', 'other']
+        return 'Block legacy authentication', ['block']
+
+    def _admin_roles(self, conditions):
+        conditions['users']['includeRoles'] = self.sample(ADMIN_ROLES, 1, 4)
+        conditions['users']['excludeUsers'] = list(self.break_glass)
+        return 'Require MFA for administrators', ['mfa']
+
+    def _risk(self, conditions):
+        conditions['users']['includeUsers'] = ['All']
+        self._exclusions(conditions['users'])
+        if self.rng.random() < 0.5:
+            conditions['signInRiskLevels'] = self.sample(RISK_LEVELS, 1, 2)
+            return 'Require MFA for risky sign-ins', ['mfa']
+        conditions['userRiskLevels'] = ['high']
+        return 'Require password change for high user risk', ['mfa', 'passwordChange']
+
+    def _device_platforms(self, conditions):
+        conditions['users']['includeGroups'] = self.sample(self.group_ids, 1, 5)
+        conditions['platforms'] = {'includePlatforms': self.sample(PLATFORMS, 1, 3), 'excludePlatforms': []}
+        conditions['clientAppTypes'] = self.sample(CLIENT_APP_TYPES[:2], 1, 2)
+        return 'Require compliant device', self.sample(GRANT_CONTROLS[1:], 1, 2)
+
+    def _location_block(self, conditions):
+        conditions['users']['includeUsers'] = ['All']
+        self._exclusions(conditions['users'])
+        conditions['locations'] = {'includeLocations': ['All'],
+                                   'excludeLocations': ['AllTrusted'] + self.sample(self.location_ids, 0, 3)}
+        return 'Block access from untrusted locations', ['block']
+
+    def _per_application(self, conditions):
+        conditions['users']['includeUsers'] = self.sample(self.user_ids, 0, 10)
+        conditions['users']['includeGroups'] = self.sample(self.group_ids, 1, 5)
+        conditions['users']['excludeGroups'] = self.sample(self.group_ids, 0, 2)
+        conditions['applications']['includeApplications'] = self.sample(self.app_ids, 1, 5)
+        conditions['platforms'] = {'includePlatforms': ['all'], 'excludePlatforms': self.sample(PLATFORMS, 0, 1)}
+        conditions['locations'] = {'includeLocations': self.sample(self.location_ids, 1, 2), 'excludeLocations': []}
+        return 'Require MFA for sensitive applications', self.sample(GRANT_CONTROLS, 1, 2)
+
+    def policies(self):
+        return [self.policy(n) for n in range(self.counts['policies'])]
+
+    def signins(self, count):
+        """
+        Yields count synthetic sign-ins in the shape DecisionIndex evaluates.
+        """
+        rng = self.rng
+        risk_levels = ['none'] * 17 + RISK_LEVELS
+        for _ in range(count):
+            yield {
+                'user': rng.choice(self.user_ids),
+                'groups': rng.sample(self.group_ids, min(len(self.group_ids), rng.randint(0, 3))),
+                'roles': [rng.choice(ADMIN_ROLES)] if rng.random() < 0.05 else [],
+                'application': rng.choice(self.app_ids),
+                'platform': rng.choice(PLATFORMS),
+                'location': [rng.choice(self.location_ids)] if rng.random() < 0.7 else ['AllTrusted'],
+                'client_app': rng.choice(CLIENT_APP_TYPES) if rng.random() < 0.1 else rng.choice(CLIENT_APP_TYPES[:2]),
+                'user_risk': rng.choice(risk_levels),
+                'sign_in_risk': rng.choice(risk_levels)
+            }
+
+    def tenant(self, memberships=False):
+        """
+        Returns the whole tenant as a data dict, as fetch_data or load_snapshot would.
+        """
+        data = {
+            'policies': self.policies(),
+            'users': list(self.users()),
+            'groups': list(self.groups()),
+            'applications': list(self.applications())
+        }
+        if memberships:
+            data['memberships'] = list(self.memberships())
+        return data
+
+def generate_tenant(users=1000, seed=0, memberships=False, **counts):
+    """
+    Returns a synthetic tenant data dict with the given number of users. See TenantGenerator.
+    """
+    return TenantGenerator(users=users, seed=seed, **counts).tenant(memberships=memberships)
+
+if __name__ == '__main__':
+    from pyCaOptics_snapshot import save_snapshot
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic tenant snapshot for testing and benchmarks.")
+    parser.add_argument('output', help="Path of the snapshot to write, e.g. synthetic.snapshot.jsonl.gz.")
+    parser.add_argument('--users', type=int, default=1000, help="Number of users (1k to 1M).")
+    parser.add_argument('--groups', type=int, default=None, help="Number of groups (default scales with users).")
+    parser.add_argument('--applications', type=int, default=None, help="Number of applications (default scales with users).")
+    parser.add_argument('--policies', type=int, default=None, help="Number of policies (default scales with users).")
+    parser.add_argument('--memberships', action='store_true', help="Also generate group memberships.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same tenant.")
+    args = parser.parse_args()
+
+    data = generate_tenant(args.users, seed=args.seed, memberships=args.memberships, groups=args.groups,
+                           applications=args.applications, policies=args.policies)
+    save_snapshot(data, args.output, ttl_hours=0, tenant_id='synthetic')
+    print(f"Synthetic tenant with {', '.join(f'{len(items)} {kind}' for kind, items in data.items())} saved to '{args.output}'.")
@@ -0,0 +1,262 @@
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pyCaOptics_app import DEFAULT_OUTPUT_DIR, add_output_arguments, analyze_data, fetch_tenant, name_resolver
+from pyCaOptics_auth import add_auth_arguments, auth_options, build_credential, credential_headers
+from pyCaOptics_fetch import DEFAULT_MAX_WORKERS
+from pyCaOptics_names import DEFAULT_CACHE_TTL_HOURS
+from pyCaOptics_output import open_writer, output_filename
+from pyCaOptics_scheduler import RequestScheduler
+from pyCaOptics_snapshot import load_snapshot, save_snapshot
+
+MANIFEST_FIELDS = ['name', 'tenant_id', 'client_id', 'auth', 'certificate', 'secret_variable', 'snapshot']
+SUMMARY_FIELDS = ['tenant', 'tenant_id', 'status', 'policies', 'users', 'groups', 'applications', 'results',
+                  'changes', 'fetch_seconds', 'analysis_seconds', 'directory', 'error']
+SUMMARY_TYPES = {**dict.fromkeys(['policies', 'users', 'groups', 'applications', 'results', 'changes'], 'int'),
+                 'fetch_seconds': 'float', 'analysis_seconds': 'float'}
+COUNTED_RESOURCES = ['policies', 'users', 'groups', 'applications']
+DEFAULT_MAX_TENANTS = 4
+DEFAULT_TENANT_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'cache', 'tenants')
+STATE_DIR = os.path.join(os.path.dirname(__file__), '..', 'state')
+SNAPSHOT_NAME = 'snapshot.jsonl.gz'
+LOG_NAME = 'analysis.log'
+
+class ManifestError(Exception):
+    """
+    Raised when a tenant manifest cannot be read or lists an unusable tenant.
+    """
+
+class TenantError(Exception):
+    pass
+
+def read_manifest(path):
+    """
+    Reads the tenants to audit from a JSON list of objects or a CSV file with a header row.
+
+    Each tenant has the MANIFEST_FIELDS: a tenant_id and client_id to fetch with, and optionally
+    its own auth method, certificate or secret_variable, the environment variable holding its
+    client secret. A tenant with a snapshot is analyzed from it instead of being fetched. Every
+    tenant is given a directory, a file-system-safe and unique version of its name.
+    """
+    try:
+        with open(path, encoding='utf-8', newline='') as f:
+            if path.lower().endswith('.csv'):
+                entries = list(csv.DictReader(f))
+            else:
+                entries = json.load(f)
+    except (OSError, ValueError, csv.Error) as e:
+        raise ManifestError(f"Cannot read the manifest {path}: {e}") from e
+    if not isinstance(entries, list):
+        raise ManifestError(f"The manifest {path} must hold a list of tenants.")
+
+    tenants, directories = [], set()
+    for number, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise ManifestError(f"Tenant {number} in {path} is not an object.")
+        unknown = sorted(set(entry) - set(MANIFEST_FIELDS))
+        if unknown:
+            raise ManifestError(f"Tenant {number} in {path} has unknown fields: {', '.join(unknown)}.")
+        # Empty CSV cells mean the field is not set
+        tenant = {field: (entry.get(field) or None) for field in MANIFEST_FIELDS}
+        if not tenant['tenant_id'] and not tenant['snapshot']:
+            raise ManifestError(f"Tenant {number} in {path} needs a tenant_id or a snapshot.")
+        tenant['name'] = tenant['name'] or tenant['tenant_id'] or os.path.basename(tenant['snapshot']).split('.')[0]
+        tenant['directory'] = _unique_directory(tenant['name'], directories)
+        tenants.append(tenant)
+    return tenants
+
+def _unique_directory(name, taken):
+    directory = re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('._') or 'tenant'
+    candidate, suffix = directory, 2
+    while candidate.lower() in taken:
+        candidate = f'{directory}_{suffix}'
+        suffix += 1
+    taken.add(candidate.lower())
+    return candidate
+
+def fetch_snapshot(tenant, tenant_dir, credential_options=None, max_workers=DEFAULT_MAX_WORKERS, incremental=False,
+                   resolve_groups=False, application_names=False):
+    """
+    Signs in to one tenant, fetches its data and saves it as a snapshot in tenant_dir for the analysis.
+
+    Tenants sign in with a client secret unless credential_options or the tenant say otherwise.
+    Returns the snapshot path and the seconds the sign-in and fetch took.
+    """
+    start = time.perf_counter()
+    options = {'method': 'client-secret', **(credential_options or {})}
+    for field, option in (('auth', 'method'), ('certificate', 'certificate_path'), ('secret_variable', 'secret_variable')):
+        if tenant[field]:
+            options[option] = tenant[field]
+    credential = build_credential(tenant['tenant_id'], tenant['client_id'], **options)
+    headers = credential_headers(credential)
+
+    # Each tenant gets its own scheduler, so throttling by one tenant does not slow down the others
+    scheduler = RequestScheduler(max_concurrency=max_workers)
+    state_dir = os.path.join(STATE_DIR, tenant['tenant_id']) if incremental else None
+    data = fetch_tenant(headers, scheduler, max_workers, state_dir, resolve_groups, application_names)
+    path = os.path.join(tenant_dir, SNAPSHOT_NAME)
+    save_snapshot(data, path, ttl_hours=0, tenant_id=tenant['tenant_id'])
+    return path, time.perf_counter() - start
+
+def analyze_tenant(snapshot_path, tenant_dir, names_cache=None, names_ttl=DEFAULT_CACHE_TTL_HOURS, **analysis_options):
+    """
+    Analyzes one tenant's snapshot and writes its results to tenant_dir. Runs in a worker process.
+
+    What the analysis prints goes to the analysis.log file in tenant_dir rather than the shared
+    console. Returns the number of each counted resource, the rows written to each file and the
+    seconds the analysis took.
+    """
+    start = time.perf_counter()
+    log_path = os.path.join(tenant_dir, LOG_NAME)
+    with open(log_path, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        try:
+            data, header = load_snapshot(snapshot_path, allow_expired=True)
+            print(f"Analyzing snapshot '{snapshot_path}' taken at {header['created_at']}.")
+            rows = analyze_data(data, names=name_resolver(names_cache, names_ttl), output_dir=tenant_dir,
+                                **analysis_options)
+        except SystemExit:
+            # The analysis reports its own errors and exits, as it does on the command line
+            raise TenantError(f"Analysis failed, see '{log_path}'.") from None
+    return {'counts': {kind: len(data.get(kind, [])) for kind in COUNTED_RESOURCES}, 'rows': rows,
+            'seconds': time.perf_counter() - start}
+
+def tenant_caches(tenant, cache_dir=DEFAULT_TENANT_CACHE_DIR, resolve_names=False, reuse_results=False):
+    """
+    Returns the names_cache and results_cache options of a tenant, kept apart from other tenants.
+    """
+    directory = os.path.join(cache_dir, tenant['directory'])
+    return {
+        'names_cache': os.path.join(directory, 'names.json.gz') if resolve_names else None,
+        'results_cache': os.path.join(directory, 'analysis.json.gz') if reuse_results else None
+    }
+
+def run_batch(tenants, output_dir, credential_options=None, max_tenants=DEFAULT_MAX_TENANTS, processes=None,
+              max_workers=DEFAULT_MAX_WORKERS, incremental=False, resolve_groups=False,
+              cache_dir=DEFAULT_TENANT_CACHE_DIR, resolve_names=False, names_ttl=DEFAULT_CACHE_TTL_HOURS,
+              reuse_results=False, output_format='csv', compression=None, **analysis_options):
+    """
+    Fetches and analyzes tenants from read_manifest() in parallel and writes a batch summary.
+
+    Fetching is I/O bound: up to max_tenants tenants are fetched at once on threads, each with
+    up to max_workers concurrent requests. Analysis is CPU bound and runs in a pool of processes
+    worker processes (default: one per CPU). A tenant's analysis starts as soon as its fetch
+    completes, handed over as a snapshot. Every tenant writes its results, snapshot and analysis
+    log to its own directory under output_dir, so no two tenants write the same file. A tenant
+    that fails is recorded in the summary and does not stop the others.
+
+    Returns the summary rows, in manifest order.
+    """
+    options = {'output_format': output_format, 'compression': compression, 'names_ttl': names_ttl, **analysis_options}
+    summary = {}
+    for tenant in tenants:
+        summary[tenant['directory']] = dict.fromkeys(SUMMARY_FIELDS)
+        summary[tenant['directory']].update(tenant=tenant['name'], tenant_id=tenant['tenant_id'],
+                                            directory=tenant['directory'])
+        os.makedirs(os.path.join(output_dir, tenant['directory']), exist_ok=True)
+
+    def failed(tenant, stage, error):
+        message = str(error) or type(error).__name__
+        summary[tenant['directory']].update(status=f'{stage} failed', error=message)
+        print(f"{tenant['name']}: {stage} failed: {message}")
+
+    # Worker processes are spawned rather than forked, since the parent is running fetch threads
+    context = multiprocessing.get_context('spawn')
+    with ThreadPoolExecutor(max_workers=max_tenants) as fetchers, \
+            ProcessPoolExecutor(max_workers=processes, mp_context=context) as analyzers:
+        fetches, analyses = {}, {}
+
+        def start_analysis(tenant, snapshot_path):
+            tenant_options = {**options, **tenant_caches(tenant, cache_dir, resolve_names, reuse_results)}
+            future = analyzers.submit(analyze_tenant, snapshot_path, os.path.join(output_dir, tenant['directory']),
+                                      **tenant_options)
+            analyses[future] = tenant
+
+        for tenant in tenants:
+            if tenant['snapshot']:
+                start_analysis(tenant, tenant['snapshot'])
+                continue
+            future = fetchers.submit(fetch_snapshot, tenant, os.path.join(output_dir, tenant['directory']),
+                                     credential_options, max_workers, incremental, resolve_groups, resolve_names)
+            fetches[future] = tenant
+
+        for future in as_completed(fetches):
+            tenant = fetches[future]
+            try:
+                snapshot_path, seconds = future.result()
+            except SystemExit as e:
+                # The fetch prints its own error and exits, as it does on the command line
+                failed(tenant, 'fetch', f"fetch exited with status {e.code}")
+                continue
+            except Exception as e:
+                failed(tenant, 'fetch', e)
+                continue
+            summary[tenant['directory']]['fetch_seconds'] = round(seconds, 3)
+            print(f"{tenant['name']}: fetched in {summary[tenant['directory']]['fetch_seconds']}s.")
+            start_analysis(tenant, snapshot_path)
+
+        for future in as_completed(analyses):
+            tenant = analyses[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed(tenant, 'analysis', e)
+                continue
+            row = summary[tenant['directory']]
+            row.update(result['counts'], status='ok', results=result['rows'].get('analysis_results'),
+                       changes=result['rows'].get('analysis_diff'),
+                       analysis_seconds=round(result['seconds'], 3))
+            print(f"{tenant['name']}: {row['results']} results saved to '{os.path.join(output_dir, row['directory'])}'.")
+
+    rows = list(summary.values())
+    filename = output_filename(output_dir, 'batch_summary', output_format, compression)
+    with open_writer(filename, SUMMARY_FIELDS, output_format, compression, column_types=SUMMARY_TYPES) as writer:
+        writer.write_rows(rows)
+    succeeded = sum(row['status'] == 'ok' for row in rows)
+    print(f"Batch complete. {succeeded} of {len(rows)} tenants analyzed. Summary saved to '{filename}'.")
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fetch and analyze the Conditional Access policies of many tenants in parallel.")
+    parser.add_argument('manifest', help="JSON or CSV file listing the tenants: " + ', '.join(MANIFEST_FIELDS) + ".")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directory for the per-tenant results and the summary (default: output/batch_<timestamp>).")
+    parser.add_argument('--max-tenants', type=int, default=DEFAULT_MAX_TENANTS,
+                        help="Maximum number of tenants fetched concurrently.")
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Maximum number of endpoints fetched concurrently per tenant.")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="Number of analysis processes (default: one per CPU).")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Sync users, groups and applications with Graph delta queries, keeping state in state/<tenant_id>.")
+    parser.add_argument('--resolve-groups', action='store_true',
+                        help="Fetch the members of the groups policies reference, including nested groups.")
+    parser.add_argument('--cache-dir', default=DEFAULT_TENANT_CACHE_DIR,
+                        help="Directory holding a names and results cache per tenant (default: cache/tenants).")
+    add_output_arguments(parser)
+    add_auth_arguments(parser, default_method='client-secret')
+    args = parser.parse_args()
+    if args.names_cache or args.results_cache:
+        parser.error("each tenant has its own caches; use --cache-dir to choose where they are kept")
+
+    try:
+        tenants = read_manifest(args.manifest)
+    except ManifestError as e:
+        print(f"Error reading the manifest: {e}")
+        sys.exit(1)
+
+    output_dir = args.output_dir or os.path.join(DEFAULT_OUTPUT_DIR, f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    rows = run_batch(tenants, output_dir, auth_options(args), max_tenants=args.max_tenants, processes=args.processes,
+                     max_workers=args.max_workers, incremental=args.incremental, resolve_groups=args.resolve_groups,
+                     cache_dir=args.cache_dir, resolve_names=args.resolve_names, names_ttl=args.names_ttl,
+                     reuse_results=args.reuse_results, output_format=args.output_format, compression=args.compression,
+                     coverage_output=args.coverage_output, coverage_reason=not args.no_coverage_reason)
+    if any(row['status'] != 'ok' for row in rows):
+        sys.exit(1)
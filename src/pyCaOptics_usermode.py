@@ -1,32 +1,22 @@
-import json
+import argparse
 import requests
-import pandas as pd
 import sys
-import os
-from datetime import datetime
-from azure.identity import DeviceCodeCredential
+from pyCaOptics_app import add_run_arguments, analyze_snapshot, output_options, run, run_metrics, run_options
+from pyCaOptics_auth import AuthError, add_auth_arguments, auth_options, build_credential, credential_headers
 
-def main(tenant_id):
+def main(tenant_id, credential_options=None, **options):
     try:
-        credentials = DeviceCodeCredential(tenant_id=tenant_id)
-        token = credentials.get_token("https://graph.microsoft.com/.default")
-        headers = {
-            "Authorization": f"Bearer {token.token}",
-            "Content-Type": "application/json"
-        }
+        metrics = run_metrics(options)
+        with metrics:
+            with metrics.stage('get_token'):
+                credential = build_credential(tenant_id, **{'method': 'device-code', **(credential_options or {})})
+                headers = credential_headers(credential)
 
-        endpoints = {
-            "policies": "https://graph.microsoft.com/v1.0/identity/conditionalAccess/policies",
-            "users": "https://graph.microsoft.com/v1.0/users",
-            "groups": "https://graph.microsoft.com/v1.0/groups",
-            "applications": "https://graph.microsoft.com/v1.0/applications"
-        }
-
-        data = fetch_data(headers, endpoints)
-        analysis_results = analysis(data['policies'], data['users'], data['groups'], data['applications'])
-        df_analysis = pd.DataFrame(analysis_results)
-        save_results(df_analysis)
+            run(headers, metrics=metrics, **options)
 
+    except AuthError as e:
+        print(f"Authentication error: {e}")
+        sys.exit(1)
     except requests.exceptions.RequestException as e:
         print(f"Error in API request: {e}")
         sys.exit(1)
@@ -34,122 +24,18 @@ def main(tenant_id):
         print(f"An unexpected error occurred: {e}")
         sys.exit(1)
 
-def fetch_data(headers, endpoints):
-    data = {}
-    for key, url in endpoints.items():
-        data[key] = fetch_paginated_data(url, headers)
-    return data
-
-def fetch_paginated_data(url, headers):
-    try:
-        items = []
-        while url:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            items.extend(data.get('value', []))
-            url = data.get('@odata.nextLink')
-        return items
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data from {url}: {e}")
-        sys.exit(1)
-
-def analysis(policies, all_users, all_groups, all_applications):
-    analysis_results = []
-    all_user_ids = {user.get('id') for user in all_users if user.get('id')}
-    all_group_ids = {group.get('id') for group in all_groups if group.get('id')}
-    all_application_ids = {app.get('appId') for app in all_applications if app.get('appId')}
-
-    excluded_users, excluded_groups, excluded_applications = set(), set(), set()
-
-    for policy in policies:
-        try:
-            state = policy.get('state')
-            if state is None:
-                continue
-
-            users_included = set(policy.get('conditions', {}).get('users', {}).get('includeUsers', []))
-            users_excluded = set(policy.get('conditions', {}).get('users', {}).get('excludeUsers', []))
-            groups_included = set(policy.get('conditions', {}).get('users', {}).get('includeGroups', []))
-            groups_excluded = set(policy.get('conditions', {}).get('users', {}).get('excludeGroups', []))
-            applications_included = set(policy.get('conditions', {}).get('applications', {}).get('includeApplications', []))
-            applications_excluded = set(policy.get('conditions', {}).get('applications', {}).get('excludeApplications', []))
-            
-            # Handle NoneType for grantControls
-            grant_controls = policy.get('grantControls') or {}
-            built_in_controls = grant_controls.get('builtInControls', [])
-
-            user_risk_levels = policy.get('conditions', {}).get('userRiskLevels', [])
-            sign_in_risk_levels = policy.get('conditions', {}).get('signInRiskLevels', [])
-            session_controls = policy.get('sessionControls', {})
-            platforms = policy.get('conditions', {}).get('platforms', {})
-            device_states = policy.get('conditions', {}).get('deviceStates', {})
-
-            excluded_users.update(users_excluded)
-            excluded_groups.update(groups_excluded)
-            excluded_applications.update(applications_excluded)
-
-            gaps = []
-
-            if state != 'enabled':
-                gaps.append("Policy is not enabled.")
-            if not user_risk_levels and not sign_in_risk_levels:
-                gaps.append("Policy does not consider user or sign-in risk levels.")
-            if not platforms:
-                gaps.append("No platforms specified.")
-            if not device_states:
-                gaps.append("No device state conditions specified.")
-            if not session_controls:
-                gaps.append("No session controls applied.")
-            if 'All' in users_included and users_excluded:
-                gaps.append("Policy includes all users but has exclusions.")
-            if 'All' in applications_included and applications_excluded:
-                gaps.append("Policy includes all applications but has exclusions.")
-            if users_excluded or groups_excluded:
-                gaps.append("Users or groups excluded, potential conflicts with other policies.")
-
-            analysis_results.append({'Policy Name': policy.get('displayName', 'Unnamed Policy'), 'State': state, 'Gaps Identified': gaps})
-        except AttributeError as e:
-            print(f"Error processing policy {policy.get('displayName', 'Unnamed Policy')}: {e}")
-            print(f"Policy data: {json.dumps(policy, indent=2)}")  # Log the full policy data for debugging
-            continue
-
-    try:
-        uncovered_users = all_user_ids - excluded_users
-        uncovered_groups = all_group_ids - excluded_groups
-        uncovered_applications = all_application_ids - excluded_applications
-
-        if uncovered_users:
-            analysis_results.append({'Policy Name': 'Coverage Check', 'State': 'n/a', 'Gaps Identified': [f"Uncovered users: {uncovered_users}"]})
-        if uncovered_groups:
-            analysis_results.append({'Policy Name': 'Coverage Check', 'State': 'n/a', 'Gaps Identified': [f"Uncovered groups: {uncovered_groups}"]})
-        if uncovered_applications:
-            analysis_results.append({'Policy Name': 'Coverage Check', 'State': 'n/a', 'Gaps Identified': [f"Uncovered applications: {uncovered_applications}"]})
-    except Exception as e:
-        print(f"Error during coverage check: {e}")
-
-    return analysis_results
-
-def save_results(df_analysis):
-    try:
-        output_dir = os.path.join(os.path.dirname(__file__), '..', 'output')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        output_filename = os.path.join(output_dir, 'analysis_results.csv')
-        if os.path.exists(output_filename):
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_filename = os.path.join(output_dir, f'analysis_results_{timestamp}.csv')
-
-        df_analysis.to_csv(output_filename, index=False)
-        print(f"Analysis complete. Results saved to '{output_filename}'.")
-    except Exception as e:
-        print(f"Error saving the results to file: {e}")
-        sys.exit(1)
-
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python pyCaOptics-usermode.py <tenant_id>")
-        sys.exit(1)
-
-    tenant_id = sys.argv[1]
-    main(tenant_id)
+    parser = argparse.ArgumentParser(description="Analyze Conditional Access policies using device code sign-in.")
+    parser.add_argument('tenant_id', nargs='?', help="The Azure Active Directory tenant ID.")
+    add_run_arguments(parser)
+    add_auth_arguments(parser, default_method='device-code')
+    parser.add_argument('--client-id', default=None,
+                        help="Client ID for --auth client-secret or certificate, or of a custom public client app.")
+    args = parser.parse_args()
+
+    if args.from_snapshot:
+        analyze_snapshot(args.from_snapshot, allow_expired=args.allow_expired, **output_options(args))
+    elif not args.tenant_id:
+        parser.error("tenant_id is required unless --from-snapshot is given")
+    else:
+        main(args.tenant_id, {'client_id': args.client_id, **auth_options(args)}, **run_options(args))
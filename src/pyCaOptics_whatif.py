@@ -0,0 +1,236 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from pyCaOptics_output import DEFAULT_CHUNK_SIZE, OUTPUT_FORMATS, open_writer, output_filename
+from pyCaOptics_policy import compile_policies
+
+# A sign-in is a dict with these keys; groups, roles and location may hold several values
+SIGNIN_FIELDS = ['user', 'groups', 'roles', 'application', 'platform', 'location', 'client_app', 'user_risk', 'sign_in_risk']
+MULTI_VALUED_FIELDS = frozenset(['groups', 'roles', 'location'])
+WHATIF_FIELDS = SIGNIN_FIELDS + ['policies', 'grant_controls']
+WHATIF_TYPES = dict.fromkeys(list(MULTI_VALUED_FIELDS) + ['policies'], 'list')
+LIST_SEPARATOR = ';'
+
+class DecisionIndex:
+    """
+    Answers which policies apply to a sign-in, for many sign-ins at a time.
+
+    Policies are numbered and each set of policies is an int bitset. For every condition
+    dimension the index maps each value a policy names to the bitset of policies that match it,
+    and keeps a default bitset (the policies including All) for values no policy names. A
+    sign-in is evaluated with one dict lookup per dimension and an AND of the bitsets, so the
+    cost does not grow with the number of policies. Users, groups and roles share one identity
+    dimension: a policy matches if it includes any of them and excludes none. The policy IDs and
+    grant controls of each distinct bitset are worked out once and reused.
+    """
+
+    def __init__(self, policies, states=('enabled',)):
+        self.policies = [policy for policy in compile_policies(policies) if policy.state in states]
+        self.all = (1 << len(self.policies)) - 1
+        self.identity = self._multi_dimension(lambda policy: (
+            policy.users.include | policy.groups.include | policy.roles.include,
+            policy.users.exclude | policy.groups.exclude | policy.roles.exclude,
+            policy.users.include_all
+        ))
+        self.locations = self._multi_dimension(lambda policy: (
+            policy.locations.include, policy.locations.exclude, policy.locations.include_all
+        ))
+        self.applications = self._dimension(lambda policy: policy.applications)
+        self.platforms = self._dimension(lambda policy: policy.platforms)
+        self.client_apps = self._dimension(lambda policy: policy.client_app_types)
+        self.user_risks = self._dimension(lambda policy: policy.user_risk_levels)
+        self.sign_in_risks = self._dimension(lambda policy: policy.sign_in_risk_levels)
+        self._decisions = {}
+
+    def __len__(self):
+        return len(self.policies)
+
+    def _multi_dimension(self, condition):
+        default = 0
+        include, exclude = {}, {}
+        for position, policy in enumerate(self.policies):
+            bit = 1 << position
+            included, excluded, include_all = condition(policy)
+            if include_all:
+                default |= bit
+            for value in included:
+                include[value] = include.get(value, 0) | bit
+            for value in excluded:
+                exclude[value] = exclude.get(value, 0) | bit
+        return default, include, exclude
+
+    def _dimension(self, condition):
+        # Single-valued dimensions fold includes and excludes into one final bitset per value
+        default, include, exclude = self._multi_dimension(
+            lambda policy: (condition(policy).include, condition(policy).exclude, condition(policy).include_all))
+        masks = {value: (default | include.get(value, 0)) & ~exclude.get(value, 0) & self.all
+                 for value in set(include) | set(exclude)}
+        return default, masks
+
+    @staticmethod
+    def _multi_mask(dimension, values):
+        default, include, exclude = dimension
+        if values is None:
+            return default
+        if isinstance(values, str):
+            return (default | include.get(values, 0)) & ~exclude.get(values, 0)
+        matched, excluded = default, 0
+        for value in values:
+            matched |= include.get(value, 0)
+            excluded |= exclude.get(value, 0)
+        return matched & ~excluded
+
+    def match(self, signin):
+        """
+        Returns the bitset of policies that apply to a sign-in dict.
+        """
+        get = signin.get
+        default, include, exclude = self.identity
+        user = get('user')
+        matched = default | include.get(user, 0)
+        excluded = exclude.get(user, 0)
+        for values in (get('groups'), get('roles')):
+            for value in values or ():
+                matched |= include.get(value, 0)
+                excluded |= exclude.get(value, 0)
+        mask = matched & ~excluded
+        if not mask:
+            return 0
+
+        # Unrolled rather than looped over the dimensions; this is the hot path of a replay
+        default, masks = self.applications
+        mask &= masks.get(get('application'), default)
+        default, masks = self.platforms
+        mask &= masks.get(get('platform'), default)
+        default, masks = self.client_apps
+        mask &= masks.get(get('client_app'), default)
+        default, masks = self.user_risks
+        mask &= masks.get(get('user_risk'), default)
+        default, masks = self.sign_in_risks
+        mask &= masks.get(get('sign_in_risk'), default)
+        if mask:
+            mask &= self._multi_mask(self.locations, get('location'))
+        return mask
+
+    def decision(self, mask):
+        """
+        Returns the policy IDs and effective grant controls for a bitset from match().
+        """
+        decision = self._decisions.get(mask)
+        if decision is None:
+            matched = []
+            remaining = mask
+            while remaining:
+                low = remaining & -remaining
+                matched.append(self.policies[low.bit_length() - 1])
+                remaining ^= low
+            decision = ([policy.id or policy.display_name for policy in matched], grant_controls(matched))
+            self._decisions[mask] = decision
+        return decision
+
+    def evaluate(self, signin):
+        """
+        Returns (policy IDs, grant controls) for one sign-in.
+        """
+        return self.decision(self.match(signin))
+
+    def evaluate_all(self, signins):
+        """
+        Yields each sign-in as a result row with its matching policies and grant controls added.
+        """
+        match, decision = self.match, self.decision
+        for signin in signins:
+            policies, controls = decision(match(signin))
+            row = dict(signin)
+            row['policies'] = policies
+            row['grant_controls'] = controls
+            yield row
+
+def grant_controls(policies):
+    """
+    Combines the grant controls of the policies that apply to a sign-in into one requirement.
+
+    Any block wins. Otherwise every policy's controls must be satisfied, so the requirements are
+    joined with AND, each one being its controls joined with the policy's own operator.
+    """
+    requirements = []
+    for policy in policies:
+        controls = sorted(policy.built_in_controls)
+        if 'block' in controls:
+            return 'block'
+        if not controls:
+            continue
+        requirement = f' {policy.grant_operator} '.join(controls)
+        if len(controls) > 1:
+            requirement = f'({requirement})'
+        if requirement not in requirements:
+            requirements.append(requirement)
+    if not requirements:
+        return 'allow'
+    if len(requirements) == 1:
+        return requirements[0].strip('()')
+    return ' AND '.join(requirements)
+
+def _open_signins(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+def read_signins(path):
+    """
+    Streams sign-in dicts from a JSON Lines or CSV file, optionally gzip-compressed.
+
+    In CSV files, several groups, roles or locations are separated with ';'.
+    """
+    with _open_signins(path) as f:
+        if '.csv' in os.path.basename(path):
+            for row in csv.DictReader(f):
+                yield {field: (value.split(LIST_SEPARATOR) if value else []) if field in MULTI_VALUED_FIELDS else (value or None)
+                       for field, value in row.items()}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def evaluate_file(policies, signins_path, output_format='csv', compression=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                  states=('enabled',)):
+    """
+    Evaluates every sign-in in a file against the policies and writes the results.
+    """
+    index = DecisionIndex(policies, states)
+    output_dir = os.path.join(os.path.dirname(__file__), '..', 'output')
+    filename = output_filename(output_dir, 'whatif_results', output_format, compression)
+    start = time.perf_counter()
+    with open_writer(filename, WHATIF_FIELDS, output_format, compression, chunk_size, WHATIF_TYPES) as writer:
+        writer.write_rows(index.evaluate_all(read_signins(signins_path)))
+    elapsed = time.perf_counter() - start
+    rate = f" ({writer.rows_written / elapsed:,.0f} per second)" if elapsed else ''
+    print(f"Evaluated {writer.rows_written} sign-ins against {len(index)} policies{rate}. Results saved to '{filename}'.")
+    return filename
+
+if __name__ == '__main__':
+    from pyCaOptics_snapshot import SnapshotError, load_snapshot
+
+    parser = argparse.ArgumentParser(description="Evaluate sign-ins against the Conditional Access policies in a snapshot.")
+    parser.add_argument('signins', help="JSON Lines or CSV file of sign-ins, with the columns " + ', '.join(SIGNIN_FIELDS) + ".")
+    parser.add_argument('--from-snapshot', required=True, help="Snapshot holding the policies to evaluate.")
+    parser.add_argument('--allow-expired', action='store_true', help="Use the snapshot even if it has expired.")
+    parser.add_argument('--include-report-only', action='store_true',
+                        help="Also evaluate policies in report-only mode, as if they were enabled.")
+    parser.add_argument('--output-format', choices=list(OUTPUT_FORMATS), default='csv',
+                        help="Format of the results file. Parquet requires pyarrow.")
+    parser.add_argument('--compression', default=None,
+                        help="Compress the results: gzip, bz2 or xz for csv/jsonl; snappy, gzip, zstd, brotli or lz4 for parquet.")
+    args = parser.parse_args()
+
+    try:
+        data, _ = load_snapshot(args.from_snapshot, allow_expired=args.allow_expired)
+    except (OSError, SnapshotError) as e:
+        print(f"Error loading snapshot: {e}")
+        sys.exit(1)
+    states = ('enabled', 'enabledForReportingButNotEnforced') if args.include_report_only else ('enabled',)
+    evaluate_file(data['policies'], args.signins, args.output_format, args.compression, states=states)
@@ -1,6 +1,10 @@
+import os
+import tempfile
 import unittest
-from unittest.mock import patch
-from azure.identity import InteractiveBrowserCredential
+from unittest.mock import Mock, patch
+import requests
+from azure.core.credentials import AccessToken
+from azure.identity import AuthenticationRecord, InteractiveBrowserCredential
 
 class TestAuthentication(unittest.TestCase):
     @patch('azure.identity.InteractiveBrowserCredential.get_token')
@@ -18,5 +22,50 @@ class TestAuthentication(unittest.TestCase):
             credential.get_token("https://graph.microsoft.com/.default")
         self.assertIn("Authentication failed", str(context.exception))
 
+class TestCredentialLayer(unittest.TestCase):
+    def test_token_is_refreshed_before_expiry(self):
+        from src.pyCaOptics_auth import GraphHeaders, TokenProvider
+        now = [1000.0]
+        credential = Mock()
+        credential.get_token.side_effect = [AccessToken('first', 4600), AccessToken('second', 8200)]
+        headers = GraphHeaders(TokenProvider(credential, refresh_margin=300, clock=lambda: now[0]))
+
+        prepared = requests.Request('GET', 'https://graph/users', headers=headers).prepare()
+        self.assertEqual(prepared.headers['Authorization'], 'Bearer first')
+        now[0] = 4000.0
+        self.assertEqual(dict(headers)['Authorization'], 'Bearer first')
+        now[0] = 4400.0
+        self.assertEqual(dict(headers, **{'Content-Type': 'text/plain'}),
+                         {'Authorization': 'Bearer second', 'Content-Type': 'text/plain'})
+        self.assertEqual(credential.get_token.call_count, 2)
+
+    def test_client_secret_comes_from_environment(self):
+        from src.pyCaOptics_auth import AuthError, build_credential
+        with patch('src.pyCaOptics_auth.ClientSecretCredential') as mock_credential, \
+             patch.dict(os.environ, {'AZURE_CLIENT_SECRET': 's3cret'}):
+            build_credential('tenant', 'client', method='client-secret', allow_unencrypted_cache=True)
+        args, kwargs = mock_credential.call_args
+        self.assertEqual(args, ('tenant', 'client', 's3cret'))
+        self.assertEqual(kwargs['cache_persistence_options'].name, 'pyCaOptics')
+        self.assertTrue(kwargs['cache_persistence_options'].allow_unencrypted_storage)
+
+        with patch.dict(os.environ, {}, clear=True), self.assertRaises(AuthError):
+            build_credential('tenant', 'client', method='client-secret')
+
+    def test_interactive_sign_in_is_remembered(self):
+        from src.pyCaOptics_auth import build_credential
+        record = AuthenticationRecord('tenant', 'client', 'login.microsoftonline.com', 'home-account', 'user@contoso.example')
+        with tempfile.TemporaryDirectory() as directory, \
+             patch('src.pyCaOptics_auth.InteractiveBrowserCredential') as mock_credential:
+            path = os.path.join(directory, 'record.json')
+            mock_credential.return_value.authenticate.return_value = record
+            build_credential('tenant', 'client', record_path=path)
+            self.assertNotIn('authentication_record', mock_credential.call_args.kwargs)
+
+            mock_credential.reset_mock()
+            build_credential('tenant', 'client', record_path=path)
+            self.assertEqual(mock_credential.call_args.kwargs['authentication_record'].username, 'user@contoso.example')
+            self.assertFalse(mock_credential.return_value.authenticate.called)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+def make_server(resources, page_size=100, throttle_once=()):
+    from src.pyCaOptics_mockgraph import MockGraphServer
+
+    class ThrottlingServer(MockGraphServer):
+        """
+        Answers the first batched request for each URL in throttle_once with a 429.
+        """
+        throttled = set()
+
+        def _batch_item(self, request):
+            if request['url'] in throttle_once and request['url'] not in self.throttled:
+                self.throttled.add(request['url'])
+                return {'id': request['id'], 'status': 429, 'headers': {'Retry-After': '0'},
+                        'body': {'error': {'code': 'TooManyRequests'}}}
+            return super()._batch_item(request)
+
+    return ThrottlingServer(resources, page_size=page_size)
+
+class TestBatchClient(unittest.TestCase):
+    def test_packs_requests_into_batches_of_twenty(self):
+        from src.pyCaOptics_batch import BatchClient
+        resources = {f'groups/g{n}/members': [{'id': f'user-{n}'}] for n in range(45)}
+        with make_server(resources) as server:
+            client = BatchClient({}, base_url=server.base_url)
+            results = client.fetch({n: f'{server.base_url}/groups/g{n}/members?$select=id' for n in range(45)})
+            posts = [path for path in server.requests if path.endswith('$batch')]
+
+        self.assertEqual(results, {n: [{'id': f'user-{n}'}] for n in range(45)})
+        self.assertEqual(client.batches, 3)
+        self.assertEqual(len(posts), 3)
+
+    def test_follows_next_links_and_retries_throttled_items(self):
+        from src.pyCaOptics_batch import BatchClient
+        from src.pyCaOptics_scheduler import RequestScheduler
+        members = [{'id': f'user-{n}'} for n in range(5)]
+        resources = {'groups/g1/members': members, 'groups/g2/members': members[:1]}
+        sleeps = []
+        with make_server(resources, page_size=2, throttle_once={'/groups/g2/members'}) as server:
+            scheduler = RequestScheduler(sleep=sleeps.append)
+            client = BatchClient({}, scheduler=scheduler, base_url=server.base_url)
+            results = client.fetch(['/groups/g1/members', '/groups/g2/members'])
+
+        self.assertEqual([member['id'] for member in results['/groups/g1/members']], [f'user-{n}' for n in range(5)])
+        self.assertEqual(results['/groups/g2/members'], members[:1])
+        self.assertEqual(client.batches, 3)
+        self.assertEqual(len(sleeps), 1)
+        self.assertEqual(scheduler.stats()['throttled'], 1)
+
+    def test_failed_items_are_reported_separately(self):
+        from src.pyCaOptics_batch import BatchClient
+        with make_server({'users': [{'id': 'user-1'}]}) as server:
+            client = BatchClient({}, base_url=server.base_url)
+            results = client.fetch(['/users', '/groups/missing/members'])
+
+        self.assertEqual(results, {'/users': [{'id': 'user-1'}]})
+        self.assertEqual(client.errors['/groups/missing/members']['status'], 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+POLICY = {
+    'id': 'policy-1',
+    'displayName': 'Require MFA',
+    'state': 'enabled',
+    'conditions': {
+        'users': {'includeUsers': ['All'], 'excludeUsers': ['User1'], 'includeGroups': [], 'excludeGroups': ['Group9']},
+        'applications': {'includeApplications': ['App1', 'App2'], 'excludeApplications': []},
+        'platforms': None,
+        'locations': {'includeLocations': ['All'], 'excludeLocations': ['Trusted1']},
+        'clientAppTypes': ['all'],
+        'userRiskLevels': [],
+        'signInRiskLevels': ['high']
+    },
+    'grantControls': {'operator': 'OR', 'builtInControls': ['mfa']},
+    'sessionControls': None
+}
+
+class TestCompiledPolicy(unittest.TestCase):
+    def test_sentinels_are_resolved(self):
+        from src.pyCaOptics_policy import compile_policy
+        compiled = compile_policy(POLICY)
+        self.assertTrue(compiled.users.include_all)
+        self.assertEqual(compiled.users.exclude, frozenset(['User1']))
+        self.assertTrue(compiled.platforms.include_all)
+        self.assertFalse(compiled.platforms.configured)
+        self.assertTrue(compiled.client_app_types.include_all)
+        self.assertFalse(compiled.user_risk_levels.configured)
+        self.assertTrue(compiled.sign_in_risk_levels.configured)
+        self.assertEqual(compiled.built_in_controls, frozenset(['mfa']))
+        self.assertFalse(hasattr(compiled, '__dict__'))
+
+    def test_covers(self):
+        from src.pyCaOptics_policy import compile_policy
+        compiled = compile_policy(POLICY)
+        self.assertTrue(compiled.covers('User2', 'Group1', 'App1', 'iOS', 'Office', 'browser'))
+        self.assertFalse(compiled.covers('User1', 'Group1', 'App1', 'iOS', 'Office', 'browser'))
+        self.assertFalse(compiled.covers('User2', 'Group9', 'App1', 'iOS', 'Office', 'browser'))
+        self.assertFalse(compiled.covers('User2', 'Group1', 'App3', 'iOS', 'Office', 'browser'))
+        self.assertFalse(compiled.covers('User2', 'Group1', 'App1', 'iOS', 'Trusted1', 'browser'))
+
+    def test_compile_policy_is_idempotent(self):
+        from src.pyCaOptics_policy import compile_policy
+        compiled = compile_policy(POLICY)
+        self.assertIs(compile_policy(compiled), compiled)
+
+    def test_analysis_uses_compiled_policy(self):
+        from src.pyCaOptics_app import analysis
+        results = analysis([POLICY], [{'id': 'User1'}, {'id': 'User2'}], [], [{'appId': 'App1'}])
+        gaps = results[0]['Gaps Identified']
+        self.assertEqual(results[0]['Policy Name'], 'Require MFA')
+        self.assertIn("No platforms specified.", gaps)
+        self.assertIn("Policy includes all users but has exclusions.", gaps)
+        self.assertNotIn("Policy does not consider user or sign-in risk levels.", gaps)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import random
+import unittest
+
+def make_policy(name, users=('All',), apps=('All',), exclude_users=(), controls=('mfa',), session=None, state='enabled'):
+    return {
+        'id': name,
+        'displayName': name,
+        'state': state,
+        'conditions': {
+            'users': {'includeUsers': list(users), 'excludeUsers': list(exclude_users), 'includeGroups': [], 'excludeGroups': []},
+            'applications': {'includeApplications': list(apps), 'excludeApplications': []},
+            'platforms': None,
+            'locations': None,
+            'clientAppTypes': []
+        },
+        'grantControls': {'operator': 'OR', 'builtInControls': list(controls)},
+        'sessionControls': session
+    }
+
+class TestConflicts(unittest.TestCase):
+    def test_block_and_grant_on_overlapping_scope_conflict(self):
+        from src.pyCaOptics_conflicts import find_conflicts
+        policies = [
+            make_policy('Block legacy', apps=['App1'], controls=['block']),
+            make_policy('Require MFA', users=['User1'], controls=['mfa']),
+            make_policy('Other app', apps=['App2'], controls=['compliantDevice'])
+        ]
+
+        rows = find_conflicts(policies)
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['policy'], rows[0]['conflicting_policy']), ('Block legacy', 'Require MFA'))
+        self.assertIn('grants with mfa', rows[0]['issue'])
+
+    def test_exclusions_remove_the_overlap(self):
+        from src.pyCaOptics_conflicts import find_conflicts
+        policies = [
+            make_policy('Block all', exclude_users=['User1'], controls=['block']),
+            make_policy('MFA for User1', users=['User1'], controls=['mfa']),
+            make_policy('Disabled MFA', controls=['mfa'], state='disabled')
+        ]
+        self.assertEqual(find_conflicts(policies), [])
+
+    def test_session_control_conflict(self):
+        from src.pyCaOptics_conflicts import find_conflicts
+        policies = [
+            make_policy('Always persist', session={'persistentBrowser': {'mode': 'always', 'isEnabled': True}}),
+            make_policy('Never persist', session={'persistentBrowser': {'mode': 'never', 'isEnabled': True}}),
+            make_policy('Persist off', session={'persistentBrowser': {'mode': 'always', 'isEnabled': False}})
+        ]
+
+        rows = find_conflicts(policies)
+
+        self.assertEqual([(row['policy'], row['conflicting_policy']) for row in rows], [('Always persist', 'Never persist')])
+
+    def test_index_matches_pairwise_comparison(self):
+        from src.pyCaOptics_conflicts import ConflictIndex, control_conflicts, regions_overlap
+        from src.pyCaOptics_regions import policy_regions
+        rng = random.Random(7)
+        users = [f'User{i}' for i in range(20)] + ['All']
+        apps = [f'App{i}' for i in range(10)] + ['All']
+        policies = [
+            make_policy(f'Policy{i}', users=rng.sample(users, 3), apps=rng.sample(apps, 2),
+                        exclude_users=rng.sample(users[:-1], 2), controls=[rng.choice(['block', 'mfa', 'compliantDevice'])])
+            for i in range(60)
+        ]
+        index = ConflictIndex(policies)
+
+        expected = set()
+        for i, policy in enumerate(index.policies):
+            for j in range(i + 1, len(index.policies)):
+                other = index.policies[j]
+                if control_conflicts(policy, other) and any(
+                        regions_overlap(a, b) for a in policy_regions(policy) for b in policy_regions(other)):
+                    expected.add((i, j))
+
+        self.assertTrue(expected)
+        self.assertEqual({(i, j) for i, j, reasons in index.pairs()}, expected)
+
+    def test_iter_findings_reports_conflicts_per_permutation(self):
+        from src.pyCaOptics_app_iter import analyze_permutations, is_conflicting_policy
+        policies = [
+            make_policy('Block', users=['User1', 'User2'], apps=['App1'], controls=['block']),
+            make_policy('MFA', users=['User2'], apps=['App1'], controls=['mfa'])
+        ]
+        for policy in policies:
+            policy['conditions']['users']['includeGroups'] = ['Group1']
+            policy['conditions']['platforms'] = {'includePlatforms': ['android'], 'excludePlatforms': []}
+            policy['conditions']['locations'] = {'includeLocations': ['All'], 'excludeLocations': []}
+            policy['conditions']['clientAppTypes'] = ['browser']
+
+        self.assertTrue(is_conflicting_policy(policies[0], 'User2', 'Other', 'App1', 'android', 'All', 'browser', [policies[1]]))
+        self.assertFalse(is_conflicting_policy(policies[0], 'User2', 'Other', 'App1', 'android', 'All', 'browser'))
+
+        gaps, conflicts = analyze_permutations(policies)
+        self.assertEqual(sorted(conflict['policy'] for conflict in conflicts), ['Block', 'Block', 'MFA', 'MFA'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+
+POLICIES = [
+    {
+        'id': 'all-users',
+        'state': 'enabled',
+        'conditions': {
+            'users': {'includeUsers': ['All'], 'excludeUsers': ['User1'], 'excludeGroups': ['Group2']},
+            'applications': {'includeApplications': ['App1']}
+        }
+    },
+    {
+        'id': 'group-scoped',
+        'state': 'enabled',
+        'conditions': {
+            'users': {'includeGroups': ['Group1']},
+            'applications': {'includeApplications': ['All'], 'excludeApplications': ['App3']}
+        }
+    },
+    {
+        'id': 'disabled',
+        'state': 'disabled',
+        'conditions': {
+            'users': {'includeUsers': ['All']},
+            'applications': {'includeApplications': ['All']}
+        }
+    }
+]
+USERS = ['User1', 'User2', 'User3', 'User4']
+GROUPS = ['Group1', 'Group2']
+APPLICATIONS = ['App1', 'App2', 'App3']
+MEMBERS = {'Group1': ['User1', 'User2'], 'Group2': ['User4']}
+
+class TestCoverageEngine(unittest.TestCase):
+    def setUp(self):
+        from src.pyCaOptics_coverage import CoverageEngine
+        self.engine = CoverageEngine(POLICIES, USERS, GROUPS, APPLICATIONS, group_members=MEMBERS)
+
+    def test_policies_for(self):
+        self.assertEqual([p.id for p in self.engine.policies_for('User2', 'App1')], ['all-users', 'group-scoped'])
+        self.assertEqual([p.id for p in self.engine.policies_for('User1', 'App1')], ['group-scoped'])
+        self.assertEqual([p.id for p in self.engine.policies_for('User3', 'App2')], [])
+
+    def test_uncovered_entities(self):
+        self.assertEqual(self.engine.uncovered_users(), ['User4'])
+        self.assertEqual(self.engine.uncovered_applications(), ['App3'])
+
+    def test_coverage_matrix(self):
+        expected = np.array([
+            [True, True, False],
+            [True, True, False],
+            [True, False, False],
+            [False, False, False]
+        ])
+        np.testing.assert_array_equal(self.engine.coverage_matrix(packed=False), expected)
+        np.testing.assert_array_equal(self.engine.coverage_matrix(), np.packbits(expected, axis=1))
+        self.assertFalse(self.engine.is_covered('User3', 'App2'))
+        self.assertTrue(self.engine.is_covered('User3', 'App1'))
+
+    def test_from_data_resolves_nested_groups(self):
+        from src.pyCaOptics_coverage import CoverageEngine
+        memberships = [
+            {'id': 'Group1', 'members': [{'@odata.type': '#microsoft.graph.group', 'id': 'Group3'}]},
+            {'id': 'Group3', 'members': [{'@odata.type': '#microsoft.graph.user', 'id': 'User3'}]}
+        ]
+        data = {'policies': POLICIES, 'users': [{'id': user_id} for user_id in USERS],
+                'groups': [{'id': group_id} for group_id in GROUPS + ['Group3']],
+                'applications': [{'appId': app_id} for app_id in APPLICATIONS], 'memberships': memberships}
+        engine = CoverageEngine.from_data(data)
+        self.assertEqual([p.id for p in engine.policies_for('User3', 'App2')], ['group-scoped'])
+        self.assertTrue(engine.is_covered('User3', 'App2'))
+
+if __name__ == '__main__':
+    unittest.main()
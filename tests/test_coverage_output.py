@@ -0,0 +1,38 @@
+import types
+import unittest
+
+POLICIES = [{
+    'displayName': 'Test Policy',
+    'state': 'enabled',
+    'conditions': {
+        'users': {'includeUsers': ['All'], 'excludeUsers': ['User1'], 'excludeGroups': ['Group1']},
+        'applications': {'includeApplications': ['All'], 'excludeApplications': ['App1']}
+    }
+}]
+USERS = [{'id': 'User1'}, {'id': 'User2'}, {'id': 'User3'}]
+GROUPS = [{'id': 'Group1'}, {'id': 'Group2'}]
+APPLICATIONS = [{'appId': 'App1'}, {'appId': 'App2'}]
+
+class TestLongCoverageOutput(unittest.TestCase):
+    def test_one_row_per_uncovered_entity(self):
+        from src.pyCaOptics_app import iter_coverage_rows
+        rows = iter_coverage_rows(POLICIES, USERS, GROUPS, APPLICATIONS)
+        self.assertIsInstance(rows, types.GeneratorType)
+        self.assertEqual([(row['Entity Type'], row['Entity Id']) for row in rows], [
+            ('user', 'User2'), ('user', 'User3'), ('group', 'Group2'), ('application', 'App2')
+        ])
+
+    def test_reason_is_optional(self):
+        from src.pyCaOptics_app import iter_coverage_rows
+        rows = list(iter_coverage_rows(POLICIES, USERS, GROUPS, APPLICATIONS, include_reason=False))
+        self.assertEqual(rows[0], {'Entity Type': 'user', 'Entity Id': 'User2'})
+
+    def test_summary_rows_can_be_left_out(self):
+        from src.pyCaOptics_app import iter_analysis
+        rows = list(iter_analysis(POLICIES, USERS, GROUPS, APPLICATIONS, coverage_summary=False))
+        self.assertEqual([row['Policy Name'] for row in rows], ['Test Policy'])
+        rows = list(iter_analysis(POLICIES, USERS, GROUPS, APPLICATIONS))
+        self.assertEqual([row['Policy Name'] for row in rows].count('Coverage Check'), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import uuid
+
+def guids(count, seed=0):
+    return [str(uuid.UUID(int=(seed << 64) + n + 1)) for n in range(count)]
+
+class TestDirectoryTable(unittest.TestCase):
+    def test_ingest_grows_and_deduplicates(self):
+        from src.pyCaOptics_directory import DirectoryTable
+        ids = guids(3000)
+        table = DirectoryTable(capacity=16)
+        table.ingest([{'id': guid, 'displayName': 'dropped'} for guid in ids])
+        table.ingest([{'id': ids[0]}])
+
+        self.assertEqual(len(table), 3000)
+        self.assertIn(ids[1234].upper(), table)
+        self.assertNotIn('not-a-guid', table)
+        self.assertEqual(list(table.iter_ids()), ids)
+        self.assertEqual(next(iter(table)), {'id': ids[0]})
+
+    def test_malformed_ids_are_skipped(self):
+        from src.pyCaOptics_directory import DirectoryTable
+        ids = guids(3)
+        table = DirectoryTable(['id', 'appId'])
+        stored = table.ingest([{'id': ids[0], 'appId': ids[1]}, {'id': 'not-a-guid'}, {'id': ids[2], 'appId': 'bad'}])
+
+        self.assertEqual(stored, 1)
+        self.assertEqual(table.skipped, 2)
+        self.assertEqual(list(table), [{'id': ids[0], 'appId': ids[1]}])
+
+    def test_ids_except_compares_guid_columns(self):
+        from src.pyCaOptics_directory import DirectoryTable
+        ids, app_ids = guids(5), guids(5, seed=1)
+        table = DirectoryTable(['id', 'appId'], text_fields=['displayName'])
+        table.ingest([{'id': guid, 'appId': app_id, 'displayName': f'App {n}'}
+                      for n, (guid, app_id) in enumerate(zip(ids, app_ids))])
+        table.add({'id': guids(1, seed=2)[0]})
+
+        self.assertEqual(table.ids_except([app_ids[0], app_ids[3], 'All'], 'appId'), {app_ids[1], app_ids[2], app_ids[4]})
+        self.assertEqual(len(table.ids_except(ids[:2])), 4)
+        self.assertEqual(list(table)[1], {'id': ids[1], 'appId': app_ids[1], 'displayName': 'App 1'})
+
+    def test_analysis_matches_graph_dicts(self):
+        from src.pyCaOptics_app import iter_analysis, iter_coverage_rows
+        from src.pyCaOptics_directory import directory_tables
+        users, groups, apps = guids(50), guids(10, seed=1), guids(5, seed=2)
+        data = {
+            'users': [{'id': guid, 'userPrincipalName': 'x'} for guid in users],
+            'groups': [{'id': guid} for guid in groups],
+            'applications': [{'id': guid, 'appId': guid} for guid in apps]
+        }
+        policies = [{
+            'displayName': 'Policy', 'state': 'enabled',
+            'conditions': {'users': {'includeUsers': ['All'], 'excludeUsers': users[:10], 'excludeGroups': groups[:3]},
+                           'applications': {'includeApplications': ['All'], 'excludeApplications': apps[:1]}}
+        }]
+        tables = directory_tables()
+        for name, table in tables.items():
+            table.ingest(data[name])
+
+        def coverage(entities):
+            rows = list(iter_analysis(policies, *entities))
+            for row in rows:
+                row['Gaps Identified'] = [sorted(gap.split("{")[1].strip("}").split(', ')) if '{' in gap else gap
+                                          for gap in row['Gaps Identified']]
+            return rows
+
+        entities = (data['users'], data['groups'], data['applications'])
+        table_entities = (tables['users'], tables['groups'], tables['applications'])
+        self.assertEqual(coverage(table_entities), coverage(entities))
+        self.assertEqual(list(iter_coverage_rows(policies, *table_entities)), list(iter_coverage_rows(policies, *entities)))
+
+    def test_exclusions_match_guids_in_any_case(self):
+        from src.pyCaOptics_app import iter_coverage_rows
+        from src.pyCaOptics_directory import directory_tables
+        users = guids(3)
+        policies = [{'displayName': 'Policy', 'state': 'enabled',
+                     'conditions': {'users': {'includeUsers': ['All'], 'excludeUsers': [users[0].upper()]}}}]
+        tables = directory_tables()
+        tables['users'].ingest([{'id': guid} for guid in users])
+
+        for entities in (tables['users'], [{'id': guid} for guid in users]):
+            self.assertEqual([row['Entity Id'] for row in iter_coverage_rows(policies, entities, [], [])], users[1:])
+
+class TestFetchIntoTables(unittest.TestCase):
+    def test_fetch_data_ingests_pages(self):
+        from src.pyCaOptics_directory import directory_tables
+        from src.pyCaOptics_fetch import build_endpoints, fetch_data
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        users = [{'id': guid, 'displayName': 'User'} for guid in guids(25)]
+        resources = {'users': users, 'groups': [], 'applications': [], 'identity/conditionalAccess/policies': [],
+                     'identity/conditionalAccess/namedLocations': []}
+        with MockGraphServer(resources, page_size=10) as server:
+            data = fetch_data({}, build_endpoints(base_url=server.base_url), tables=directory_tables())
+
+        self.assertEqual(len(data['users']), 25)
+        self.assertEqual(list(data['users'].iter_ids()), [user['id'] for user in users])
+        self.assertEqual(data['policies'], [])
+
+if __name__ == '__main__':
+    unittest.main()
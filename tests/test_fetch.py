@@ -0,0 +1,88 @@
+import contextlib
+import io
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+import requests
+
+class SlowSession:
+    """Serves one page per URL after a fixed delay, recording the peak number of requests in flight."""
+    def __init__(self, pages, delay):
+        self.pages = pages
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return Mock(status_code=200, json=lambda: self.pages[url])
+
+class TestConcurrentFetch(unittest.TestCase):
+    def test_fetch_data_runs_endpoints_concurrently(self):
+        from src.pyCaOptics_fetch import fetch_data
+        pages = {
+            'https://graph/policies': {'value': [{'id': 'p1'}]},
+            'https://graph/users': {'value': [{'id': 'u1'}], '@odata.nextLink': 'https://graph/users?page=2'},
+            'https://graph/users?page=2': {'value': [{'id': 'u2'}]},
+            'https://graph/groups': {'value': []},
+            'https://graph/applications': {'value': [{'appId': 'a1'}]}
+        }
+        endpoints = {name: f'https://graph/{name}' for name in ['policies', 'users', 'groups', 'applications']}
+        session = SlowSession(pages, delay=0.1)
+
+        start = time.perf_counter()
+        data = fetch_data({}, endpoints, max_workers=4, session=session)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual([user['id'] for user in data['users']], ['u1', 'u2'])
+        self.assertEqual(data['applications'], [{'appId': 'a1'}])
+        self.assertGreater(session.peak, 1)
+        self.assertLess(elapsed, 0.45)
+
+    def test_fetch_data_respects_max_workers(self):
+        from src.pyCaOptics_fetch import fetch_data
+        pages = {f'https://graph/{n}': {'value': []} for n in range(6)}
+        session = SlowSession(pages, delay=0.02)
+        fetch_data({}, {str(n): f'https://graph/{n}' for n in range(6)}, max_workers=2, session=session)
+        self.assertLessEqual(session.peak, 2)
+
+    def test_fetch_data_reports_a_failed_endpoint_once(self):
+        from src.pyCaOptics_fetch import fetch_data
+        denied = Mock(status_code=403, headers={}, content=b'Forbidden')
+        denied.raise_for_status.side_effect = requests.exceptions.HTTPError('403 Forbidden', response=denied)
+        session = Mock()
+        session.get.side_effect = lambda url, headers=None: (
+            denied if url == 'https://graph/users' else Mock(status_code=200, json=lambda: {'value': []}))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), self.assertRaises(SystemExit):
+            fetch_data({}, {'policies': 'https://graph/policies', 'users': 'https://graph/users'}, session=session)
+        self.assertEqual(output.getvalue().count('Error fetching data from https://graph/users'), 1)
+
+    def test_create_session_pool_size(self):
+        from src.pyCaOptics_fetch import create_session
+        session = create_session(max_workers=8)
+        self.assertEqual(session.get_adapter('https://graph.microsoft.com')._pool_maxsize, 8)
+
+class TestEndpointProfiles(unittest.TestCase):
+    def test_default_profiles_project_fields(self):
+        from src.pyCaOptics_fetch import build_endpoints
+        endpoints = build_endpoints()
+        self.assertEqual(endpoints['policies'], 'https://graph.microsoft.com/v1.0/identity/conditionalAccess/policies')
+        self.assertEqual(endpoints['users'], 'https://graph.microsoft.com/v1.0/users?$select=id&$top=999')
+        self.assertEqual(endpoints['applications'], 'https://graph.microsoft.com/v1.0/applications?$select=id,appId&$top=999')
+
+    def test_extra_select(self):
+        from src.pyCaOptics_fetch import build_endpoints
+        endpoints = build_endpoints(extra_select={'users': ['displayName', 'id']}, base_url='http://localhost:8080/v1.0')
+        self.assertEqual(endpoints['users'], 'http://localhost:8080/v1.0/users?$select=id,displayName&$top=999')
+
+if __name__ == '__main__':
+    unittest.main()
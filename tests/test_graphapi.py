@@ -37,8 +37,10 @@ class TestDataRetrieval(unittest.TestCase):
     def test_api_error(self, mock_get):
         mock_get.return_value.status_code = 403
         mock_get.return_value.json.return_value = {}
+        mock_get.return_value.raise_for_status.side_effect = requests.exceptions.HTTPError('403 Forbidden')
         from src.pyCaOptics_app import fetch_paginated_data
-        with self.assertRaises(SystemExit):
+        # The paginator raises and leaves reporting the error to fetch_data, which exits once
+        with self.assertRaises(requests.exceptions.RequestException):
             fetch_paginated_data('https://graph.microsoft.com/v1.0/identity/conditionalAccess/policies', headers={})
 
 if __name__ == '__main__':
@@ -0,0 +1,89 @@
+import unittest
+
+USER = '#microsoft.graph.user'
+GROUP = '#microsoft.graph.group'
+
+def members(*ids):
+    return [{'id': member_id, '@odata.type': GROUP if member_id.startswith('g') else USER} for member_id in ids]
+
+class TestGroupResolver(unittest.TestCase):
+    def make_resolver(self):
+        from src.pyCaOptics_groups import GroupResolver
+        return GroupResolver.from_memberships([
+            {'id': 'g1', 'members': members('u1', 'g2')},
+            {'id': 'g2', 'members': members('u2', 'g3', 'g4')},
+            {'id': 'g3', 'members': members('u3', 'g2')},
+            {'id': 'g4', 'members': members('u4') + [{'id': 'd1', '@odata.type': '#microsoft.graph.device'}]},
+            {'id': 'g5', 'members': members('u5', 'g5')}
+        ])
+
+    def test_transitive_members(self):
+        resolver = self.make_resolver()
+        self.assertEqual(resolver.members('g1'), {'u1', 'u2', 'u3', 'u4'})
+        self.assertEqual(resolver.members('g4'), {'u4'})
+        self.assertEqual(resolver.subgroups('g1'), {'g2', 'g3', 'g4'})
+        self.assertEqual(resolver.members('unknown'), frozenset())
+
+    def test_cycles_share_one_closure(self):
+        resolver = self.make_resolver()
+        self.assertEqual(resolver.members('g2'), {'u2', 'u3', 'u4'})
+        self.assertIs(resolver.members('g2'), resolver.members('g3'))
+        self.assertEqual(resolver.subgroups('g3'), {'g2', 'g4'})
+        self.assertEqual(resolver.members('g5'), {'u5'})
+        self.assertEqual(sorted(resolver.cycles), [['g2', 'g3'], ['g5']])
+
+    def test_deep_nesting_does_not_recurse(self):
+        from src.pyCaOptics_groups import GroupResolver
+        depth = 5000
+        resolver = GroupResolver({f'g{n}': {f'u{n}'} for n in range(depth)},
+                                 {f'g{n}': {f'g{n + 1}'} for n in range(depth - 1)})
+        self.assertEqual(len(resolver.members('g0')), depth)
+
+    def test_excluded_nested_groups_count_towards_coverage(self):
+        from src.pyCaOptics_app import iter_coverage_rows
+        policies = [{
+            'displayName': 'Policy', 'state': 'enabled',
+            'conditions': {'users': {'includeUsers': ['All'], 'excludeGroups': ['g1']}, 'applications': {}}
+        }]
+        users = [{'id': f'u{n}'} for n in range(1, 6)]
+        groups = [{'id': f'g{n}'} for n in range(1, 6)]
+
+        without = {row['Entity Id'] for row in iter_coverage_rows(policies, users, groups, [])}
+        with_groups = {row['Entity Id'] for row in iter_coverage_rows(policies, users, groups, [], resolver=self.make_resolver())}
+
+        self.assertEqual(without, {'u1', 'u2', 'u3', 'u4', 'u5', 'g2', 'g3', 'g4', 'g5'})
+        self.assertEqual(with_groups, {'u5', 'g5'})
+
+    def test_included_groups_do_not_change_coverage(self):
+        from src.pyCaOptics_app import COVERAGE_REASON, iter_coverage_rows
+        policies = [{
+            'displayName': 'Policy', 'state': 'enabled',
+            'conditions': {'users': {'includeUsers': ['u1'], 'includeGroups': ['g2']}, 'applications': {}}
+        }]
+        users = [{'id': f'u{n}'} for n in range(1, 6)]
+        groups = [{'id': f'g{n}'} for n in range(1, 6)]
+
+        # The check is exclusion-only, so resolving the included groups must not change what it reports
+        without = list(iter_coverage_rows(policies, users, groups, []))
+        with_groups = list(iter_coverage_rows(policies, users, groups, [], resolver=self.make_resolver()))
+        self.assertEqual(without, with_groups)
+        self.assertEqual({row['Entity Id'] for row in with_groups}, {'u1', 'u2', 'u3', 'u4', 'u5', 'g1', 'g2', 'g3', 'g4', 'g5'})
+        self.assertEqual({row['Reason'] for row in with_groups}, {COVERAGE_REASON})
+
+class TestFetchGroupMembers(unittest.TestCase):
+    def test_fetches_nested_groups_level_by_level(self):
+        from src.pyCaOptics_groups import fetch_group_members
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        resources = {
+            'groups/g1/members': members('u1', 'g2'),
+            'groups/g2/members': members('u2', 'g1'),
+            'groups/g9/members': members('u9')
+        }
+        with MockGraphServer(resources, page_size=1) as server:
+            memberships = fetch_group_members({}, ['g1'], base_url=server.base_url)
+
+        self.assertEqual({record['id']: [member['id'] for member in record['members']] for record in memberships},
+                         {'g1': ['u1', 'g2'], 'g2': ['u2', 'g1']})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+import copy
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+POLICIES = [
+    {'id': 'p1', 'displayName': 'MFA for all', 'state': 'enabled', 'conditions': {
+        'users': {'includeUsers': ['All'], 'excludeUsers': ['BreakGlass'], 'includeGroups': ['Group1']},
+        'applications': {'includeApplications': ['All'], 'excludeApplications': ['App1']},
+        'platforms': {'includePlatforms': ['all']},
+        'locations': {'includeLocations': ['All'], 'excludeLocations': ['AllTrusted']},
+        'clientAppTypes': ['all']
+    }, 'grantControls': {'operator': 'OR', 'builtInControls': ['mfa']}},
+    {'id': 'p2', 'displayName': 'Block legacy', 'state': 'enabled', 'conditions': {
+        'users': {'includeUsers': ['All'], 'includeGroups': ['Group1', 'Group2']},
+        'applications': {'includeApplications': ['App1', 'App2']},
+        'platforms': {'includePlatforms': ['android', 'windows']},
+        'locations': {'includeLocations': ['All']},
+        'clientAppTypes': ['exchangeActiveSync', 'other']
+    }, 'grantControls': {'operator': 'OR', 'builtInControls': ['block']}},
+    {'id': 'p3', 'displayName': 'Compliant devices', 'state': 'enabledForReportingButNotEnforced', 'conditions': {
+        'users': {'includeUsers': ['User1', 'User2'], 'excludeGroups': ['Group2']},
+        'applications': {'includeApplications': ['App2']},
+        'platforms': {'includePlatforms': ['android', 'iOS']},
+        'locations': {'includeLocations': ['Office']},
+        'clientAppTypes': ['browser']
+    }, 'grantControls': {'operator': 'OR', 'builtInControls': ['compliantDevice']}}
+]
+USERS = [{'id': 'User1'}, {'id': 'User2'}, {'id': 'BreakGlass'}]
+APPLICATIONS = [{'appId': 'App1'}, {'appId': 'App2'}]
+
+def gap_set(findings):
+    return {(finding['policy'], tuple(finding['permutation'])) for kind, finding in findings if kind == 'gap'}
+
+class TestResultCache(unittest.TestCase):
+    def test_content_hash_ignores_key_order(self):
+        from src.pyCaOptics_incremental import content_hash
+        self.assertEqual(content_hash({'a': 1, 'b': [1, 2]}), content_hash({'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(content_hash({'a': 1}), content_hash({'a': 2}))
+
+    def test_save_keeps_only_used_entries(self):
+        from src.pyCaOptics_incremental import ResultCache
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json.gz')
+            cache = ResultCache(path)
+            cache.put('old', 1)
+            cache.put('kept', 2)
+            cache.run = {'gaps': {}}
+            cache.save()
+
+            cache = ResultCache(path)
+            self.assertEqual(cache.get('kept'), 2)
+            self.assertEqual(cache.get('missing'), None)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            self.assertEqual(cache.previous, {'gaps': {}})
+            cache.save()
+            self.assertEqual(ResultCache(path).stored('old'), None)
+
+class TestIncrementalAnalysis(unittest.TestCase):
+    def run_analysis(self, policies, path, users=USERS):
+        from src.pyCaOptics_app import iter_analysis
+        from src.pyCaOptics_incremental import ResultCache, iter_gap_diff
+        cache = ResultCache(path)
+        rows = list(iter_analysis(policies, users, [], APPLICATIONS, cache=cache))
+        diff = list(iter_gap_diff(cache.previous, cache.run)) if cache.previous else None
+        cache.save()
+        return rows, diff, cache
+
+    def test_unchanged_policies_are_reused(self):
+        from src.pyCaOptics_app import iter_analysis
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'analysis.json.gz')
+            first, diff, cache = self.run_analysis(POLICIES, path)
+            self.assertEqual(first, list(iter_analysis(POLICIES, USERS, [], APPLICATIONS)))
+            self.assertIsNone(diff)
+            self.assertEqual(cache.hits, 0)
+
+            changed = copy.deepcopy(POLICIES)
+            changed[2]['state'] = 'enabled'
+            second, diff, cache = self.run_analysis(changed, path)
+            self.assertEqual(second, list(iter_analysis(changed, USERS, [], APPLICATIONS)))
+            # Two unchanged policies and the coverage check, whose exclusions did not change
+            self.assertEqual((cache.hits, cache.misses), (3, 1))
+            self.assertEqual(diff, [{'Change': 'removed', 'Policy Name': 'Compliant devices',
+                                     'Gap': 'Policy is not enabled.'}])
+
+    def test_policies_sharing_a_display_name_are_diffed_apart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'analysis.json.gz')
+            duplicates = copy.deepcopy(POLICIES[:2])
+            for policy in duplicates:
+                policy['displayName'] = 'Duplicate'
+            self.run_analysis(duplicates, path)
+
+            duplicates[0]['state'] = 'disabled'
+            _, diff, _ = self.run_analysis(duplicates, path)
+            self.assertEqual(diff, [{'Change': 'added', 'Policy Name': 'Duplicate', 'Gap': 'Policy is not enabled.'}])
+
+    def test_results_of_older_rules_are_not_reused(self):
+        from src.pyCaOptics_app import iter_analysis
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'analysis.json.gz')
+            self.run_analysis(POLICIES, path)
+            with patch.object(sys.modules[iter_analysis.__module__], 'RESULTS_VERSION', 2):
+                _, _, cache = self.run_analysis(POLICIES, path)
+            self.assertEqual((cache.hits, cache.misses), (0, 4))
+
+    def test_coverage_diff_follows_the_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'analysis.json.gz')
+            self.run_analysis(POLICIES, path)
+            _, diff, cache = self.run_analysis(POLICIES, path, USERS[1:] + [{'id': 'User3'}])
+
+            self.assertEqual(cache.misses, 1)
+            self.assertEqual(diff, [
+                {'Change': 'added', 'Policy Name': 'Coverage Check', 'Gap': 'Uncovered users: User3'},
+                {'Change': 'removed', 'Policy Name': 'Coverage Check', 'Gap': 'Uncovered users: User1'}
+            ])
+
+class TestIncrementalPermutations(unittest.TestCase):
+    def run_findings(self, policies, path):
+        from src.pyCaOptics_app_iter import iter_cached_findings
+        from src.pyCaOptics_incremental import ResultCache
+        cache = ResultCache(path)
+        findings = list(iter_cached_findings(policies, cache))
+        cache.save()
+        return [item for item in findings if item[0] != 'diff'], [item[1] for item in findings if item[0] == 'diff'], cache
+
+    def assert_matches_full_run(self, previous_policies, policies, path):
+        from src.pyCaOptics_app_iter import iter_findings
+        findings, diff, cache = self.run_findings(policies, path)
+        self.assertEqual(findings, list(iter_findings(policies)))
+
+        before, after = gap_set(iter_findings(previous_policies)), gap_set(iter_findings(policies))
+        self.assertEqual({(row['policy'], tuple(row['permutation'])) for row in diff if row['change'] == 'added'},
+                         after - before)
+        self.assertEqual({(row['policy'], tuple(row['permutation'])) for row in diff if row['change'] == 'removed'},
+                         before - after)
+        return cache
+
+    def test_findings_and_diff_match_full_runs(self):
+        from src.pyCaOptics_app_iter import iter_findings
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'permutations.json.gz')
+            findings, diff, cache = self.run_findings(POLICIES, path)
+            self.assertEqual(findings, list(iter_findings(POLICIES)))
+            self.assertEqual((diff, cache.hits), ([], 0))
+
+            # Unchanged policies: every block is reused
+            cache = self.assert_matches_full_run(POLICIES, POLICIES, path)
+            self.assertEqual(cache.misses, 0)
+
+            # A control change keeps every block but re-checks the changed policy and its conflict partners
+            controls = copy.deepcopy(POLICIES)
+            controls[1]['grantControls']['builtInControls'] = ['mfa']
+            cache = self.assert_matches_full_run(POLICIES, controls, path)
+            # At least the gaps of the two unchanged policies over all three blocks
+            self.assertGreaterEqual(cache.hits, 6)
+
+            # Bitmaps cached under older rules are checked again
+            with patch.object(sys.modules[iter_findings.__module__], 'RESULTS_VERSION', 2):
+                cache = self.assert_matches_full_run(controls, controls, path)
+            self.assertEqual(cache.hits, 0)
+
+            # A dimension change in the last policy only rebuilds its own block
+            dimensions = copy.deepcopy(controls)
+            dimensions[2]['conditions']['users']['excludeUsers'] = ['User2']
+            self.assert_matches_full_run(controls, dimensions, path)
+
+            # A dimension change in the first policy rebuilds every block; a removed policy drops its gaps
+            reordered = copy.deepcopy(dimensions[:2])
+            reordered[0]['conditions']['applications']['excludeApplications'] = []
+            self.assert_matches_full_run(dimensions, reordered, path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+LOCATIONS = [
+    {'id': 'office', 'displayName': 'Office', 'isTrusted': True,
+     'ipRanges': [{'cidrAddress': '10.0.0.0/8'}, {'cidrAddress': '2001:db8::/32'}]},
+    {'id': 'lab', 'displayName': 'Lab', 'isTrusted': False,
+     'ipRanges': [{'cidrAddress': '10.1.0.0/16'}, {'cidrAddress': '10.1.2.0/24'}, {'cidrAddress': 'not-an-ip'}]},
+    {'id': 'vpn', 'displayName': 'VPN', 'isTrusted': True, 'ipRanges': [{'cidrAddress': '192.0.2.0/24'}]},
+    {'id': 'blocked', 'displayName': 'Blocked countries', 'countriesAndRegions': ['KP', 'IR']}
+]
+
+class TestLocationIndex(unittest.TestCase):
+    def test_lookup_ipv4_and_ipv6(self):
+        from src.pyCaOptics_locations import LocationIndex
+        index = LocationIndex(LOCATIONS)
+
+        self.assertEqual(index.lookup('10.9.9.9'), ('office',))
+        self.assertEqual(index.lookup('10.1.2.3'), ('lab', 'office'))
+        self.assertEqual(index.lookup('10.255.255.255'), ('office',))
+        self.assertEqual(index.lookup('11.0.0.0'), ())
+        self.assertEqual(index.lookup('9.255.255.255'), ())
+        self.assertEqual(index.lookup('2001:db8::1'), ('office',))
+        self.assertEqual(index.lookup('::ffff:192.0.2.7'), ('vpn',))
+        self.assertEqual(index.lookup('garbage'), ())
+        self.assertEqual(index.lookup(None), ())
+
+    def test_lookup_matches_linear_scan(self):
+        import ipaddress
+        import random
+        from src.pyCaOptics_locations import LocationIndex
+        rng = random.Random(5)
+        locations = [{'id': f'loc-{n}', 'ipRanges': [
+            {'cidrAddress': f'10.{rng.randrange(4)}.{rng.randrange(256)}.0/{rng.choice([16, 20, 24])}'}
+            for _ in range(5)]} for n in range(20)]
+        networks = [(location['id'], ipaddress.ip_network(ip_range['cidrAddress'], strict=False))
+                    for location in locations for ip_range in location['ipRanges']]
+        index = LocationIndex(locations)
+
+        for _ in range(500):
+            address = ipaddress.ip_address(f'10.{rng.randrange(5)}.{rng.randrange(256)}.{rng.randrange(256)}')
+            expected = tuple(sorted({location_id for location_id, network in networks if address in network}))
+            self.assertEqual(index.lookup(str(address)), expected)
+
+    def test_locate_adds_countries_and_trusted(self):
+        from src.pyCaOptics_locations import LocationIndex
+        index = LocationIndex(LOCATIONS)
+
+        self.assertEqual(index.locate('10.1.2.3'), ['lab', 'office', 'AllTrusted'])
+        self.assertEqual(index.locate('172.16.0.1', 'ir'), ['blocked'])
+        self.assertEqual(index.signin_locations({'ipAddress': '192.0.2.1', 'location': {'countryOrRegion': 'US'}}),
+                         ['vpn', 'AllTrusted'])
+
+    def test_overlap_report(self):
+        from src.pyCaOptics_locations import LocationIndex
+        index = LocationIndex(LOCATIONS + [{'id': 'copy', 'displayName': 'Copy', 'ipRanges': [{'cidrAddress': '192.0.2.0/24'}]}])
+        rows = {(row['location'], row['range'], row['other_location'], row['other_range']): row['issue']
+                for row in index.iter_overlap_rows()}
+
+        self.assertEqual(rows, {
+            ('Lab', 'not-an-ip', None, None): 'Invalid IP range',
+            ('Lab', '10.1.0.0/16', 'Office', '10.0.0.0/8'): 'Shadowed by a wider range with different trust',
+            ('Lab', '10.1.2.0/24', 'Office', '10.0.0.0/8'): 'Shadowed by a wider range with different trust',
+            ('Lab', '10.1.2.0/24', 'Lab', '10.1.0.0/16'): 'Redundant range',
+            ('Copy', '192.0.2.0/24', 'VPN', '192.0.2.0/24'): 'Range also in another location with different trust'
+        })
+        self.assertIn(('office', 'lab'), index.overlapping_pairs())
+        self.assertNotIn(('lab', 'lab'), index.overlapping_pairs())
+
+class TestLocationAnalysis(unittest.TestCase):
+    def test_location_gaps(self):
+        from src.pyCaOptics_app import analysis
+        from src.pyCaOptics_locations import LocationIndex
+        policy = {'displayName': 'Office only', 'state': 'enabled', 'conditions': {
+            'users': {'includeUsers': ['All']},
+            'applications': {'includeApplications': ['All']},
+            'locations': {'includeLocations': ['office'], 'excludeLocations': ['lab', 'deleted']}
+        }}
+        gaps = analysis([policy], [], [], [], locations=LocationIndex(LOCATIONS))[0]['Gaps Identified']
+
+        self.assertIn("References named locations that do not exist: ['deleted']", gaps)
+        self.assertIn("Excluded named locations overlap included ones: ['Lab']", gaps)
+        self.assertEqual(len(analysis([policy], [], [], [])[0]['Gaps Identified']), len(gaps) - 2)
+
+if __name__ == '__main__':
+    unittest.main()
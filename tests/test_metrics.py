@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+def response(status_code, payload):
+    return Mock(status_code=status_code, headers={}, content=json.dumps(payload).encode(), json=lambda: payload)
+
+class TestMetrics(unittest.TestCase):
+    def test_stages_and_counters(self):
+        from src.pyCaOptics_metrics import Metrics
+        ticks = iter([0.0, 2.0, 2.5, 3.0])
+        metrics = Metrics(clock=lambda: next(ticks))
+        with metrics.stage('fetch'):
+            pass
+        with metrics.stage('fetch'):
+            pass
+        metrics.add('save_results', 0.25)
+        metrics.count('users', requests=2, pages=1, bytes=100)
+        metrics.count('users', pages=1)
+        metrics.record_scheduler({'requests': 2, 'retries': 1})
+
+        result = metrics.as_dict()
+        self.assertEqual(result['stages']['fetch']['seconds'], 2.5)
+        self.assertEqual(result['stages']['fetch']['calls'], 2)
+        self.assertEqual(result['stages']['save_results']['calls'], 1)
+        self.assertEqual(result['endpoints']['users']['pages'], 2)
+        self.assertEqual(result['endpoints']['users']['bytes'], 100)
+        self.assertEqual(result['scheduler']['retries'], 1)
+
+    def test_prometheus_text(self):
+        from src.pyCaOptics_metrics import Metrics
+        metrics = Metrics()
+        with metrics.stage('analysis'):
+            pass
+        metrics.count('a"b', requests=3)
+        metrics.record_scheduler({'retries': 4})
+        text = metrics.prometheus()
+
+        self.assertIn('# TYPE pycaoptics_stage_seconds gauge', text)
+        self.assertIn('pycaoptics_stage_calls{stage="analysis"} 1', text)
+        self.assertIn('pycaoptics_endpoint_requests_total{endpoint="a\\"b"} 3', text)
+        self.assertIn('pycaoptics_scheduler_retries 4', text)
+
+    def test_iter_pages_counts_retries_and_bytes(self):
+        from src.pyCaOptics_fetch import iter_pages
+        from src.pyCaOptics_metrics import Metrics
+        from src.pyCaOptics_scheduler import RequestScheduler
+        first = {'value': [{'id': 'u1'}], '@odata.nextLink': 'https://graph/users?page=2'}
+        second = {'value': [{'id': 'u2'}, {'id': 'u3'}]}
+        session = Mock()
+        session.get.side_effect = [response(429, {}), response(200, first), response(200, second)]
+        metrics = Metrics()
+
+        pages = list(iter_pages('https://graph/users', {}, session, RequestScheduler(sleep=lambda delay: None),
+                                metrics, 'users'))
+        counters = metrics.as_dict()['endpoints']['users']
+        self.assertEqual(len(pages), 2)
+        self.assertEqual((counters['requests'], counters['retries'], counters['pages'], counters['items']), (3, 1, 2, 3))
+        self.assertEqual(counters['bytes'], len(json.dumps(first)) + len(json.dumps(second)))
+
+    def test_fetch_data_counts_each_endpoint(self):
+        from src.pyCaOptics_fetch import build_endpoints, fetch_data
+        from src.pyCaOptics_metrics import Metrics
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        resources = {'users': [{'id': f'user-{n}'} for n in range(25)], 'groups': [], 'applications': [],
+                     'identity/conditionalAccess/policies': [], 'identity/conditionalAccess/namedLocations': []}
+        metrics = Metrics()
+        with MockGraphServer(resources, page_size=10) as server:
+            fetch_data({}, build_endpoints(base_url=server.base_url), metrics=metrics)
+
+        endpoints = metrics.as_dict()['endpoints']
+        self.assertEqual(set(endpoints), {'policies', 'namedLocations', 'users', 'groups', 'applications'})
+        self.assertEqual((endpoints['users']['pages'], endpoints['users']['items']), (3, 25))
+        self.assertEqual(endpoints['groups']['pages'], 1)
+
+class TestRunMetrics(unittest.TestCase):
+    def test_analyze_snapshot_writes_metrics_and_profile(self):
+        from src.pyCaOptics_app import analyze_snapshot
+        from src.pyCaOptics_snapshot import save_snapshot
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = os.path.join(directory, 'tenant.snapshot.jsonl.gz')
+            metrics_path = os.path.join(directory, 'metrics.json')
+            profile_path = os.path.join(directory, 'analysis.prof')
+            save_snapshot({'policies': [{'displayName': 'Policy', 'state': 'enabled', 'conditions': {}}],
+                           'users': [{'id': 'user-1'}], 'groups': [], 'applications': []}, snapshot)
+            with patch('src.pyCaOptics_app.output_filename', return_value=os.path.join(directory, 'results.csv')):
+                analyze_snapshot(snapshot, metrics_path=metrics_path, profile_path=profile_path, sample_interval=0.01)
+
+            with open(metrics_path) as f:
+                metrics = json.load(f)
+            self.assertEqual(set(metrics['stages']), {'load_snapshot', 'analysis', 'save_results'})
+            self.assertTrue(os.path.getsize(profile_path))
+
+if __name__ == '__main__':
+    unittest.main()
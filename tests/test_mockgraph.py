@@ -0,0 +1,46 @@
+import unittest
+import requests
+
+class TestMockGraphServer(unittest.TestCase):
+    def test_synthetic_tenant_fetches_completely(self):
+        from src.pyCaOptics_fetch import build_endpoints, fetch_data
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        from src.pyCaOptics_synthetic import generate_tenant
+        expected = generate_tenant(500, seed=3)
+        with MockGraphServer.synthetic(500, seed=3, page_size=100) as server:
+            data = fetch_data({}, build_endpoints(base_url=server.base_url))
+
+        self.assertEqual([user['id'] for user in data['users']], [user['id'] for user in expected['users']])
+        self.assertEqual(data['users'][0], {'id': expected['users'][0]['id']})
+        self.assertEqual(len(data['policies']), len(expected['policies']))
+
+    def test_top_limits_page_size_and_follows_changes(self):
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        with MockGraphServer({'users': [{'id': f'user-{n}'} for n in range(5)]}, page_size=3) as server:
+            first = requests.get(f'{server.base_url}/users?$top=2').json()
+            self.assertEqual(len(first['value']), 2)
+            self.assertIn('$top=2', first['@odata.nextLink'])
+            self.assertEqual(len(requests.get(f'{server.base_url}/users?$top=50').json()['value']), 3)
+
+            server.upsert('users', {'id': 'user-5'})
+            last = requests.get(f'{server.base_url}/users?$skiptoken=3').json()
+            self.assertEqual([user['id'] for user in last['value']], ['user-3', 'user-4', 'user-5'])
+
+    def test_injected_throttling_is_retried(self):
+        from src.pyCaOptics_mockgraph import MockGraphServer, measure_fetch
+        from src.pyCaOptics_scheduler import RequestScheduler
+        scheduler = RequestScheduler(base_delay=0.0, max_concurrency=2)
+        with MockGraphServer.synthetic(300, page_size=50, throttle_every=4, latency=0.001) as server:
+            response = requests.get(f'{server.base_url}/users')
+            stats = measure_fetch(server, max_workers=2, scheduler=scheduler)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stats['items'], len(server.resources['users']) + len(server.resources['groups']) +
+                         len(server.resources['applications']) +
+                         len(server.resources['identity/conditionalAccess/policies']))
+        self.assertEqual(stats['retries'], server.throttled_requests)
+        self.assertGreater(server.throttled_requests, 0)
+        self.assertEqual(stats['endpoints']['users']['pages'], 6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+USER_ID = '11111111-1111-1111-1111-111111111111'
+GROUP_ID = '22222222-2222-2222-2222-222222222222'
+UNKNOWN_ID = '33333333-3333-3333-3333-333333333333'
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestNameCache(unittest.TestCase):
+    def test_lru_and_ttl(self):
+        from src.pyCaOptics_names import NameCache
+        clock = FakeClock()
+        cache = NameCache(max_entries=2, ttl_hours=1, clock=clock)
+        cache.put('a', 'A')
+        cache.put('b', 'B')
+        cache.get('a')
+        cache.put('c', 'C')
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), ('A', None, 'C'))
+
+        clock.now += 3601
+        self.assertNotIn('a', cache)
+        self.assertEqual(len(cache), 1)
+
+    def test_round_trips_through_disk(self):
+        from src.pyCaOptics_names import NameCache
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'cache', 'names.json.gz')
+            cache = NameCache(path)
+            cache.put(USER_ID, 'Adele Vance')
+            cache.put(UNKNOWN_ID, None)
+            cache.save()
+
+            reloaded = NameCache(path)
+            self.assertEqual(reloaded.get(USER_ID.upper()), 'Adele Vance')
+            self.assertIn(UNKNOWN_ID, reloaded)
+
+class TestNameResolver(unittest.TestCase):
+    def test_enriches_rows_in_bulk_and_caches(self):
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        from src.pyCaOptics_names import NameCache, NameResolver
+        resources = {
+            'users': [{'id': USER_ID, 'displayName': 'Adele Vance'}],
+            'groups': [{'id': GROUP_ID, 'displayName': 'Finance'}]
+        }
+        rows = [
+            {'Policy Name': 'Coverage Check', 'Gaps Identified': [f"Uncovered users: {{'{USER_ID}', '{UNKNOWN_ID}'}}"]},
+            ('gap', {'policy': 'MFA', 'permutation': (USER_ID, GROUP_ID, 'All')})
+        ]
+        cache = NameCache()
+        with MockGraphServer(resources) as server:
+            resolver = NameResolver({}, cache, base_url=server.base_url)
+            enriched = list(resolver.enrich(rows))
+            list(resolver.enrich(rows))
+            lookups = [path for path in server.requests if path.endswith('getByIds')]
+
+        self.assertEqual(enriched[0]['Gaps Identified'],
+                         [f"Uncovered users: {{'Adele Vance ({USER_ID})', '{UNKNOWN_ID}'}}"])
+        self.assertEqual(enriched[1], ('gap', {'policy': 'MFA', 'permutation': (f'Adele Vance ({USER_ID})', f'Finance ({GROUP_ID})', 'All')}))
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(resolver.lookups, 1)
+
+    def test_offline_resolver_uses_only_the_cache(self):
+        from src.pyCaOptics_names import NameCache, NameResolver
+        resolver = NameResolver(None, NameCache())
+        resolver.seed([{'appId': USER_ID, 'displayName': 'Payroll'}], key='appId')
+        self.assertEqual(list(resolver.enrich([{'app': USER_ID, 'group': GROUP_ID}])),
+                         [{'app': f'Payroll ({USER_ID})', 'group': GROUP_ID}])
+
+    def test_failed_lookup_falls_back_to_the_cache(self):
+        import requests
+        from src.pyCaOptics_names import NameCache, NameResolver
+        from src.pyCaOptics_scheduler import RequestScheduler
+
+        class FailingSession:
+            posts = 0
+
+            def post(self, url, **kwargs):
+                self.posts += 1
+                raise requests.exceptions.ConnectionError('connection refused')
+
+        session = FailingSession()
+        resolver = NameResolver({}, NameCache(), session=session, scheduler=RequestScheduler(max_retries=0))
+        resolver.seed([{'id': GROUP_ID, 'displayName': 'Finance'}])
+        rows = [{'user': USER_ID, 'group': GROUP_ID}]
+        self.assertEqual(list(resolver.enrich(rows)), [{'user': USER_ID, 'group': f'Finance ({GROUP_ID})'}])
+        self.assertEqual(list(resolver.enrich(rows)), [{'user': USER_ID, 'group': f'Finance ({GROUP_ID})'}])
+        self.assertEqual(session.posts, 1)
+        self.assertIsNotNone(resolver.lookup_error)
+
+if __name__ == '__main__':
+    unittest.main()
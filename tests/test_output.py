@@ -1,5 +1,6 @@
 import unittest
 import os
+import tempfile
 from unittest.mock import patch
 import pandas as pd
 
@@ -8,7 +9,8 @@ class TestSaveResults(unittest.TestCase):
     def test_save_results(self, mock_to_csv):
         from src.pyCaOptics_app import save_results
         df = pd.DataFrame([{'Policy Name': 'Test Policy', 'State': 'enabled', 'Gaps Identified': []}])
-        save_results(df)
+        with tempfile.TemporaryDirectory() as directory:
+            save_results(df, os.path.join(directory, 'output'))
         self.assertTrue(mock_to_csv.called)
         args, kwargs = mock_to_csv.call_args
         self.assertIn('output', args[0])  # Check that the path includes 'output' directory
@@ -16,14 +18,13 @@ class TestSaveResults(unittest.TestCase):
     def test_save_results_with_timestamp(self):
         from src.pyCaOptics_app import save_results
         df = pd.DataFrame([{'Policy Name': 'Test Policy', 'State': 'enabled', 'Gaps Identified': []}])
-        output_dir = os.path.join(os.path.dirname(__file__), '..', 'output')
-        os.makedirs(output_dir, exist_ok=True)
-        output_filename = os.path.join(output_dir, 'ca_optics_analysis_results.csv')
-        with open(output_filename, 'w') as f:
-            f.write('Dummy content')
+        with tempfile.TemporaryDirectory() as output_dir:
+            output_filename = os.path.join(output_dir, 'ca_optics_analysis_results.csv')
+            with open(output_filename, 'w') as f:
+                f.write('Dummy content')
 
-        save_results(df)
-        files = os.listdir(output_dir)
+            save_results(df, output_dir)
+            files = os.listdir(output_dir)
         self.assertTrue(any('ca_optics_analysis_results_' in f for f in files))
 
 if __name__ == '__main__':
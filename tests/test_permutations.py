@@ -0,0 +1,59 @@
+import os
+import tempfile
+import types
+import unittest
+from unittest.mock import patch
+
+def make_policy(name, users, apps, groups=('Group1',), platforms=('android',), locations=('All',), client_apps=('browser',)):
+    return {
+        'displayName': name,
+        'state': 'enabled',
+        'conditions': {
+            'users': {'includeUsers': list(users), 'excludeUsers': [], 'includeGroups': list(groups), 'excludeGroups': []},
+            'applications': {'includeApplications': list(apps), 'excludeApplications': []},
+            'platforms': {'includePlatforms': list(platforms), 'excludePlatforms': []},
+            'locations': {'includeLocations': list(locations), 'excludeLocations': []},
+            'clientAppTypes': list(client_apps)
+        }
+    }
+
+class TestPermutations(unittest.TestCase):
+    def test_generate_permutations_is_lazy(self):
+        from src.pyCaOptics_app_iter import generate_permutations
+        permutations = generate_permutations([make_policy('Policy1', ['User1'], ['App1'])])
+        self.assertIsInstance(permutations, types.GeneratorType)
+        self.assertEqual(list(permutations), [('User1', 'Group1', 'App1', 'android', 'All', 'browser')])
+
+    def test_generate_permutations_deduplicates_across_policies(self):
+        from src.pyCaOptics_app_iter import generate_permutations
+        policies = [
+            make_policy('Policy1', ['User1', 'User2'], ['App1']),
+            make_policy('Policy2', ['User2', 'User3', 'User3'], ['App1'])
+        ]
+        permutations = list(generate_permutations(policies))
+        self.assertEqual(len(permutations), len(set(permutations)))
+        self.assertEqual(sorted(p[0] for p in permutations), ['User1', 'User2', 'User3'])
+
+    def test_analyze_permutations_reports_gaps(self):
+        from src.pyCaOptics_app_iter import analyze_permutations
+        policies = [make_policy('Policy1', ['User1'], ['App1']), make_policy('Policy2', ['User2'], ['App1'], groups=['Group2'])]
+        gaps, conflicts = analyze_permutations(policies)
+        self.assertEqual(len(gaps), 2)
+        self.assertEqual({gap['policy'] for gap in gaps}, {'Policy1', 'Policy2'})
+        self.assertEqual(conflicts, [])
+
+    def test_stream_results_writes_rows(self):
+        from src.pyCaOptics_app_iter import iter_findings, stream_results
+        policies = [make_policy('Policy1', ['User1'], ['App1']), make_policy('Policy2', ['User2'], ['App1'], groups=['Group2'])]
+        with tempfile.TemporaryDirectory() as output_dir:
+            gaps_filename = os.path.join(output_dir, 'gaps.csv')
+            conflicts_filename = os.path.join(output_dir, 'conflicts.csv')
+            with patch('src.pyCaOptics_app_iter._results_filenames', return_value=(gaps_filename, conflicts_filename)):
+                stream_results(iter_findings(policies))
+            with open(gaps_filename) as f:
+                lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'policy,permutation,issue')
+        self.assertEqual(len(lines), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from itertools import product
+from unittest.mock import patch
+
+def make_policy(name, include_users=(), exclude_users=(), include_groups=(), exclude_groups=(),
+                apps=('All',), exclude_apps=(), platforms=None, locations=None, client_apps=(), state='enabled'):
+    return {
+        'displayName': name,
+        'state': state,
+        'conditions': {
+            'users': {'includeUsers': list(include_users), 'excludeUsers': list(exclude_users),
+                      'includeGroups': list(include_groups), 'excludeGroups': list(exclude_groups)},
+            'applications': {'includeApplications': list(apps), 'excludeApplications': list(exclude_apps)},
+            'platforms': {'includePlatforms': list(platforms), 'excludePlatforms': []} if platforms else None,
+            'locations': {'includeLocations': list(locations), 'excludeLocations': []} if locations else None,
+            'clientAppTypes': list(client_apps)
+        }
+    }
+
+class TestSymbolicSet(unittest.TestCase):
+    def test_set_algebra(self):
+        from src.pyCaOptics_regions import SymbolicSet
+        finite = SymbolicSet({'a', 'b'})
+        all_but_b = SymbolicSet({'b'}, complement=True)
+
+        self.assertEqual(finite.intersection(all_but_b), SymbolicSet({'a'}))
+        self.assertEqual(finite.union(all_but_b), SymbolicSet.everything())
+        self.assertEqual(all_but_b.difference(finite), SymbolicSet({'a', 'b'}, complement=True))
+        self.assertTrue(finite.difference(finite).is_empty())
+        self.assertEqual(all_but_b.describe(), 'All except b')
+
+class TestUncoveredRegions(unittest.TestCase):
+    def test_all_users_policy_reports_its_exclusions(self):
+        from src.pyCaOptics_regions import uncovered_regions, iter_region_rows
+        policies = [make_policy('Baseline', include_users=['All'], exclude_users=['BreakGlass'])]
+
+        rows = list(iter_region_rows(uncovered_regions(policies)))
+
+        self.assertEqual(rows, [{
+            'users': 'BreakGlass', 'groups': 'All', 'applications': 'All', 'platforms': 'All',
+            'locations': 'All', 'clientAppTypes': 'All', 'issue': 'Uncovered region'
+        }])
+
+    def test_disabled_policies_are_ignored(self):
+        from src.pyCaOptics_regions import uncovered_regions, universe
+        policies = [make_policy('Off', include_users=['All'], state='disabled')]
+        self.assertEqual(uncovered_regions(policies), [universe()])
+
+    def test_regions_match_permutation_coverage(self):
+        from src.pyCaOptics_policy import compile_policy
+        from src.pyCaOptics_regions import uncovered_regions, region_contains
+        policies = [
+            make_policy('MFA', include_users=['All'], exclude_users=['u1'], exclude_groups=['g2'], apps=['a1', 'a2']),
+            make_policy('Admins', include_groups=['g1', 'g2'], exclude_users=['u2'], platforms=['ios'], client_apps=['browser']),
+            make_policy('Legacy', include_users=['u1', 'u3'], apps=['All'], exclude_apps=['a2'], locations=['trusted']),
+            make_policy('Disabled', include_users=['All'], state='disabled')
+        ]
+        regions = uncovered_regions(policies)
+        compiled = [compile_policy(policy) for policy in policies if policy['state'] == 'enabled']
+
+        # 'other' stands in for any value no policy mentions
+        space = (['u1', 'u2', 'u3', 'other'], ['g1', 'g2', 'other'], ['a1', 'a2', 'other'],
+                 ['ios', 'other'], ['trusted', 'other'], ['browser', 'other'])
+        for permutation in product(*space):
+            covered = any(policy.covers(*permutation) for policy in compiled)
+            containing = sum(region_contains(region, permutation) for region in regions)
+            self.assertEqual(containing, 0 if covered else 1, permutation)
+
+    def test_symbolic_mode_writes_regions(self):
+        from src.pyCaOptics_app_iter import analyze
+        policies = [make_policy('Baseline', include_users=['All'], exclude_users=['BreakGlass'])]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'uncovered_regions.csv')
+            filenames = lambda output_dir, basename, *args: os.path.join(tmp, f'{basename}.csv')
+            with patch('src.pyCaOptics_app_iter.output_filename', side_effect=filenames):
+                analyze(policies, mode='symbolic')
+            with open(path) as f:
+                lines = f.read().splitlines()
+
+        self.assertEqual(lines[0], 'users,groups,applications,platforms,locations,clientAppTypes,issue')
+        self.assertEqual(lines[1:], ['BreakGlass,All,All,All,All,All,Uncovered region'])
+
+if __name__ == '__main__':
+    unittest.main()
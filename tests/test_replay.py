@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+import random
+import tempfile
+import unittest
+from collections import Counter
+from unittest.mock import patch
+
+POLICIES = [
+    {'id': 'mfa-sales', 'displayName': 'MFA for sales', 'state': 'enabled',
+     'conditions': {'users': {'includeGroups': ['sales']}, 'applications': {'includeApplications': ['All']}},
+     'grantControls': {'builtInControls': ['mfa']}},
+    {'id': 'block-legacy', 'displayName': 'Block legacy', 'state': 'enabled',
+     'conditions': {'users': {'includeUsers': ['All']}, 'applications': {'includeApplications': ['All']},
+                    'clientAppTypes': ['exchangeActiveSync', 'other']},
+     'grantControls': {'builtInControls': ['block']}}
+]
+
+def graph_signin(user, app, client_app='Browser', operating_system='Windows 10', trusted=False):
+    return {'userId': user, 'appId': app, 'clientAppUsed': client_app, 'deviceDetail': {'operatingSystem': operating_system},
+            'riskLevelDuringSignIn': 'none', 'networkLocationDetails': [{'networkType': 'trustedNamedLocation'}] if trusted else []}
+
+class TestSpaceSavingCounter(unittest.TestCase):
+    def test_heavy_hitters_are_kept_within_error(self):
+        from src.pyCaOptics_replay import SpaceSavingCounter
+        rng = random.Random(7)
+        stream = [('heavy', n % 3) for n in range(3000)] + [(rng.random(), None) for _ in range(5000)]
+        rng.shuffle(stream)
+        counter = SpaceSavingCounter(capacity=50)
+        for key in stream:
+            counter.add(key)
+
+        truth = Counter(stream)
+        self.assertEqual(len(counter), 50)
+        self.assertEqual(counter.total, len(stream))
+        top = counter.most_common(3)
+        self.assertEqual({key for key, _, _ in top}, {('heavy', 0), ('heavy', 1), ('heavy', 2)})
+        for key, count, error in counter.most_common():
+            self.assertGreaterEqual(count, truth[key])
+            self.assertLessEqual(count - error, truth[key])
+
+class TestReplay(unittest.TestCase):
+    def test_signin_from_graph(self):
+        from src.pyCaOptics_replay import signin_from_graph
+        signin = signin_from_graph(graph_signin('u1', 'app', 'IMAP4', 'iOS 17', trusted=True), user_groups={'u1': ['sales']})
+        self.assertEqual(signin['platform'], 'iOS')
+        self.assertEqual(signin['client_app'], 'other')
+        self.assertEqual(signin['location'], ['AllTrusted'])
+        self.assertEqual(signin['groups'], ['sales'])
+        self.assertEqual(signin_from_graph({'user': 'u2', 'location': ['loc']})['location'], ['loc'])
+
+    def test_replay_export_file(self):
+        from src.pyCaOptics_replay import replay, save_replay
+        from src.pyCaOptics_whatif import read_signins
+        records = ([graph_signin('u1', 'crm')] * 5 + [graph_signin('u2', 'crm')] * 3 +
+                   [graph_signin('u3', 'mail', client_app='Exchange ActiveSync')] * 2 + [graph_signin('u4', 'erp', trusted=True)])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'signins.jsonl.gz')
+            with gzip.open(path, 'wt') as f:
+                f.writelines(json.dumps(record) + '\n' for record in records)
+
+            aggregator = replay(POLICIES, read_signins(path), capacity=10, user_groups={'u1': ['sales']})
+            outputs = iter([os.path.join(directory, 'uncovered.jsonl'), os.path.join(directory, 'policies.jsonl')])
+            with patch('src.pyCaOptics_replay.output_filename', side_effect=lambda *args: next(outputs)):
+                uncovered, policies = save_replay(aggregator, output_format='jsonl')
+            uncovered_rows = list(read_signins(uncovered))
+            policy_rows = list(read_signins(policies))
+
+        self.assertEqual((aggregator.signins, aggregator.uncovered), (11, 4))
+        self.assertEqual(aggregator.grant_counts(), {'uncovered': 4, 'mfa': 5, 'block': 2})
+        self.assertEqual(uncovered_rows[0], {'user': 'u2', 'application': 'crm', 'location': None, 'signins': 3, 'error': 0})
+        self.assertEqual(uncovered_rows[1]['location'], 'AllTrusted')
+        self.assertEqual([row['signins'] for row in policy_rows], [5, 2])
+
+    def test_replay_from_mock_graph(self):
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        from src.pyCaOptics_replay import iter_graph_signins, replay, signins_endpoint
+        records = [dict(graph_signin(f'u{n % 40}', 'crm'), id=str(n)) for n in range(2500)]
+        with MockGraphServer({'auditLogs/signIns': records}, page_size=1000) as server:
+            aggregator = replay(POLICIES, iter_graph_signins({}, signins_endpoint(server.base_url, '2026-10-01T00:00:00Z')),
+                                capacity=8)
+            pages = len(server.requests)
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(aggregator.uncovered, 2500)
+        self.assertEqual(len(aggregator.combinations), 8)
+        self.assertEqual(aggregator.combinations.total, 2500)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import Mock
+
+def response(status_code, payload=None, headers=None):
+    return Mock(status_code=status_code, headers=headers or {}, json=lambda: payload or {})
+
+class TestRequestScheduler(unittest.TestCase):
+    def test_retry_after_is_honored(self):
+        from src.pyCaOptics_scheduler import RequestScheduler
+        delays = []
+        scheduler = RequestScheduler(max_concurrency=4, base_delay=0.0, sleep=delays.append)
+        get = Mock(side_effect=[response(429, headers={'Retry-After': '7'}), response(200)])
+
+        self.assertEqual(scheduler.request(get, 'https://graph/users').status_code, 200)
+        self.assertEqual(delays, [7.0])
+        stats = scheduler.stats()
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['throttled'], 1)
+        self.assertEqual(stats['backoff_seconds'], 7.0)
+        self.assertEqual(stats['concurrency'], 2)
+
+    def test_exponential_backoff_without_retry_after(self):
+        from src.pyCaOptics_scheduler import RequestScheduler
+        delays = []
+        scheduler = RequestScheduler(base_delay=1.0, max_delay=3.0, max_retries=3, sleep=delays.append)
+        get = Mock(return_value=response(503))
+
+        self.assertEqual(scheduler.request(get, 'https://graph/users').status_code, 503)
+        self.assertEqual(get.call_count, 4)
+        for attempt, delay in enumerate(delays):
+            self.assertLessEqual(delay, min(3.0, 2 ** attempt))
+
+    def test_concurrency_recovers_after_successes(self):
+        from src.pyCaOptics_scheduler import RequestScheduler
+        scheduler = RequestScheduler(max_concurrency=4, increase_after=2, sleep=lambda delay: None)
+        scheduler.request(Mock(side_effect=[response(429), response(200)]), 'https://graph/users')
+        self.assertEqual(scheduler.concurrency, 2)
+        for _ in range(4):
+            scheduler.request(Mock(return_value=response(200)), 'https://graph/users')
+        self.assertEqual(scheduler.concurrency, 4)
+
+    def test_pagination_resumes_from_next_link(self):
+        from src.pyCaOptics_fetch import fetch_paginated_data
+        from src.pyCaOptics_scheduler import RequestScheduler
+        session = Mock()
+        session.get.side_effect = [
+            response(200, {'value': [{'id': '1'}], '@odata.nextLink': 'https://graph/users?page=2'}),
+            response(429, headers={'Retry-After': '0'}),
+            response(200, {'value': [{'id': '2'}]})
+        ]
+        scheduler = RequestScheduler(sleep=lambda delay: None)
+        items = fetch_paginated_data('https://graph/users', {}, session, scheduler)
+
+        self.assertEqual([item['id'] for item in items], ['1', '2'])
+        self.assertEqual([call.args[0] for call in session.get.call_args_list],
+                         ['https://graph/users', 'https://graph/users?page=2', 'https://graph/users?page=2'])
+
+if __name__ == '__main__':
+    unittest.main()
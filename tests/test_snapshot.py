@@ -0,0 +1,73 @@
+import gzip
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+DATA = {
+    'policies': [{'id': 'policy-1', 'displayName': 'Policy 1', 'state': 'enabled', 'conditions': {}}],
+    'users': [{'id': 'user-1'}, {'id': 'user-2'}],
+    'groups': [],
+    'applications': [{'id': 'app-object-1', 'appId': 'app-1'}]
+}
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'tenant.snapshot.jsonl.gz')
+
+    def test_round_trip(self):
+        from src.pyCaOptics_snapshot import load_snapshot, save_snapshot
+        save_snapshot(DATA, self.path, tenant_id='tenant-1')
+        data, header = load_snapshot(self.path)
+        self.assertEqual(data, DATA)
+        self.assertEqual(header['tenant_id'], 'tenant-1')
+        self.assertEqual(header['counts'], {'policies': 1, 'users': 2, 'groups': 0, 'applications': 1})
+        self.assertEqual(len(header['content_hash']), 64)
+
+    def test_expired_snapshot(self):
+        from src.pyCaOptics_snapshot import SnapshotError, load_snapshot, save_snapshot
+        save_snapshot(DATA, self.path, ttl_hours=-1)
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.path)
+        data, _ = load_snapshot(self.path, allow_expired=True)
+        self.assertEqual(len(data['users']), 2)
+
+    def test_tampered_snapshot(self):
+        from src.pyCaOptics_snapshot import SnapshotError, load_snapshot, save_snapshot
+        save_snapshot(DATA, self.path)
+        with gzip.open(self.path, 'rt') as f:
+            content = f.read()
+        with gzip.open(self.path, 'wt') as f:
+            f.write(content.replace('user-2', 'user-3'))
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.path)
+
+    def test_corrupt_snapshot(self):
+        from src.pyCaOptics_snapshot import SnapshotError, load_snapshot, save_snapshot
+        save_snapshot(DATA, self.path)
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(content[:len(content) // 2])
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.path)
+        with gzip.open(self.path, 'wt') as f:
+            f.write(gzip.decompress(content).decode('utf-8').replace('"kind"', '{', 1))
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.path)
+
+    def test_analyze_snapshot_runs_offline(self):
+        from src.pyCaOptics_app import analyze_snapshot
+        from src.pyCaOptics_snapshot import save_snapshot
+        save_snapshot(DATA, self.path)
+        with patch('src.pyCaOptics_app.stream_results') as mock_stream, \
+             patch('src.pyCaOptics_app.build_credential') as mock_credential:
+            analyze_snapshot(self.path)
+        self.assertFalse(mock_credential.called)
+        rows = list(mock_stream.call_args[0][0])
+        self.assertEqual(rows[0]['Policy Name'], 'Policy 1')
+
+if __name__ == '__main__':
+    unittest.main()
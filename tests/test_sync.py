@@ -0,0 +1,72 @@
+import tempfile
+import unittest
+
+class TestDeltaSync(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.state_dir.cleanup)
+
+    def sync(self, server):
+        from src.pyCaOptics_sync import DeltaStateStore, delta_endpoints, sync_endpoint
+        store = DeltaStateStore(self.state_dir.name)
+        url = delta_endpoints(server.base_url)['users']
+        return sorted(user['id'] for user in sync_endpoint('users', url, {}, store))
+
+    def test_incremental_sync_applies_changes(self):
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        users = [{'id': f'user-{n}', 'displayName': f'User {n}'} for n in range(5)]
+        with MockGraphServer({'users': users}, page_size=2) as server:
+            self.assertEqual(self.sync(server), [f'user-{n}' for n in range(5)])
+            initial_requests = len(server.requests)
+            self.assertEqual(initial_requests, 3)
+
+            server.upsert('users', {'id': 'user-5', 'displayName': 'User 5'})
+            server.delete('users', 'user-0')
+            self.assertEqual(self.sync(server), ['user-1', 'user-2', 'user-3', 'user-4', 'user-5'])
+            self.assertEqual(len(server.requests) - initial_requests, 1)
+            self.assertIn('$deltatoken=', server.requests[-1])
+            self.assertIn('$select=id', server.requests[-1])
+
+    def test_expired_delta_token_resyncs(self):
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        from src.pyCaOptics_sync import DeltaStateStore, delta_endpoints
+        with MockGraphServer({'users': [{'id': 'user-1'}]}) as server:
+            self.sync(server)
+            store = DeltaStateStore(self.state_dir.name)
+            _, objects = store.load('users')
+            store.save('users', f'{server.base_url}/users/delta?$deltatoken=999', objects,
+                       delta_endpoints(server.base_url)['users'])
+            self.assertEqual(self.sync(server), ['user-1'])
+
+    def test_sync_data(self):
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        from src.pyCaOptics_sync import sync_data
+        resources = {
+            'identity/conditionalAccess/policies': [{'id': 'policy-1', 'state': 'enabled'}],
+            'identity/conditionalAccess/namedLocations': [{'id': 'location-1'}],
+            'users': [{'id': 'user-1'}],
+            'groups': [{'id': 'group-1'}],
+            'applications': [{'id': 'app-object-1', 'appId': 'app-1'}]
+        }
+        with MockGraphServer(resources) as server:
+            data = sync_data({}, self.state_dir.name, base_url=server.base_url)
+        self.assertEqual(data['policies'], [{'id': 'policy-1', 'state': 'enabled'}])
+        self.assertEqual(data['applications'], [{'id': 'app-object-1', 'appId': 'app-1'}])
+        self.assertEqual(data['namedLocations'], [{'id': 'location-1'}])
+
+    def test_extra_select_reaches_delta_queries(self):
+        from src.pyCaOptics_mockgraph import MockGraphServer
+        from src.pyCaOptics_sync import sync_data
+        resources = {'identity/conditionalAccess/policies': [], 'identity/conditionalAccess/namedLocations': [],
+                     'users': [], 'groups': [],
+                     'applications': [{'id': 'app-object-1', 'appId': 'app-1', 'displayName': 'App 1'}]}
+        with MockGraphServer(resources) as server:
+            data = sync_data({}, self.state_dir.name, base_url=server.base_url)
+            self.assertEqual(data['applications'], [{'id': 'app-object-1', 'appId': 'app-1'}])
+            # The stored delta link selects fewer fields, so the applications are resynced in full
+            data = sync_data({}, self.state_dir.name, base_url=server.base_url,
+                             extra_select={'applications': ['displayName']})
+        self.assertEqual(data['applications'], [{'id': 'app-object-1', 'appId': 'app-1', 'displayName': 'App 1'}])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+class TestSyntheticTenant(unittest.TestCase):
+    def test_generation_is_reproducible_and_scaled(self):
+        from src.pyCaOptics_synthetic import generate_tenant
+        first = generate_tenant(2000, seed=3)
+        second = generate_tenant(2000, seed=3)
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first['policies'], generate_tenant(2000, seed=4)['policies'])
+        self.assertEqual({kind: len(items) for kind, items in first.items()},
+                         {'policies': 15, 'users': 2000, 'groups': 40, 'applications': 10})
+
+    def test_policies_cover_realistic_conditions(self):
+        from src.pyCaOptics_policy import compile_policies
+        from src.pyCaOptics_synthetic import generate_tenant
+        data = generate_tenant(1000, policies=100, memberships=True)
+        compiled = compile_policies(data['policies'])
+        user_ids = {user['id'] for user in data['users']}
+
+        self.assertTrue(any(policy.users.include_all and policy.users.exclude for policy in compiled))
+        self.assertTrue(any(policy.platforms.configured for policy in compiled))
+        self.assertTrue(any(policy.locations.exclude for policy in compiled))
+        self.assertTrue(any(policy.sign_in_risk_levels.configured or policy.user_risk_levels.configured for policy in compiled))
+        self.assertTrue(any('block' in policy.built_in_controls for policy in compiled))
+        self.assertTrue(all(policy.users.exclude <= user_ids for policy in compiled))
+        self.assertEqual(len(data['memberships']), len(data['groups']))
+
+class TestBenchmarks(unittest.TestCase):
+    def test_report_and_comparison(self):
+        from src.pyCaOptics_benchmark import compare_reports, run_benchmarks
+        report = run_benchmarks(1000, repeat=1, memory=False, benchmarks=['analysis', 'fetch_data'])
+
+        self.assertEqual(sorted(report['results']), ['analysis', 'fetch_data'])
+        self.assertEqual(report['results']['fetch_data']['items'], sum(report['scale'].values()))
+
+        slower = {'results': {'analysis': dict(report['results']['analysis'], seconds=report['results']['analysis']['seconds'] * 2)}}
+        comparison = compare_reports(report, slower)
+        self.assertEqual([row['benchmark'] for row in comparison], ['analysis'])
+        self.assertTrue(comparison[0]['regression'])
+        self.assertFalse(compare_reports(report, report)[0]['regression'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import csv
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+class TestManifest(unittest.TestCase):
+    def test_read_json_and_csv(self):
+        from src.pyCaOptics_tenants import read_manifest
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tenants.csv')
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['name', 'tenant_id', 'client_id', 'secret_variable'])
+                writer.writerow(['Contoso Ltd', 'tenant-1', 'client-1', 'CONTOSO_SECRET'])
+                writer.writerow(['contoso/ltd', 'tenant-2', 'client-2', ''])
+            tenants = read_manifest(path)
+
+            self.assertEqual([tenant['directory'] for tenant in tenants], ['Contoso_Ltd', 'contoso_ltd_2'])
+            self.assertEqual(tenants[0]['secret_variable'], 'CONTOSO_SECRET')
+            self.assertIsNone(tenants[1]['secret_variable'])
+
+            path = os.path.join(directory, 'tenants.json')
+            with open(path, 'w') as f:
+                json.dump([{'snapshot': 'snapshots/fabrikam.snapshot.jsonl.gz'}], f)
+            self.assertEqual(read_manifest(path)[0]['name'], 'fabrikam')
+
+    def test_invalid_tenants_are_rejected(self):
+        from src.pyCaOptics_tenants import ManifestError, read_manifest
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tenants.json')
+            for entries in ([{'name': 'No tenant id'}], [{'tenant_id': 't', 'tenantid': 't'}], {'tenant_id': 't'}):
+                with open(path, 'w') as f:
+                    json.dump(entries, f)
+                with self.assertRaises(ManifestError):
+                    read_manifest(path)
+
+class TestBatch(unittest.TestCase):
+    def test_tenants_write_separate_results_and_a_summary(self):
+        from src.pyCaOptics_snapshot import save_snapshot
+        from src.pyCaOptics_synthetic import generate_tenant
+        from src.pyCaOptics_tenants import run_batch
+        with tempfile.TemporaryDirectory() as directory:
+            tenants = []
+            for name, users in (('first', 50), ('second', 80)):
+                path = os.path.join(directory, f'{name}.jsonl.gz')
+                save_snapshot(generate_tenant(users, seed=users), path)
+                tenants.append({'name': name, 'tenant_id': None, 'client_id': None, 'auth': None, 'certificate': None,
+                                'secret_variable': None, 'snapshot': path, 'directory': name})
+            tenants.append(dict(tenants[0], name='missing', snapshot=os.path.join(directory, 'missing.jsonl.gz'),
+                                directory='missing'))
+            tenants.append(dict(tenants[0], name='no secret', tenant_id='tenant-3', client_id='client-3', snapshot=None,
+                                secret_variable='PYCAOPTICS_TEST_UNSET_SECRET', directory='no_secret'))
+            output_dir = os.path.join(directory, 'batch')
+            rows = run_batch(tenants, output_dir, processes=2, cache_dir=os.path.join(directory, 'cache'),
+                             reuse_results=True)
+
+            self.assertEqual([row['status'] for row in rows], ['ok', 'ok', 'analysis failed', 'fetch failed'])
+            self.assertEqual([row['users'] for row in rows[:2]], [50, 80])
+            self.assertIn('PYCAOPTICS_TEST_UNSET_SECRET', rows[3]['error'])
+            for row in rows[:2]:
+                tenant_dir = os.path.join(output_dir, row['directory'])
+                with open(os.path.join(tenant_dir, 'analysis_results.csv')) as f:
+                    self.assertEqual(len(list(csv.DictReader(f))), row['results'])
+                self.assertTrue(os.path.exists(os.path.join(tenant_dir, 'analysis.log')))
+                self.assertTrue(os.path.exists(os.path.join(directory, 'cache', row['directory'], 'analysis.json.gz')))
+            with open(os.path.join(output_dir, 'batch_summary.csv')) as f:
+                self.assertEqual([row['tenant'] for row in csv.DictReader(f)], ['first', 'second', 'missing', 'no secret'])
+
+    def test_fetch_exit_is_reported_with_its_status(self):
+        from src.pyCaOptics_tenants import run_batch
+        with tempfile.TemporaryDirectory() as directory:
+            tenant = {'name': 'exits', 'tenant_id': 'tenant-1', 'client_id': 'client-1', 'auth': None, 'certificate': None,
+                      'secret_variable': None, 'snapshot': None, 'directory': 'exits'}
+            with patch.object(sys.modules[run_batch.__module__], 'fetch_snapshot', side_effect=SystemExit(1)):
+                rows = run_batch([tenant], os.path.join(directory, 'batch'), processes=1,
+                                 cache_dir=os.path.join(directory, 'cache'))
+
+            self.assertEqual((rows[0]['status'], rows[0]['error']), ('fetch failed', 'fetch exited with status 1'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+def reference_policies(policy, signin):
+    """The brute-force answer: checks every condition of one policy directly."""
+    identity = {signin['user'], *signin['groups'], *signin['roles']}
+    included = policy.users.include | policy.groups.include | policy.roles.include
+    excluded = policy.users.exclude | policy.groups.exclude | policy.roles.exclude
+    locations = set(signin['location'])
+    locations_match = ((policy.locations.include_all or locations & policy.locations.include) and
+                       not locations & policy.locations.exclude)
+    return bool((policy.users.include_all or identity & included) and not identity & excluded and
+                policy.applications.matches(signin['application']) and
+                policy.platforms.matches(signin['platform']) and
+                policy.client_app_types.matches(signin['client_app']) and
+                policy.user_risk_levels.matches(signin['user_risk']) and
+                policy.sign_in_risk_levels.matches(signin['sign_in_risk']) and
+                locations_match)
+
+class TestDecisionIndex(unittest.TestCase):
+    def test_matches_brute_force(self):
+        from src.pyCaOptics_synthetic import TenantGenerator
+        from src.pyCaOptics_whatif import DecisionIndex
+        generator = TenantGenerator(2000, policies=60, seed=5)
+        index = DecisionIndex(generator.policies())
+        signins = list(generator.signins(3000))
+        # Make sure excluded break-glass users and explicitly included users show up too
+        signins[0]['user'] = generator.break_glass[0]
+
+        for signin in signins:
+            expected = [policy.id for policy in index.policies if reference_policies(policy, signin)]
+            self.assertEqual(index.evaluate(signin)[0], expected)
+        self.assertTrue(any(index.evaluate(signin)[0] for signin in signins))
+
+    def test_states_and_grant_controls(self):
+        from src.pyCaOptics_whatif import DecisionIndex
+        def policy(policy_id, state, controls, operator='OR', users=None):
+            return {'id': policy_id, 'state': state,
+                    'conditions': {'users': {'includeUsers': users or ['All']},
+                                   'applications': {'includeApplications': ['All']}},
+                    'grantControls': {'operator': operator, 'builtInControls': controls}}
+        policies = [
+            policy('mfa', 'enabled', ['mfa']),
+            policy('device', 'enabled', ['compliantDevice', 'domainJoinedDevice']),
+            policy('report-only', 'enabledForReportingButNotEnforced', ['block']),
+            policy('block-bob', 'enabled', ['block'], users=['bob'])
+        ]
+        signin = {'user': 'alice', 'application': 'app'}
+
+        self.assertEqual(DecisionIndex(policies).evaluate(signin),
+                         (['mfa', 'device'], 'mfa AND (compliantDevice OR domainJoinedDevice)'))
+        self.assertEqual(DecisionIndex(policies, states=('enabled', 'enabledForReportingButNotEnforced')).evaluate(signin)[1],
+                         'block')
+        self.assertEqual(DecisionIndex(policies).evaluate({'user': 'bob'})[1], 'block')
+        self.assertEqual(DecisionIndex([]).evaluate(signin), ([], 'allow'))
+
+    def test_evaluate_file(self):
+        from src.pyCaOptics_whatif import evaluate_file, read_signins
+        policies = [{'id': 'legacy', 'state': 'enabled',
+                     'conditions': {'users': {'includeUsers': ['All'], 'excludeGroups': ['breakglass']},
+                                    'applications': {'includeApplications': ['All']},
+                                    'clientAppTypes': ['exchangeActiveSync', 'other']},
+                     'grantControls': {'builtInControls': ['block']}}]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'signins.csv')
+            with open(path, 'w') as f:
+                f.write('user,groups,client_app\nu1,,other\nu2,sales;breakglass,other\nu3,,browser\n')
+            self.assertEqual(next(read_signins(path))['groups'], [])
+
+            output = os.path.join(directory, 'whatif_results.jsonl')
+            with patch('src.pyCaOptics_whatif.output_filename', return_value=output):
+                evaluate_file(policies, path, output_format='jsonl')
+            rows = list(read_signins(output))
+
+        self.assertEqual([row['grant_controls'] for row in rows], ['block', 'allow', 'allow'])
+        self.assertEqual(rows[1]['groups'], ['sales', 'breakglass'])
+
+if __name__ == '__main__':
+    unittest.main()
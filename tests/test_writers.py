@@ -0,0 +1,82 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+FIELDS = ['policy', 'permutation', 'issue']
+ROWS = [{'policy': f'Policy {n}', 'permutation': ('User1', f'App{n}'), 'issue': 'Uncovered permutation'} for n in range(5)]
+
+class TestResultWriters(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_csv_writer_flushes_in_chunks(self):
+        from src.pyCaOptics_output import open_writer
+        path = os.path.join(self.directory.name, 'gaps.csv')
+        with open_writer(path, FIELDS, 'csv', chunk_size=2) as writer:
+            writer.write_rows(ROWS[:3])
+            self.assertEqual(writer.rows_written, 2)
+        self.assertEqual(writer.rows_written, 3)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'policy,permutation,issue')
+        self.assertEqual(lines[1], 'Policy 0,"(\'User1\', \'App0\')",Uncovered permutation')
+
+    def test_gzip_json_lines(self):
+        from src.pyCaOptics_output import open_writer, output_filename
+        path = output_filename(self.directory.name, 'gaps_results', 'jsonl', 'gzip')
+        self.assertTrue(path.endswith('gaps_results.jsonl.gz'))
+        with open_writer(path, FIELDS, 'jsonl', compression='gzip') as writer:
+            writer.write_rows(ROWS)
+        with gzip.open(path, 'rt') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[4]['permutation'], ['User1', 'App4'])
+
+    def test_parquet(self):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        from src.pyCaOptics_output import open_writer
+        path = os.path.join(self.directory.name, 'gaps.parquet')
+        with open_writer(path, FIELDS, 'parquet', chunk_size=2, column_types={'permutation': 'list'}) as writer:
+            writer.write_rows(ROWS)
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        self.assertEqual(parquet_file.read().column('permutation').to_pylist()[0], ['User1', 'App0'])
+
+    def test_parquet_schema_does_not_depend_on_the_first_chunk(self):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        from src.pyCaOptics_output import open_writer
+        path = os.path.join(self.directory.name, 'signins.parquet')
+        rows = [{'user': 'User1', 'groups': [], 'reason': None, 'signins': None},
+                {'user': 'User2', 'groups': ('Group1',), 'reason': 'Not excluded', 'signins': 3}]
+        with open_writer(path, ['user', 'groups', 'reason', 'signins'], 'parquet', chunk_size=1,
+                         column_types={'groups': 'list', 'signins': 'int'}) as writer:
+            writer.write_rows(rows)
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(str(table.schema.field('reason').type), 'string')
+        self.assertEqual(table.to_pylist()[1], {'user': 'User2', 'groups': ['Group1'], 'reason': 'Not excluded',
+                                                'signins': 3})
+
+    def test_output_filename_adds_timestamp(self):
+        from src.pyCaOptics_output import output_filename
+        first = output_filename(self.directory.name, 'analysis_results')
+        open(first, 'w').close()
+        second = output_filename(self.directory.name, 'analysis_results')
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.basename(second).startswith('analysis_results_'))
+
+    def test_unsupported_format(self):
+        from src.pyCaOptics_output import open_writer
+        with self.assertRaises(ValueError):
+            open_writer(os.path.join(self.directory.name, 'gaps.xml'), FIELDS, 'xml')
+
+if __name__ == '__main__':
+    unittest.main()